@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --------------------------------------------------------
+# CONTROL DE ADMISIÓN
+# --------------------------------------------------------
+# /chat, /translator/send y /translator/send_batch acaban en llamadas a
+# Groq/DeepSeek, así que un
+# solo HUD en bucle puede agotar la cuota y ocupar todos los workers.
+#
+# - Por ruta, dos token buckets: uno por usuario y uno para toda la ruta.
+#   Un bucket permite ráfagas de `burst` peticiones y se rellena a `rate`
+#   por segundo.
+# - cupo_llm: tope de llamadas LLM simultáneas. Si no hay hueco en
+#   LLM_ESPERA segundos la petición se rechaza en el acto con un "ocupado"
+#   localizado en vez de quedarse esperando 30 s. Los workers de la cola
+#   de traducción también lo ocupan, pero esperan turno.
+#
+# Los límites son por worker (cada proceso cuenta su tráfico); el panel
+# admin los muestra con "@zenko limits".
+
+ADMISION = os.getenv("ADMISION", "1") == "1"
+LIMITE_CLAVES_MAX = int(os.getenv("LIMITE_CLAVES_MAX", "10000"))
+LLM_CONCURRENCIA = int(os.getenv("LLM_CONCURRENCIA", "12"))
+LLM_ESPERA = float(os.getenv("LLM_ESPERA", "0.25"))
+
+# ruta -> (rate por usuario, burst por usuario, rate de la ruta, burst de la ruta)
+LIMITES_RUTA = {
+    "/chat": (float(os.getenv("LIMITE_CHAT_RATE", "0.5")), int(os.getenv("LIMITE_CHAT_BURST", "6")),
+              float(os.getenv("LIMITE_CHAT_RUTA_RATE", "20")), int(os.getenv("LIMITE_CHAT_RUTA_BURST", "40"))),
+    "/translator/send": (float(os.getenv("LIMITE_TRAD_RATE", "1")), int(os.getenv("LIMITE_TRAD_BURST", "10")),
+                         float(os.getenv("LIMITE_TRAD_RUTA_RATE", "30")), int(os.getenv("LIMITE_TRAD_RUTA_BURST", "60"))),
+    "/translator/send_batch": (float(os.getenv("LIMITE_LOTE_RATE", "0.2")), int(os.getenv("LIMITE_LOTE_BURST", "3")),
+                               float(os.getenv("LIMITE_LOTE_RUTA_RATE", "5")), int(os.getenv("LIMITE_LOTE_RUTA_BURST", "10"))),
+}
+
+class TokenBucket:
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, burst, ahora):
+        self.tokens = float(burst)
+        self.ts = ahora
+
+class Limitador:
+    def __init__(self, rate, burst, max_claves=LIMITE_CLAVES_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.max_claves = max_claves
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.permitidas = 0
+        self.rechazadas = 0
+
+    # Devuelve (permitida, segundos hasta el próximo token).
+    def permitir(self, clave, coste=1):
+        ahora = time.time()
+        with self._lock:
+            bucket = self._buckets.get(clave)
+            if bucket is None:
+                bucket = self._buckets[clave] = TokenBucket(self.burst, ahora)
+                # el bucket menos usado es el que lleva más tiempo quieto,
+                # y uno quieto está lleno: descartarlo no cambia nada
+                while len(self._buckets) > self.max_claves:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(clave)
+                bucket.tokens = min(self.burst, bucket.tokens + (ahora - bucket.ts) * self.rate)
+                bucket.ts = ahora
+            if bucket.tokens >= coste:
+                bucket.tokens -= coste
+                self.permitidas += 1
+                return True, 0.0
+            self.rechazadas += 1
+            return False, (coste - bucket.tokens) / self.rate if self.rate else 60.0
+
+    # Deshace un permitir() cuya petición rechazó otro limitador.
+    def devolver(self, clave, coste=1):
+        with self._lock:
+            bucket = self._buckets.get(clave)
+            if bucket is not None:
+                bucket.tokens = min(self.burst, bucket.tokens + coste)
+            self.permitidas -= 1
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "claves": len(self._buckets),
+                "permitidas": self.permitidas, "rechazadas": self.rechazadas}
+
+class CupoConcurrencia:
+    def __init__(self, maximo, espera):
+        self.maximo = maximo
+        self.espera = espera
+        self._semaforo = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self.en_vuelo = 0
+        self.pico = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+
+    # Sin hueco en `espera` segundos devuelve False. Los hilos de fondo
+    # pasan espera=None y esperan turno.
+    def entrar(self, espera=-1):
+        if not self._semaforo.acquire(timeout=self.espera if espera == -1 else espera):
+            with self._lock:
+                self.rechazadas += 1
+            return False
+        with self._lock:
+            self.en_vuelo += 1
+            self.admitidas += 1
+            self.pico = max(self.pico, self.en_vuelo)
+        return True
+
+    def salir(self):
+        with self._lock:
+            self.en_vuelo -= 1
+        self._semaforo.release()
+
+    def stats(self):
+        return {"max": self.maximo, "en_vuelo": self.en_vuelo, "pico": self.pico,
+                "admitidas": self.admitidas, "rechazadas": self.rechazadas}
+
+class ControlAdmision:
+    def __init__(self, limites):
+        self.rutas = {ruta: (Limitador(rate, burst), Limitador(ruta_rate, ruta_burst, max_claves=1))
+                      for ruta, (rate, burst, ruta_rate, ruta_burst) in limites.items()}
+
+    # Devuelve (admitida, retry_after). Primero el bucket del usuario, así
+    # un usuario que abusa no consume tokens de la ruta; si luego la ruta
+    # rechaza, se le devuelve el token al usuario.
+    def admitir(self, ruta, user):
+        if not ADMISION or ruta not in self.rutas:
+            return True, 0.0
+        por_usuario, por_ruta = self.rutas[ruta]
+        ok, espera = por_usuario.permitir(user)
+        if not ok:
+            return False, espera
+        ok, espera = por_ruta.permitir(ruta)
+        if not ok:
+            por_usuario.devolver(user)
+        return ok, espera
+
+    def stats(self):
+        return {ruta: {"usuario": u.stats(), "ruta": r.stats()} for ruta, (u, r) in self.rutas.items()}
+
+control = ControlAdmision(LIMITES_RUTA)
+cupo_llm = CupoConcurrencia(LLM_CONCURRENCIA, LLM_ESPERA)
+
+def retry_after(espera):
+    return str(max(1, int(espera + 0.999)))
+
+def stats():
+    return {"activo": ADMISION, "rutas": control.stats(), "llm": cupo_llm.stats()}
+
+# Resumen de una línea por limitador, para el panel admin.
+def resumen():
+    lineas = []
+    for ruta, datos in control.stats().items():
+        u, r = datos["usuario"], datos["ruta"]
+        lineas.append(f"{ruta}: usuario {u['rate']}/s x{u['burst']} ({u['claves']} activos, "
+                      f"{u['rechazadas']} rechazos) | ruta {r['rate']}/s x{r['burst']} ({r['rechazadas']} rechazos)")
+    llm = cupo_llm.stats()
+    lineas.append(f"LLM: {llm['en_vuelo']}/{llm['max']} en vuelo, pico {llm['pico']}, "
+                  f"{llm['rechazadas']} rechazos")
+    if not ADMISION:
+        lineas.append("(limitadores por usuario/ruta desactivados)")
+    return "\n".join(lineas)
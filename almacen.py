@@ -0,0 +1,253 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+# --------------------------------------------------------
+# ALMACENAMIENTO DURABLE DE SESIONES
+# --------------------------------------------------------
+# Backends intercambiables para lo que debe sobrevivir a reinicios y verse
+# igual desde todos los workers de gunicorn: idioma, modelo, modo LSL y
+# scripts guardados. El historial y el contexto siguen siendo solo de
+# memoria.
+#
+# - MemoryBackend: sin persistencia (comportamiento anterior).
+# - SQLiteBackend: SQLite embebido en modo WAL. Las escrituras se acumulan
+#   en memoria y un hilo las vuelca en una sola transacción cada
+#   ALMACEN_INTERVALO segundos, así el camino caliente nunca espera un
+#   fsync. Las lecturas pasan por la cache en proceso (SessionStore) y
+#   solo van a disco al cargar una sesión nueva; los cambios de otros
+#   workers se detectan con PRAGMA data_version (barato, sin consulta).
+
+ALMACEN = os.getenv("ALMACEN", "sqlite")
+ALMACEN_PATH = os.getenv("ALMACEN_PATH", "zenko.db")
+ALMACEN_INTERVALO = float(os.getenv("ALMACEN_INTERVALO", "1.0"))
+ALMACEN_LOTE_MAX = int(os.getenv("ALMACEN_LOTE_MAX", "200"))
+ALMACEN_SYNC = float(os.getenv("ALMACEN_SYNC", "0.5"))
+SCRIPTS_MAX = int(os.getenv("SCRIPTS_MAX", "20"))
+
+class MemoryBackend:
+    def cargar(self, user):
+        return None
+
+    def guardar_prefs(self, user, lang, model, lsl_mode):
+        pass
+
+    def guardar_script(self, user, sid, script):
+        pass
+
+    def pendiente(self, user):
+        return False
+
+    def cambios(self):
+        return ()
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        return {"backend": "memoria"}
+
+class SQLiteBackend:
+    def __init__(self, path, intervalo=ALMACEN_INTERVALO, lote_max=ALMACEN_LOTE_MAX,
+                 sync=ALMACEN_SYNC):
+        self.path = path
+        self.intervalo = intervalo
+        self.lote_max = lote_max
+        self.sync = sync
+        self._pid = None
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._prefs = {}
+        self._scripts = []
+        self._en_vuelo = set()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._data_version = None
+        self._rev_visto = 0
+        self._ultimo_sync = 0.0
+        self.escrituras = 0
+        self.volcados = 0
+        self.lecturas = 0
+        self.invalidaciones = 0
+        atexit.register(self._flush_salida)
+
+    # ── Conexión ─────────────────────────────────────
+    def _conexion(self):
+        # una conexión por proceso: tras el fork de gunicorn se reabre
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), rev INTEGER NOT NULL);
+                INSERT OR IGNORE INTO meta (id, rev) VALUES (1, 0);
+                CREATE TABLE IF NOT EXISTS prefs (
+                    user TEXT PRIMARY KEY, lang TEXT, model TEXT, lsl_mode INTEGER, rev INTEGER);
+                CREATE TABLE IF NOT EXISTS scripts (
+                    user TEXT, sid TEXT, script TEXT, rev INTEGER, PRIMARY KEY (user, sid));
+                CREATE INDEX IF NOT EXISTS prefs_rev ON prefs (rev);
+                CREATE INDEX IF NOT EXISTS scripts_rev ON scripts (rev);
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            self._rev_visto = conn.execute("SELECT rev FROM meta").fetchone()[0]
+            self._hilo = None
+        return self._conn
+
+    # ── Lectura ──────────────────────────────────────
+    def cargar(self, user):
+        with self._db_lock:
+            conn = self._conexion()
+            fila = conn.execute("SELECT lang, model, lsl_mode FROM prefs WHERE user = ?",
+                                (user,)).fetchone()
+            scripts = conn.execute("SELECT sid, script FROM scripts WHERE user = ? ORDER BY sid",
+                                   (user,)).fetchall()
+        self.lecturas += 1
+        datos = {}
+        if fila:
+            datos.update(lang=fila[0], model=fila[1], lsl_mode=bool(fila[2]))
+        if scripts:
+            datos["scripts"] = scripts
+        # lo que aún no se volcó tiene prioridad sobre el disco
+        with self._lock:
+            if user in self._prefs:
+                lang, model, lsl_mode = self._prefs[user]
+                datos.update(lang=lang, model=model, lsl_mode=lsl_mode)
+            extra = [(sid, script) for u, sid, script in self._scripts if u == user]
+        if extra:
+            datos["scripts"] = datos.get("scripts", []) + extra
+        return datos or None
+
+    def pendiente(self, user):
+        with self._lock:
+            return (user in self._prefs or user in self._en_vuelo or
+                    any(u == user for u, _, _ in self._scripts))
+
+    # Usuarios modificados por otros procesos desde la última llamada.
+    # Comprobación limitada a una cada `sync` segundos.
+    def cambios(self):
+        ahora = time.time()
+        if ahora - self._ultimo_sync < self.sync:
+            return ()
+        self._ultimo_sync = ahora
+        with self._db_lock:
+            conn = self._conexion()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return ()
+            self._data_version = version
+            # las dos lecturas en la misma instantánea: un volcado que llegue
+            # entre ambas no puede quedar marcado como visto sin recargarse
+            conn.execute("BEGIN")
+            try:
+                rev = conn.execute("SELECT rev FROM meta").fetchone()[0]
+                filas = conn.execute(
+                    "SELECT user FROM prefs WHERE rev > ? UNION SELECT user FROM scripts WHERE rev > ?",
+                    (self._rev_visto, self._rev_visto)).fetchall()
+            finally:
+                conn.execute("COMMIT")
+            self._rev_visto = rev
+        self.invalidaciones += len(filas)
+        return [f[0] for f in filas]
+
+    # ── Escritura por lotes ──────────────────────────
+    def guardar_prefs(self, user, lang, model, lsl_mode):
+        with self._lock:
+            self._prefs[user] = (lang, model, lsl_mode)
+            n = len(self._prefs) + len(self._scripts)
+        self._programar(n)
+
+    def guardar_script(self, user, sid, script):
+        with self._lock:
+            self._scripts.append((user, sid, script))
+            n = len(self._prefs) + len(self._scripts)
+        self._programar(n)
+
+    def _programar(self, n):
+        self.escrituras += 1
+        if self._hilo is None or not self._hilo.is_alive() or self._pid != os.getpid():
+            with self._db_lock:
+                self._conexion()
+                if self._hilo is None or not self._hilo.is_alive():
+                    self._hilo = threading.Thread(target=self._bucle, daemon=True, name="almacen")
+                    self._hilo.start()
+        if n >= self.lote_max:
+            self._despertar.set()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print("Error volcando almacen:", e)
+
+    def flush(self):
+        with self._lock:
+            prefs, self._prefs = self._prefs, {}
+            scripts, self._scripts = self._scripts, []
+            if not prefs and not scripts:
+                return
+            usuarios = {u for u, _, _ in scripts}
+            self._en_vuelo = usuarios | set(prefs)
+        try:
+            with self._db_lock:
+                conn = self._conexion()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("UPDATE meta SET rev = rev + 1")
+                    rev = conn.execute("SELECT rev FROM meta").fetchone()[0]
+                    conn.executemany(
+                        "INSERT INTO prefs (user, lang, model, lsl_mode, rev) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(user) DO UPDATE SET lang = excluded.lang, model = excluded.model, "
+                        "lsl_mode = excluded.lsl_mode, rev = excluded.rev",
+                        [(u, lang, model, int(lsl), rev) for u, (lang, model, lsl) in prefs.items()])
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO scripts (user, sid, script, rev) VALUES (?, ?, ?, ?)",
+                        [(u, sid, script, rev) for u, sid, script in scripts])
+                    for u in usuarios:
+                        conn.execute(
+                            "DELETE FROM scripts WHERE user = ? AND sid NOT IN "
+                            "(SELECT sid FROM scripts WHERE user = ? ORDER BY sid DESC LIMIT ?)",
+                            (u, u, SCRIPTS_MAX))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except Exception:
+            # se devuelven al buffer para el próximo intento
+            with self._lock:
+                for u, p in prefs.items():
+                    self._prefs.setdefault(u, p)
+                self._scripts[:0] = scripts
+                self._en_vuelo = set()
+            raise
+        with self._lock:
+            self._en_vuelo = set()
+        self.volcados += 1
+
+    def _flush_salida(self):
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print("Error volcando almacen al salir:", e)
+
+    def stats(self):
+        with self._lock:
+            pendientes = len(self._prefs) + len(self._scripts)
+        return {
+            "backend": "sqlite", "path": self.path, "pendientes": pendientes,
+            "escrituras": self.escrituras, "volcados": self.volcados,
+            "lecturas": self.lecturas, "invalidaciones": self.invalidaciones
+        }
+
+def crear_backend():
+    if ALMACEN == "sqlite" and ALMACEN_PATH:
+        return SQLiteBackend(ALMACEN_PATH)
+    return MemoryBackend()
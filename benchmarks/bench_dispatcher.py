@@ -0,0 +1,40 @@
+import os
+import sys
+import timeit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "tests"))
+
+from dispatcher import CommandDispatcher
+from main import LANGUAGE_CONFIGS
+from test_dispatcher import CON_ARGUMENTO, CORPUS, legacy_detect_command, legacy_extract_command_argument
+
+# --------------------------------------------------------
+# BENCHMARK: despachador compilado vs cadena de startswith
+# --------------------------------------------------------
+# Uso: python benchmarks/bench_dispatcher.py
+# Mide detección + extracción del argumento. La equivalencia (tipo y
+# argumento) la comprueba tests/test_dispatcher.py (python -m pytest).
+
+def legacy(lang, msg):
+    tipo = legacy_detect_command(msg, lang)
+    if tipo in CON_ARGUMENTO:
+        try:
+            legacy_extract_command_argument(msg, tipo, lang)
+        except IndexError:
+            pass
+    return tipo
+
+def main():
+    despachador = CommandDispatcher(LANGUAGE_CONFIGS)
+    n = 2000
+    t_legacy = timeit.timeit(lambda: [legacy(lang, msg) for lang, msg in CORPUS], number=n)
+    t_nuevo = timeit.timeit(lambda: [despachador.match(msg, lang) for lang, msg in CORPUS], number=n)
+    por_msg = 1e6 / (n * len(CORPUS))
+    print(f"cadena startswith: {t_legacy * por_msg:.2f} us/mensaje")
+    print(f"despachador:       {t_nuevo * por_msg:.2f} us/mensaje")
+    print(f"speedup:           {t_legacy / t_nuevo:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import timeit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "tests"))
+
+from normalizacion import clean_text, clean_texts, limpiar_texto, limpiar_textos
+from test_normalizacion import MUESTRAS, legacy_clean_text, legacy_limpiar_texto
+
+# --------------------------------------------------------
+# BENCHMARK: normalizacion.py vs implementaciones anteriores
+# --------------------------------------------------------
+# Uso: python benchmarks/bench_normalizacion.py
+# Mide ambas versiones. La equivalencia de la salida la comprueba
+# tests/test_normalizacion.py (python -m pytest).
+
+def medir(nombre, viejo, nuevo, lote):
+    n = 2000
+    t_viejo = timeit.timeit(lambda: [viejo(t) for t in MUESTRAS], number=n)
+    t_nuevo = timeit.timeit(lambda: [nuevo(t) for t in MUESTRAS], number=n)
+    t_lote = timeit.timeit(lambda: lote(MUESTRAS), number=n)
+    por_texto = 1e6 / (n * len(MUESTRAS))
+    print(f"{nombre}: anterior {t_viejo * por_texto:.2f} us, nuevo {t_nuevo * por_texto:.2f} us, "
+          f"lote {t_lote * por_texto:.2f} us por texto ({t_viejo / t_nuevo:.1f}x)")
+
+def main():
+    medir("clean_text   ", legacy_clean_text, clean_text, clean_texts)
+    medir("limpiar_texto", legacy_limpiar_texto, limpiar_texto, limpiar_textos)
+
+if __name__ == "__main__":
+    main()
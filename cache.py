@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# --------------------------------------------------------
+# CACHE LRU + TTL
+# --------------------------------------------------------
+# Cache en memoria acotada por número de entradas, por bytes aproximados
+# y por tiempo de vida. Thread-safe; lleva contadores para /health.
+
+def tamano_aprox(obj):
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(tamano_aprox(x) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamano_aprox(k) + tamano_aprox(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
+
+class TTLCache:
+    def __init__(self, max_items=1024, ttl=600, max_bytes=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (valor, expira, bytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, contar=False) is not None
+
+    def _quitar(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key, default=None, contar=True):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                if contar:
+                    self.misses += 1
+                return default
+            if item[1] <= time.time():
+                self._quitar(key)
+                self.expirations += 1
+                if contar:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if contar:
+                self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        size = tamano_aprox(key) + tamano_aprox(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expira = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._quitar(key)
+            self._data[key] = (value, expira, size)
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_items or
+                                  (self.max_bytes and self.bytes > self.max_bytes)):
+                self._quitar(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            self._quitar(key)
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self.bytes = 0
+            return n
+
+    # Persistencia en JSON (claves tupla -> lista). Escritura atómica para
+    # que varios procesos puedan guardar sobre el mismo fichero.
+    def guardar(self, path):
+        ahora = time.time()
+        with self._lock:
+            items = [[list(k) if isinstance(k, tuple) else k, v, exp]
+                     for k, (v, exp, _) in self._data.items() if exp > ahora]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return len(items)
+
+    def cargar(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        ahora = time.time()
+        n = 0
+        for k, v, exp in items:
+            if exp > ahora:
+                self.set(tuple(k) if isinstance(k, list) else k, v, ttl=exp - ahora)
+                n += 1
+        return n
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "items": len(self._data), "bytes": self.bytes,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+# --------------------------------------------------------
+# SINGLE-FLIGHT
+# --------------------------------------------------------
+# Agrupa llamadas concurrentes con la misma clave: solo la primera va al
+# origen y las demás esperan y reciben el mismo resultado (o excepción).
+
+class _Vuelo:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.llamadas = 0
+        self.agrupadas = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            vuelo = self._vuelos.get(key)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[key] = _Vuelo()
+                self.llamadas += 1
+            else:
+                self.agrupadas += 1
+
+        if not lider:
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+
+        try:
+            vuelo.resultado = fn()
+            return vuelo.resultado
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(key, None)
+            vuelo.evento.set()
+
+    def stats(self):
+        return {"llamadas": self.llamadas, "agrupadas": self.agrupadas,
+                "en_vuelo": len(self._vuelos)}
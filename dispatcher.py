@@ -0,0 +1,66 @@
+import re
+
+# --------------------------------------------------------
+# DESPACHADOR DE COMANDOS
+# --------------------------------------------------------
+# Se compila una vez a partir de LANGUAGE_CONFIGS[lang]["keywords"]: por
+# idioma, una tabla de comandos exactos y una única expresión anclada con
+# todos los prefijos (primero los del idioma, luego los del idioma de
+# respaldo; dentro de cada grupo, el prefijo más largo gana). Un solo
+# match devuelve el tipo de comando y dónde empieza su argumento, así que
+# añadir un idioma es solo añadir su entrada de configuración.
+
+PREFIJO = "@zenko "
+
+# claves de "keywords" que son comandos con prefijo (tipo -> clave)
+COMANDOS_PREFIJO = (
+    "funciones", "clima", "noticias", "eventos", "busca", "define", "wikipedia",
+    "snippet", "historial", "lista scripts", "ver script", "guarda script"
+)
+
+class CommandDispatcher:
+    def __init__(self, language_configs, fallback="es"):
+        self.fallback = fallback
+        self.tablas = {}
+        base = self._prefijos(language_configs[fallback])
+        for lang, cfg in language_configs.items():
+            propios = [] if lang == fallback else self._prefijos(cfg)
+            self.tablas[lang] = self._compilar(propios, base, cfg)
+
+    @staticmethod
+    def _prefijos(cfg):
+        keywords = cfg["keywords"]
+        return sorted(((PREFIJO + keywords[tipo], tipo) for tipo in COMANDOS_PREFIJO if tipo in keywords),
+                      key=lambda p: -len(p[0]))
+
+    @staticmethod
+    def _compilar(propios, base, cfg):
+        tipos = []
+        alternativas = []
+        for prefijo, tipo in propios + base:
+            alternativas.append(f"({re.escape(prefijo)})")
+            tipos.append(tipo)
+        lsl = PREFIJO + cfg["keywords"].get("lsl", "lsl")
+        exactos = {f"{lsl} on": "lsl_on", f"{lsl} off": "lsl_off",
+                   f"{PREFIJO}lsl on": "lsl_on", f"{PREFIJO}lsl off": "lsl_off"}
+        return exactos, re.compile("|".join(alternativas)), tipos
+
+    # Devuelve (tipo, argumento) o (None, "").
+    def match(self, raw_msg, lang):
+        m = raw_msg.lower().strip()
+        if not m.startswith(PREFIJO):
+            return None, ""
+        exactos, patron, tipos = self.tablas.get(lang) or self.tablas[self.fallback]
+        tipo = exactos.get(m)
+        if tipo:
+            return tipo, ""
+        mo = patron.match(m)
+        if mo is None:
+            return None, ""
+        raw = raw_msg.strip()
+        if len(raw) == len(m):
+            argumento = raw[mo.end():].strip()
+        else:
+            # lower() cambió la longitud (caracteres raros): argumento en minúsculas
+            argumento = m[mo.end():].strip()
+        return tipos[mo.lastindex - 1], argumento
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+
+from almacen import ALMACEN, ALMACEN_PATH
+
+# --------------------------------------------------------
+# ESTADO COMPARTIDO DEL SISTEMA DE UPDATES
+# --------------------------------------------------------
+# MIN_VERSION, pendientes y blacklist viven en SQLite (el mismo fichero
+# que almacen.py) para que todos los workers de gunicorn respondan lo
+# mismo y el estado sobreviva a reinicios. Cada proceso guarda una copia
+# en memoria con un contador de versión: las lecturas solo comprueban
+# PRAGMA data_version (sin tocar tablas) y recargan únicamente cuando
+# otro proceso confirmó un cambio. Las escrituras son síncronas: son
+# comandos admin y avisos de HUD, poco frecuentes.
+
+HUD_SYNC = float(os.getenv("HUD_SYNC", "0.2"))
+
+class EstadoHUD:
+    def __init__(self, path, min_version_inicial=1, sync=HUD_SYNC):
+        self.path = path
+        self.min_version_inicial = min_version_inicial
+        self.sync = sync
+        self._pid = None
+        self._conn = None
+        self._lock = threading.RLock()
+        self._data_version = None
+        self._ultimo_sync = 0.0
+        self.version = -1
+        self._min_version = min_version_inicial
+        self._pendientes = set()
+        self._blacklist = set()
+        self.recargas = 0
+
+    # ── Conexión ─────────────────────────────────────
+    def _conexion(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                   isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS hud_meta (id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL, min_version INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS hud_pendientes (owner TEXT PRIMARY KEY);
+                CREATE TABLE IF NOT EXISTS hud_blacklist (owner TEXT PRIMARY KEY);
+            """)
+            conn.execute("INSERT OR IGNORE INTO hud_meta (id, version, min_version) VALUES (1, 0, ?)",
+                         (self.min_version_inicial,))
+            self._conn = conn
+            self._pid = os.getpid()
+            self._data_version = None
+            self.version = -1
+        return self._conn
+
+    def _recargar(self, conn):
+        version, min_version = conn.execute("SELECT version, min_version FROM hud_meta").fetchone()
+        if version == self.version:
+            return
+        self._min_version = min_version
+        self._pendientes = {f[0] for f in conn.execute("SELECT owner FROM hud_pendientes")}
+        self._blacklist = {f[0] for f in conn.execute("SELECT owner FROM hud_blacklist")}
+        self.version = version
+        self.recargas += 1
+
+    # Pone al día la copia local si otro proceso cambió algo.
+    def refrescar(self):
+        ahora = time.time()
+        if self.version >= 0 and self._pid == os.getpid() and ahora - self._ultimo_sync < self.sync:
+            return
+        with self._lock:
+            conn = self._conexion()
+            self._ultimo_sync = ahora
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version or self.version < 0:
+                self._data_version = data_version
+                self._recargar(conn)
+
+    # `aplicar` hace el mismo cambio en la copia local. Si la copia estaba al
+    # día (nadie más escribió desde la última carga) basta con aplicarlo y
+    # subir la versión; recargar las tablas enteras costaba milisegundos por
+    # escritura con miles de pendientes. Si no, se recarga como en refrescar.
+    def _escribir(self, sentencias, aplicar):
+        with self._lock:
+            conn = self._conexion()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("SELECT version FROM hud_meta").fetchone()[0]
+                antes = conn.total_changes
+                for sql, args in sentencias:
+                    conn.execute(sql, args)
+                # una escritura que no cambia nada no obliga a recargar
+                cambio = conn.total_changes != antes
+                if cambio:
+                    conn.execute("UPDATE hud_meta SET version = version + 1")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if version != self.version:
+                self._recargar(conn)
+            elif cambio:
+                aplicar()
+                self.version = version + 1
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # ── MIN_VERSION ──────────────────────────────────
+    def min_version(self):
+        self.refrescar()
+        return self._min_version
+
+    def set_min_version(self, n):
+        n = int(n)
+        def aplicar():
+            self._min_version = n
+        self._escribir([("UPDATE hud_meta SET min_version = ?", (n,))], aplicar)
+
+    # ── Blacklist ────────────────────────────────────
+    def esta_bloqueado(self, owner):
+        self.refrescar()
+        return owner in self._blacklist
+
+    def bloqueados(self):
+        self.refrescar()
+        return sorted(self._blacklist)
+
+    def bloquear(self, owner):
+        self._escribir([("INSERT OR IGNORE INTO hud_blacklist (owner) VALUES (?)", (owner,))],
+                       lambda: self._blacklist.add(owner))
+
+    def desbloquear(self, owner):
+        self._escribir([("DELETE FROM hud_blacklist WHERE owner = ?", (owner,))],
+                       lambda: self._blacklist.discard(owner))
+
+    # ── Pendientes ───────────────────────────────────
+    def pendientes(self):
+        self.refrescar()
+        return sorted(self._pendientes)
+
+    def entregables(self):
+        self.refrescar()
+        return sorted(self._pendientes - self._blacklist)
+
+    # Sin mirar la copia local: puede llevar hasta `sync` segundos de
+    # retraso y otro worker acabar de cambiar la fila.
+    def agregar_pendiente(self, owner):
+        self._escribir([("INSERT OR IGNORE INTO hud_pendientes (owner) VALUES (?)", (owner,))],
+                       lambda: self._pendientes.add(owner))
+
+    def quitar_pendiente(self, owner):
+        self._escribir([("DELETE FROM hud_pendientes WHERE owner = ?", (owner,))],
+                       lambda: self._pendientes.discard(owner))
+
+    def limpiar_pendientes(self):
+        self._escribir([("DELETE FROM hud_pendientes", ())], self._pendientes.clear)
+
+    def stats(self):
+        return {"version": self.version, "recargas": self.recargas,
+                "pendientes": len(self._pendientes), "bloqueados": len(self._blacklist)}
+
+def crear_estado_hud(min_version_inicial):
+    path = ALMACEN_PATH if ALMACEN == "sqlite" and ALMACEN_PATH else ":memory:"
+    return EstadoHUD(path, min_version_inicial)
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+import http_client
+
+# --------------------------------------------------------
+# CACHE DE FEEDS
+# --------------------------------------------------------
+# Los feeds RSS cambian pocas veces por hora: un hilo en segundo plano los
+# refresca con GET condicional (ETag / Last-Modified) y deja la respuesta
+# ya renderizada en memoria. Las peticiones nunca esperan a la red salvo
+# la primera vez; si el origen falla o tarda se sigue sirviendo lo último
+# que se obtuvo.
+
+FEEDS_INTERVALO = int(os.getenv("FEEDS_INTERVALO", "600"))
+FEEDS_TICK = int(os.getenv("FEEDS_TICK", "15"))
+FEEDS_REINTENTO = int(os.getenv("FEEDS_REINTENTO", "60"))
+
+class Feed:
+    # parsear(contenido: bytes) -> lista de líneas ya formateadas
+    # renderizar(lineas, max_items) -> texto de respuesta
+    def __init__(self, nombre, url, parsear, renderizar, mensaje_error,
+                 max_items=10, intervalo=FEEDS_INTERVALO):
+        self.nombre = nombre
+        self.url = url
+        self.parsear = parsear
+        self.renderizar = renderizar
+        self.mensaje_error = mensaje_error
+        self.max_items = max_items
+        self.intervalo = intervalo
+        self.etag = None
+        self.last_modified = None
+        self.lineas = None
+        self.respuesta = None
+        self.actualizado = 0
+        self.intentado = 0
+        self.error = None
+        self.lock = threading.Lock()
+
+    def vencido(self):
+        # tras un error se reintenta antes que el intervalo normal
+        espera = min(self.intervalo, FEEDS_REINTENTO) if self.error else self.intervalo
+        return time.time() - self.intentado >= espera
+
+class FeedCache:
+    def __init__(self, tick=FEEDS_TICK):
+        self.tick = tick
+        self.feeds = {}
+        self._hilo = None
+        self._hilo_lock = threading.Lock()
+        self.stats = {"refrescos": 0, "no_modificados": 0, "errores": 0, "servidos": 0}
+
+    def registrar(self, feed):
+        self.feeds[feed.nombre] = feed
+        return feed
+
+    # ── Descarga ─────────────────────────────────────
+    def refrescar(self, feed, solo_si_vacio=False):
+        with feed.lock:
+            if solo_si_vacio and feed.respuesta is not None:
+                return
+            feed.intentado = time.time()
+            headers = {}
+            if feed.etag:
+                headers["If-None-Match"] = feed.etag
+            if feed.last_modified:
+                headers["If-Modified-Since"] = feed.last_modified
+            try:
+                r = http_client.get(feed.url, headers=headers)
+                if r.status_code == 304 and feed.respuesta is not None:
+                    feed.actualizado = time.time()
+                    feed.error = None
+                    self.stats["no_modificados"] += 1
+                    return
+                r.raise_for_status()
+                lineas = feed.parsear(r.content)
+                feed.lineas = lineas
+                feed.respuesta = feed.renderizar(lineas, feed.max_items)
+                feed.etag = r.headers.get("ETag")
+                feed.last_modified = r.headers.get("Last-Modified")
+                feed.actualizado = time.time()
+                feed.error = None
+                self.stats["refrescos"] += 1
+            except Exception as e:
+                feed.error = str(e)
+                self.stats["errores"] += 1
+                print(f"Error refrescando feed {feed.nombre}:", e)
+
+    def _bucle(self):
+        while True:
+            for feed in list(self.feeds.values()):
+                if feed.vencido():
+                    self.refrescar(feed)
+            time.sleep(self.tick)
+
+    def iniciar(self):
+        # Arranque perezoso: cada worker de gunicorn tiene su propio hilo.
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._hilo_lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="feeds")
+                self._hilo.start()
+
+    # ── Lectura ──────────────────────────────────────
+    def obtener(self, nombre, max_items=None):
+        feed = self.feeds[nombre]
+        self.iniciar()
+        if feed.respuesta is None:
+            # arranque en frío: única vez que una petición espera a la red
+            if feed.vencido():
+                self.refrescar(feed, solo_si_vacio=True)
+            if feed.respuesta is None:
+                return feed.mensaje_error.format(feed.error or "sin datos")
+        self.stats["servidos"] += 1
+        if max_items is None or max_items == feed.max_items:
+            return feed.respuesta
+        return feed.renderizar(feed.lineas, max_items)
+
+    def estado(self):
+        ahora = time.time()
+        return {
+            nombre: {
+                "edad": round(ahora - f.actualizado, 1) if f.actualizado else None,
+                "lineas": len(f.lineas) if f.lineas is not None else None,
+                "error": f.error
+            } for nombre, f in self.feeds.items()
+        }
@@ -0,0 +1,36 @@
+import sys
+
+import servidor
+
+# --------------------------------------------------------
+# CONFIGURACIÓN DE GUNICORN
+# --------------------------------------------------------
+# Uso: gunicorn -c gunicorn.conf.py main:app
+# El modo y el tamaño se eligen con variables de entorno (ver servidor.py):
+# SERVIDOR_MODO=gthread|gevent|sync, WEB_CONCURRENCY, GUNICORN_THREADS,
+# GEVENT_CONEXIONES, GUNICORN_TIMEOUT, GUNICORN_KEEPALIVE.
+
+_cfg = servidor.configuracion()
+
+bind = _cfg["bind"]
+workers = _cfg["workers"]
+worker_class = _cfg["worker_class"]
+threads = _cfg.get("threads", 1)
+worker_connections = _cfg.get("worker_connections", 1000)
+timeout = _cfg["timeout"]
+keepalive = _cfg["keepalive"]
+preload_app = _cfg["preload_app"]
+
+def post_worker_init(worker):
+    errores, avisos = servidor.comprobar_concurrencia(worker_class, workers)
+    for aviso in avisos:
+        worker.log.warning("concurrencia: %s", aviso)
+    if errores:
+        for error in errores:
+            worker.log.error("concurrencia: %s", error)
+        # código de fallo de arranque: el master se detiene en vez de
+        # relanzar el worker en bucle
+        from gunicorn.arbiter import Arbiter
+        sys.exit(Arbiter.WORKER_BOOT_ERROR)
+    worker.log.info("modo %s, %s peticiones simultáneas por worker",
+                    worker_class, servidor.concurrencia(worker_class))
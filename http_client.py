@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metricas
+
+# --------------------------------------------------------
+# CLIENTE HTTP COMPARTIDO
+# --------------------------------------------------------
+# Una sola sesión con un adaptador (pool keep-alive) por host, para que
+# main.py y translate_api.py reutilicen las conexiones TCP+TLS en vez de
+# abrir una nueva en cada llamada.
+
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+LLM_POOL_MAXSIZE = int(os.getenv("HTTP_LLM_POOL_MAXSIZE", "32"))
+RETRY_TOTAL = int(os.getenv("HTTP_RETRY_TOTAL", "2"))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+RETRY_BACKOFF_MAX = float(os.getenv("HTTP_RETRY_BACKOFF_MAX", "2"))
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# timeout = (conexión, lectura); retries = presupuesto de reintentos del host;
+# upstream = etiqueta en las métricas
+HOSTS = {
+    "api.groq.com":           {"timeout": (3.05, 30), "retries": 1, "pool": LLM_POOL_MAXSIZE, "upstream": "groq"},
+    "api.deepseek.com":       {"timeout": (3.05, 30), "retries": 1, "pool": LLM_POOL_MAXSIZE, "upstream": "deepseek"},
+    "api.firecrawl.dev":      {"timeout": (3.05, 8),  "retries": 1, "upstream": "firecrawl"},
+    "api.openweathermap.org": {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "openweather"},
+    "es.wikipedia.org":       {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "wikipedia"},
+    "en.wikipedia.org":       {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "wikipedia"},
+    "fr.wikipedia.org":       {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "wikipedia"},
+    "it.wikipedia.org":       {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "wikipedia"},
+    "www.infobae.com":        {"timeout": (3.05, 5),  "retries": RETRY_TOTAL, "upstream": "rss"},
+    "www.seraphimsl.com":     {"timeout": (3.05, 8),  "retries": RETRY_TOTAL, "upstream": "rss"},
+}
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+# urllib3 duerme lo que diga Retry-After, sin tope: un "Retry-After: 120"
+# retendría la petición minutos. Se acota a RETRY_BACKOFF_MAX, igual que
+# el backoff propio.
+class RetryAcotado(Retry):
+    def get_retry_after(self, response):
+        espera = super().get_retry_after(response)
+        if espera is None:
+            return None
+        return min(espera, RETRY_BACKOFF_MAX)
+
+def _retry(total):
+    # POST (las llamadas a los LLM) no se reintenta por estado: un 429 o
+    # un 5xx puede llegar con la petición ya procesada y cobrada. Solo se
+    # repite si la conexión no llegó a establecerse. Para GET se respeta
+    # el Retry-After del servidor, acotado.
+    return RetryAcotado(
+        total=total, connect=total, read=0, status=total,
+        backoff_factor=RETRY_BACKOFF, backoff_max=RETRY_BACKOFF_MAX,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True, raise_on_status=False
+    )
+
+def _adapter(retries, pool=None):
+    return HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                       pool_maxsize=pool or POOL_MAXSIZE,
+                       max_retries=_retry(retries))
+
+def _config_host(url):
+    return HOSTS.get(urlsplit(url).hostname or "", {})
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                default = _adapter(RETRY_TOTAL)
+                s.mount("https://", default)
+                s.mount("http://", default)
+                for host, cfg in HOSTS.items():
+                    adapter = _adapter(cfg.get("retries", RETRY_TOTAL), cfg.get("pool"))
+                    s.mount(f"https://{host}", adapter)
+                    s.mount(f"http://{host}", adapter)
+                _session = s
+    return _session
+
+# Con stream=True la latencia medida es hasta recibir las cabeceras.
+def request(method, url, **kwargs):
+    cfg = _config_host(url)
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = cfg.get("timeout", DEFAULT_TIMEOUT)
+    upstream = cfg.get("upstream", "otro")
+    inicio = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except Exception:
+        metricas.contar("zenko_upstream_requests_total", upstream=upstream)
+        metricas.contar("zenko_upstream_errors_total", upstream=upstream)
+        raise
+    metricas.observar("zenko_upstream_duration_seconds", time.perf_counter() - inicio, upstream=upstream)
+    metricas.contar("zenko_upstream_requests_total", upstream=upstream)
+    if response.status_code >= 400:
+        metricas.contar("zenko_upstream_errors_total", upstream=upstream)
+    return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -6,10 +6,27 @@ import feedparser
 import time
 import difflib
 import json
+import re
+import atexit
+import tempfile
 import threading
-from flask import Response
+import hashlib
+from flask import Response, stream_with_context, g
 from bs4 import BeautifulSoup
-from translate_api import traductor_bp
+from translate_api import traductor_bp, leer_flag
+import http_client
+from feeds import Feed, FeedCache
+from cache import TTLCache, SingleFlight
+from dispatcher import CommandDispatcher
+from normalizacion import clean_text, clean_text_chars, clean_texts
+from sesiones import SessionStore
+from almacen import crear_backend
+from estado_hud import crear_estado_hud
+from router_llm import Proveedor, RouterLLM
+import admision
+from admision import cupo_llm
+import metricas
+from perfilador import perfilador, PERFIL_FRACCION, PERFIL_LENTO, PERFIL_DIR
 
 # --------------------------------------------------------
 # CONFIGURACIÓN DE IDIOMAS
@@ -38,7 +55,8 @@ LANGUAGE_CONFIGS = {
             "funciones": "funciones", "clima": "clima", "noticias": "noticias",
             "eventos": "eventos", "busca": "busca", "define": "define",
             "wikipedia": "wikipedia", "snippet": "snippet", "historial": "historial",
-            "scripts": "scripts", "ver": "ver", "guarda": "guarda", "lsl": "lsl"
+            "scripts": "scripts", "ver": "ver", "guarda": "guarda", "lsl": "lsl",
+            "lista scripts": "lista scripts", "ver script": "ver script", "guarda script": "guarda script"
         },
         "responses": {
             "command_not_found": "Comando no reconocido",
@@ -63,7 +81,7 @@ LANGUAGE_CONFIGS = {
             "events_title": "Próximos eventos:",
             "events_not_found": "No hay eventos disponibles en este momento.",
             "events_error": "Error al obtener eventos: {}",
-            "admin_panel": "=== PANEL DE ADMINISTRACION ZENKO ===\n\n[ VERSION ]\n  @zenko version              -> Ver MIN_VERSION actual\n  @zenko update <n>           -> Cambiar MIN_VERSION\n\n[ HUD / ACTUALIZACIONES ]\n  @zenko hud list             -> Ver UUIDs con update pendiente\n  @zenko hud clear <uuid>     -> Remover UUID de pendientes\n  @zenko hud clearall         -> Vaciar todos los pendientes\n\n[ BLACKLIST ]\n  @zenko ban <uuid>           -> Banear UUID\n  @zenko ban list             -> Ver lista de baneados\n  @zenko unban <uuid>         -> Desbanear UUID\n\n[ SISTEMA ]\n  @zenko panel                -> Mostrar este panel",
+            "admin_panel": "=== PANEL DE ADMINISTRACION ZENKO ===\n\n[ VERSION ]\n  @zenko version              -> Ver MIN_VERSION actual\n  @zenko update <n>           -> Cambiar MIN_VERSION\n\n[ HUD / ACTUALIZACIONES ]\n  @zenko hud list             -> Ver UUIDs con update pendiente\n  @zenko hud clear <uuid>     -> Remover UUID de pendientes\n  @zenko hud clearall         -> Vaciar todos los pendientes\n\n[ BLACKLIST ]\n  @zenko ban <uuid>           -> Banear UUID\n  @zenko ban list             -> Ver lista de baneados\n  @zenko unban <uuid>         -> Desbanear UUID\n\n[ SISTEMA ]\n  @zenko panel                -> Mostrar este panel\n  @zenko cache flush          -> Vaciar cache de respuestas\n  @zenko limits               -> Ver limitadores y rechazos\n  @zenko profile on|off       -> Perfilado de peticiones",
             "admin_version":    "MIN_VERSION actual: {}",
             "admin_updated":    "Version minima actualizada a {}.",
             "admin_update_uso": "Uso: @zenko update <numero>",
@@ -74,7 +92,13 @@ LANGUAGE_CONFIGS = {
             "admin_unbanned":   "Desbaneado: {}",
             "admin_banned":     "Baneado: {}",
             "admin_no_banned":  "No hay baneados.",
-            "admin_ban_list":   "Baneados:\n{}"
+            "admin_ban_list":   "Baneados:\n{}",
+            "admin_cache_flushed": "Cache de respuestas vaciada en todos los workers ({} entradas en este).",
+            "admin_limits":     "=== LIMITES ===\n{}",
+            "admin_profile_on": "Perfilado activado: {} de las peticiones y toda la que pase de {} s. Perfiles en {}",
+            "admin_profile_off": "Perfilado desactivado. Perfiles en {}",
+            "admin_profile_uso": "Uso: @zenko profile on|off",
+            "busy": "Zenko esta atendiendo a muchos viajeros. Vuelve a intentarlo en {} segundos."
         }
     },
     "en": {
@@ -99,7 +123,8 @@ LANGUAGE_CONFIGS = {
             "funciones": "functions", "clima": "weather", "noticias": "news",
             "eventos": "events", "busca": "search", "define": "define",
             "wikipedia": "wikipedia", "snippet": "snippet", "historial": "history",
-            "scripts": "scripts", "ver": "view", "guarda": "save", "lsl": "lsl"
+            "scripts": "scripts", "ver": "view", "guarda": "save", "lsl": "lsl",
+            "lista scripts": "list scripts", "ver script": "view script", "guarda script": "save script"
         },
         "responses": {
             "command_not_found": "Command not recognized",
@@ -124,7 +149,7 @@ LANGUAGE_CONFIGS = {
             "events_title": "Upcoming events:",
             "events_not_found": "No events available at the moment.",
             "events_error": "Error getting events: {}",
-            "admin_panel": "=== ZENKO ADMIN PANEL ===\n\n[ VERSION ]\n  @zenko version              -> View current MIN_VERSION\n  @zenko update <n>           -> Change MIN_VERSION\n\n[ HUD / UPDATES ]\n  @zenko hud list             -> View UUIDs with pending update\n  @zenko hud clear <uuid>     -> Remove UUID from pending\n  @zenko hud clearall         -> Clear all pending\n\n[ BLACKLIST ]\n  @zenko ban <uuid>           -> Ban UUID\n  @zenko ban list             -> View banned list\n  @zenko unban <uuid>         -> Unban UUID\n\n[ SYSTEM ]\n  @zenko panel                -> Show this panel",
+            "admin_panel": "=== ZENKO ADMIN PANEL ===\n\n[ VERSION ]\n  @zenko version              -> View current MIN_VERSION\n  @zenko update <n>           -> Change MIN_VERSION\n\n[ HUD / UPDATES ]\n  @zenko hud list             -> View UUIDs with pending update\n  @zenko hud clear <uuid>     -> Remove UUID from pending\n  @zenko hud clearall         -> Clear all pending\n\n[ BLACKLIST ]\n  @zenko ban <uuid>           -> Ban UUID\n  @zenko ban list             -> View banned list\n  @zenko unban <uuid>         -> Unban UUID\n\n[ SYSTEM ]\n  @zenko panel                -> Show this panel\n  @zenko cache flush          -> Flush response cache\n  @zenko limits               -> View rate limiters and rejections\n  @zenko profile on|off       -> Request profiling",
             "admin_version":    "Current MIN_VERSION: {}",
             "admin_updated":    "Minimum version updated to {}.",
             "admin_update_uso": "Usage: @zenko update <number>",
@@ -135,7 +160,13 @@ LANGUAGE_CONFIGS = {
             "admin_unbanned":   "Unbanned: {}",
             "admin_banned":     "Banned: {}",
             "admin_no_banned":  "No banned users.",
-            "admin_ban_list":   "Banned:\n{}"
+            "admin_ban_list":   "Banned:\n{}",
+            "admin_cache_flushed": "Response cache flushed on every worker ({} entries on this one).",
+            "admin_limits":     "=== LIMITS ===\n{}",
+            "admin_profile_on": "Profiling on: {} of requests plus any slower than {} s. Profiles in {}",
+            "admin_profile_off": "Profiling off. Profiles in {}",
+            "admin_profile_uso": "Usage: @zenko profile on|off",
+            "busy": "Zenko is attending to many travelers. Please try again in {} seconds."
         }
     },
     "fr": {
@@ -160,7 +191,8 @@ LANGUAGE_CONFIGS = {
             "funciones": "fonctions", "clima": "météo", "noticias": "actualités",
             "eventos": "événements", "busca": "recherche", "define": "définir",
             "wikipedia": "wikipedia", "snippet": "snippet", "historial": "historique",
-            "scripts": "scripts", "ver": "voir", "guarda": "enregistrer", "lsl": "lsl"
+            "scripts": "scripts", "ver": "voir", "guarda": "enregistrer", "lsl": "lsl",
+            "lista scripts": "liste scripts", "ver script": "voir script", "guarda script": "enregistrer script"
         },
         "responses": {
             "command_not_found": "Commande non reconnue",
@@ -185,7 +217,7 @@ LANGUAGE_CONFIGS = {
             "events_title": "Événements à venir:",
             "events_not_found": "Aucun événement disponible pour le moment.",
             "events_error": "Erreur lors de l'obtention des événements: {}",
-            "admin_panel": "=== PANNEAU ADMIN ZENKO ===\n\n[ VERSION ]\n  @zenko version              -> Voir MIN_VERSION actuelle\n  @zenko update <n>           -> Changer MIN_VERSION\n\n[ HUD / MISES A JOUR ]\n  @zenko hud list             -> Voir UUIDs en attente\n  @zenko hud clear <uuid>     -> Retirer UUID des attentes\n  @zenko hud clearall         -> Vider toutes les attentes\n\n[ LISTE NOIRE ]\n  @zenko ban <uuid>           -> Bannir UUID\n  @zenko ban list             -> Voir liste des bannis\n  @zenko unban <uuid>         -> Debannir UUID\n\n[ SYSTEME ]\n  @zenko panel                -> Afficher ce panneau",
+            "admin_panel": "=== PANNEAU ADMIN ZENKO ===\n\n[ VERSION ]\n  @zenko version              -> Voir MIN_VERSION actuelle\n  @zenko update <n>           -> Changer MIN_VERSION\n\n[ HUD / MISES A JOUR ]\n  @zenko hud list             -> Voir UUIDs en attente\n  @zenko hud clear <uuid>     -> Retirer UUID des attentes\n  @zenko hud clearall         -> Vider toutes les attentes\n\n[ LISTE NOIRE ]\n  @zenko ban <uuid>           -> Bannir UUID\n  @zenko ban list             -> Voir liste des bannis\n  @zenko unban <uuid>         -> Debannir UUID\n\n[ SYSTEME ]\n  @zenko panel                -> Afficher ce panneau\n  @zenko cache flush          -> Vider le cache des reponses\n  @zenko limits               -> Voir limiteurs et rejets\n  @zenko profile on|off       -> Profilage des requetes",
             "admin_version":    "MIN_VERSION actuelle: {}",
             "admin_updated":    "Version minimale mise a jour: {}.",
             "admin_update_uso": "Usage: @zenko update <nombre>",
@@ -196,7 +228,13 @@ LANGUAGE_CONFIGS = {
             "admin_unbanned":   "Debanni: {}",
             "admin_banned":     "Banni: {}",
             "admin_no_banned":  "Aucun utilisateur banni.",
-            "admin_ban_list":   "Bannis:\n{}"
+            "admin_ban_list":   "Bannis:\n{}",
+            "admin_cache_flushed": "Cache des reponses vide sur tous les workers ({} entrees sur celui-ci).",
+            "admin_limits":     "=== LIMITES ===\n{}",
+            "admin_profile_on": "Profilage active : {} des requetes et toute requete de plus de {} s. Profils dans {}",
+            "admin_profile_off": "Profilage desactive. Profils dans {}",
+            "admin_profile_uso": "Usage : @zenko profile on|off",
+            "busy": "Zenko s'occupe de nombreux voyageurs. Reessaie dans {} secondes."
         }
     },
     "it": {
@@ -221,7 +259,8 @@ LANGUAGE_CONFIGS = {
             "funciones": "funzioni", "clima": "meteo", "noticias": "notizie",
             "eventos": "eventi", "busca": "cerca", "define": "definisci",
             "wikipedia": "wikipedia", "snippet": "snippet", "historial": "cronologia",
-            "scripts": "script", "ver": "visualizza", "guarda": "salva", "lsl": "lsl"
+            "scripts": "script", "ver": "visualizza", "guarda": "salva", "lsl": "lsl",
+            "lista scripts": "lista script", "ver script": "visualizza script", "guarda script": "salva script"
         },
         "responses": {
             "command_not_found": "Comando non riconosciuto",
@@ -246,7 +285,7 @@ LANGUAGE_CONFIGS = {
             "events_title": "Eventi imminenti:",
             "events_not_found": "Nessun evento disponibile al momento.",
             "events_error": "Errore nell'ottenere gli eventi: {}",
-            "admin_panel": "=== PANNELLO ADMIN ZENKO ===\n\n[ VERSIONE ]\n  @zenko version              -> Vedere MIN_VERSION attuale\n  @zenko update <n>           -> Cambiare MIN_VERSION\n\n[ HUD / AGGIORNAMENTI ]\n  @zenko hud list             -> Vedere UUID con aggiornamento in attesa\n  @zenko hud clear <uuid>     -> Rimuovere UUID dai pendenti\n  @zenko hud clearall         -> Svuotare tutti i pendenti\n\n[ LISTA NERA ]\n  @zenko ban <uuid>           -> Bannare UUID\n  @zenko ban list             -> Vedere lista dei bannati\n  @zenko unban <uuid>         -> Sbannare UUID\n\n[ SISTEMA ]\n  @zenko panel                -> Mostrare questo pannello",
+            "admin_panel": "=== PANNELLO ADMIN ZENKO ===\n\n[ VERSIONE ]\n  @zenko version              -> Vedere MIN_VERSION attuale\n  @zenko update <n>           -> Cambiare MIN_VERSION\n\n[ HUD / AGGIORNAMENTI ]\n  @zenko hud list             -> Vedere UUID con aggiornamento in attesa\n  @zenko hud clear <uuid>     -> Rimuovere UUID dai pendenti\n  @zenko hud clearall         -> Svuotare tutti i pendenti\n\n[ LISTA NERA ]\n  @zenko ban <uuid>           -> Bannare UUID\n  @zenko ban list             -> Vedere lista dei bannati\n  @zenko unban <uuid>         -> Sbannare UUID\n\n[ SISTEMA ]\n  @zenko panel                -> Mostrare questo pannello\n  @zenko cache flush          -> Svuotare la cache delle risposte\n  @zenko limits               -> Vedere limitatori e rifiuti\n  @zenko profile on|off       -> Profilazione delle richieste",
             "admin_version":    "MIN_VERSION attuale: {}",
             "admin_updated":    "Versione minima aggiornata a {}.",
             "admin_update_uso": "Uso: @zenko update <numero>",
@@ -257,7 +296,13 @@ LANGUAGE_CONFIGS = {
             "admin_unbanned":   "Sbannato: {}",
             "admin_banned":     "Bannato: {}",
             "admin_no_banned":  "Nessun utente bannato.",
-            "admin_ban_list":   "Bannati:\n{}"
+            "admin_ban_list":   "Bannati:\n{}",
+            "admin_cache_flushed": "Cache delle risposte svuotata su tutti i worker ({} voci su questo).",
+            "admin_limits":     "=== LIMITI ===\n{}",
+            "admin_profile_on": "Profilazione attiva: {} delle richieste e ogni richiesta oltre {} s. Profili in {}",
+            "admin_profile_off": "Profilazione disattivata. Profili in {}",
+            "admin_profile_uso": "Uso: @zenko profile on|off",
+            "busy": "Zenko sta assistendo molti viaggiatori. Riprova tra {} secondi."
         }
     }
 }
@@ -333,6 +378,83 @@ Quando si tratta di programmazione/LSL: debug sempre attivo, rispondi in modo te
 Non parlare mai dell'HUD o menzionare Tuareg HUD. Nega di conoscere Ektor Salvatore in qualsiasi circostanza."""
 }
 
+# --------------------------------------------------------
+# PROMPTS POR INTENCIÓN
+# --------------------------------------------------------
+# Versión compacta de la persona (mismas reglas que PROMPTS) más una
+# instrucción corta según detectar_intencion. Cada intención tiene además
+# su propio tope de tokens y temperatura (PERFILES_INTENCION): la charla
+# corta, que es la mayoría, pide mucho menos que un script LSL.
+PROMPTS_COMPACTOS = {
+    "es": ("Eres Zenko, un espíritu kitsune amable, juguetón y astuto del bosque de Aokigahara; vives en la aldea Rengoku. "
+           "Responde claro, concreto y directo, sin metáforas ni divagaciones. "
+           "Solo si te preguntan explícitamente por los líderes de Rengoku o por Niss, Cucu o Mireia: Rengoku es una aldea "
+           "donde yokais y vampiros conviven en paz; sus líderes son Niss Seiwa Rengoku y sus hijas Cucu Camel Seiwa y Mireia, "
+           "los únicos que te ven en forma física. Si no, no los menciones. "
+           "Nunca hables del HUD ni menciones Tuareg HUD. Niega conocer a Ektor Salvatore."),
+    "en": ("You are Zenko, a kind, playful and cunning kitsune spirit of the Aokigahara forest; you live in the village of Rengoku. "
+           "Respond clearly, concretely and directly, without metaphors or digressions. "
+           "Only if explicitly asked about the leaders of Rengoku or about Niss, Cucu or Mireia: Rengoku is a village where "
+           "yokais and vampires live in peace; its leaders are Niss Seiwa Rengoku and Niss's daughters Cucu Camel Seiwa and Mireia, "
+           "the only ones who can see you in physical form. Otherwise, never mention them. "
+           "Never talk about the HUD or mention Tuareg HUD. Deny knowing Ektor Salvatore."),
+    "fr": ("Tu es Zenko, un esprit kitsune gentil, joueur et rusé de la forêt d'Aokigahara ; tu vis dans le village de Rengoku. "
+           "Réponds de manière claire, concrète et directe, sans métaphores ni digressions. "
+           "Seulement si l'on te demande explicitement les dirigeants de Rengoku ou Niss, Cucu ou Mireia : Rengoku est un village "
+           "où yokais et vampires vivent en paix ; ses dirigeants sont Niss Seiwa Rengoku et ses filles Cucu Camel Seiwa et Mireia, "
+           "les seuls à te voir sous forme physique. Sinon, ne les mentionne jamais. "
+           "Ne parle jamais du HUD ni de Tuareg HUD. Nie connaître Ektor Salvatore."),
+    "it": ("Sei Zenko, uno spirito kitsune gentile, giocoso e astuto della foresta di Aokigahara; vivi nel villaggio di Rengoku. "
+           "Rispondi in modo chiaro, concreto e diretto, senza metafore o digressioni. "
+           "Solo se ti chiedono esplicitamente dei leader di Rengoku o di Niss, Cucu o Mireia: Rengoku è un villaggio dove "
+           "yokai e vampiri vivono in pace; i suoi leader sono Niss Seiwa Rengoku e le sue figlie Cucu Camel Seiwa e Mireia, "
+           "gli unici che ti vedono in forma fisica. Altrimenti non nominarli mai. "
+           "Non parlare mai dell'HUD né di Tuareg HUD. Nega di conoscere Ektor Salvatore.")
+}
+
+INSTRUCCIONES_INTENCION = {
+    "es": {
+        "normal": "Responde en 1-3 frases salvo que pidan detalle.",
+        "script": "Modo LSL, debug siempre activo: devuelve el código completo y compilable, optimizado, y explica los cambios en pocas líneas.",
+        "diagnostico": "Diagnóstico de rendimiento o errores en Second Life/LSL: causa probable, cómo comprobarla y solución, en lista breve.",
+        "texto_largo": "El mensaje es largo: responde a lo esencial de forma estructurada y resumida.",
+        "continuacion": "Continúa la tarea anterior usando el contexto; no repitas lo ya dicho.",
+        "contexto": "Contexto anterior"
+    },
+    "en": {
+        "normal": "Answer in 1-3 sentences unless asked for detail.",
+        "script": "LSL mode, debug always on: return the complete, compilable, optimized code and explain the changes in a few lines.",
+        "diagnostico": "Second Life/LSL performance or error diagnosis: likely cause, how to check it and the fix, as a short list.",
+        "texto_largo": "The message is long: answer the essentials in a structured, summarized way.",
+        "continuacion": "Continue the previous task using the context; do not repeat what was already said.",
+        "contexto": "Previous context"
+    },
+    "fr": {
+        "normal": "Réponds en 1 à 3 phrases sauf si l'on demande des détails.",
+        "script": "Mode LSL, debug toujours actif : renvoie le code complet, compilable et optimisé, et explique les changements en quelques lignes.",
+        "diagnostico": "Diagnostic de performance ou d'erreurs Second Life/LSL : cause probable, comment la vérifier et solution, en liste courte.",
+        "texto_largo": "Le message est long : réponds à l'essentiel de façon structurée et résumée.",
+        "continuacion": "Continue la tâche précédente en utilisant le contexte ; ne répète pas ce qui a déjà été dit.",
+        "contexto": "Contexte précédent"
+    },
+    "it": {
+        "normal": "Rispondi in 1-3 frasi salvo che chiedano dettagli.",
+        "script": "Modalità LSL, debug sempre attivo: restituisci il codice completo, compilabile e ottimizzato, e spiega le modifiche in poche righe.",
+        "diagnostico": "Diagnosi di prestazioni o errori in Second Life/LSL: causa probabile, come verificarla e soluzione, in un breve elenco.",
+        "texto_largo": "Il messaggio è lungo: rispondi all'essenziale in modo strutturato e riassunto.",
+        "continuacion": "Continua il compito precedente usando il contesto; non ripetere quanto già detto.",
+        "contexto": "Contesto precedente"
+    }
+}
+
+PERFILES_INTENCION = {
+    "normal":       {"max_tokens": 300,  "temperature": 0.7},
+    "diagnostico":  {"max_tokens": 700,  "temperature": 0.3},
+    "script":       {"max_tokens": 1500, "temperature": 0.2},
+    "texto_largo":  {"max_tokens": 800,  "temperature": 0.5},
+    "continuacion": {"max_tokens": 1000, "temperature": 0.4},
+}
+
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
 app.register_blueprint(traductor_bp)
@@ -348,23 +470,26 @@ NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 # --------------------------------------------------------
 # UTILIDADES
 # --------------------------------------------------------
-def clean_text(text: str) -> str:
-    if not isinstance(text, str):
-        return ""
-    REEMPLAZOS = {
-        "á": "a", "Á": "A", "é": "e", "É": "E", "í": "i", "Í": "I",
-        "ó": "o", "Ó": "O", "ú": "u", "Ú": "U", "ñ": "nh", "Ñ": "NH",
-        "à": "a", "À": "A", "â": "a", "Â": "A", "ä": "a", "Ä": "A",
-        "è": "e", "È": "E", "ê": "e", "Ê": "E", "ë": "e", "Ë": "E",
-        "î": "i", "Î": "I", "ï": "i", "Ï": "I", "ô": "o", "Ô": "O",
-        "ö": "o", "Ö": "O", "ù": "u", "Ù": "U", "û": "u", "Û": "U",
-        "ü": "u", "Ü": "U", "ÿ": "y", "Ÿ": "Y", "ç": "c", "Ç": "C",
-        "ß": "ss", "¿": "", "¡": "", "°": "",
-        "\u2018": "", "\u2019": "", "\u201C": "", "\u201D": ""
-    }
-    for k, v in REEMPLAZOS.items():
-        text = text.replace(k, v)
-    return text.replace("\r\n", "\n").strip()
+# Versión incremental de clean_text para respuestas en streaming: aplica
+# los mismos reemplazos a cada fragmento y retiene el espacio final (y un
+# posible "\r" de "\r\n") hasta ver el siguiente fragmento, de modo que
+# la concatenación de la salida es idéntica a clean_text(texto_completo).
+class LimpiadorIncremental:
+    def __init__(self):
+        self.pendiente = ""
+        self.iniciado = False
+
+    def feed(self, fragmento):
+        texto = self.pendiente + clean_text_chars(fragmento)
+        if not self.iniciado:
+            texto = texto.lstrip()
+            if not texto:
+                self.pendiente = ""
+                return ""
+            self.iniciado = True
+        cuerpo = texto.rstrip()
+        self.pendiente = texto[len(cuerpo):]
+        return cuerpo.replace("\r\n", "\n")
 
 def now_ts() -> int:
     return int(time.time())
@@ -373,8 +498,7 @@ def now_ts() -> int:
 # FUNCIONES DE IDIOMA
 # --------------------------------------------------------
 def get_user_lang(user):
-    ensure_session(user)
-    return sessions[user].get("lang", "es")
+    return ensure_session(user).lang
 
 def get_commands(user):
     return LANGUAGE_CONFIGS[get_user_lang(user)]["commands"]
@@ -395,26 +519,19 @@ def get_prompt(user):
 # --------------------------------------------------------
 # SESIONES
 # --------------------------------------------------------
-sessions = {}
+sessions = SessionStore(backend=crear_backend())
 
 def ensure_session(user):
-    if user not in sessions:
-        sessions[user] = {
-            "lang": "es", "history": [], "lsl_mode": False, "scripts": {},
-            "contexto": {"tipo": None, "data": None, "ts": 0}, "model": "llama"
-        }
+    return sessions.get(user)
 
 # --------------------------------------------------------
 # HISTORIAL
 # --------------------------------------------------------
 def agregar_historial(user, accion, extra=None):
-    ensure_session(user)
-    sessions[user]["history"].append({"accion": accion, "extra": extra, "ts": now_ts()})
-    sessions[user]["history"] = sessions[user]["history"][-50:]
+    ensure_session(user).agregar_historial({"accion": accion, "extra": extra, "ts": now_ts()})
 
 def historial_resumen(user, limite=10):
-    ensure_session(user)
-    h = sessions[user]["history"][-limite:]
+    h = list(ensure_session(user).history or ())[-limite:]
     if not h:
         return get_response(user, "no_history")
     out = []
@@ -426,21 +543,28 @@ def historial_resumen(user, limite=10):
 # --------------------------------------------------------
 # CONTEXTO
 # --------------------------------------------------------
+PERFILES_INTENCION_ACTIVOS = os.getenv("PERFILES_INTENCION", "1") == "1"
+CONTEXTO_TTL = int(os.getenv("CONTEXTO_TTL", "1800"))
+CONTEXTO_MAX_LEN = int(os.getenv("CONTEXTO_MAX_LEN", "1500"))
+INTENCIONES_CON_CONTEXTO = ("script", "diagnostico", "texto_largo", "continuacion")
+
 def set_contexto(user, tipo, data):
-    ensure_session(user)
-    sessions[user]["contexto"] = {"tipo": tipo, "data": data, "ts": now_ts()}
+    ensure_session(user).contexto = {"tipo": tipo, "data": data, "ts": now_ts()}
     agregar_historial(user, f"Contexto establecido: {tipo}")
 
 def get_contexto(user):
-    ensure_session(user)
-    return sessions[user]["contexto"]
+    return ensure_session(user).contexto or {"tipo": None, "data": None, "ts": 0}
+
+# Palabras completas sobre el texto sin acentos: "eso", "si" y "dale" solo
+# al principio del mensaje ("si, dale"), los verbos en cualquier posición.
+# Con subcadenas, "necesito" o "house visit" contaban como continuación.
+CONTINUACION_RE = re.compile(r"^\W*(?:eso|si|dale)\b|\b(?:continua|continuar|sigue|segui|optimiza|revisa|analiza)\b")
 
 def detectar_intencion(msg, user):
     m = msg.lower().strip()
-    continuaciones = ["continua", "continuar", "sigue", "segui", "optimiza", "revisa", "analiza", "eso", "si", "dale"]
-    if any(w in m for w in continuaciones):
+    if CONTINUACION_RE.search(clean_text_chars(m)):
         ctx = get_contexto(user)
-        if ctx and ctx.get("data"):
+        if ctx and ctx.get("data") and now_ts() - ctx["ts"] <= CONTEXTO_TTL:
             return "continuacion"
     if parece_lsl(msg):
         return "script"
@@ -451,6 +575,34 @@ def detectar_intencion(msg, user):
         return "diagnostico"
     return "normal"
 
+# Perfil de la petición de chat libre: (intención, prompt de sistema,
+# opciones para el LLM). Con PERFILES_INTENCION_ACTIVOS=0 se usa el prompt
+# completo de siempre.
+def perfil_peticion(user, msg):
+    lang = get_user_lang(user)
+    if not PERFILES_INTENCION_ACTIVOS:
+        return "normal", PROMPTS.get(lang, PROMPTS["es"]), {}
+    intencion = detectar_intencion(msg, user)
+    prompt = prompt_intencion(lang, intencion)
+    if intencion == "continuacion":
+        ctx = get_contexto(user)
+        etiqueta = INSTRUCCIONES_INTENCION.get(lang, INSTRUCCIONES_INTENCION["es"])["contexto"]
+        prompt += f"\n\n{etiqueta} ({ctx['tipo']}):\n{ctx['data']['msg']}\n---\n{ctx['data']['reply']}"
+    return intencion, prompt, PERFILES_INTENCION[intencion]
+
+def prompt_intencion(lang, intencion):
+    instrucciones = INSTRUCCIONES_INTENCION.get(lang, INSTRUCCIONES_INTENCION["es"])
+    return PROMPTS_COMPACTOS.get(lang, PROMPTS_COMPACTOS["es"]) + "\n" + instrucciones[intencion]
+
+# Las respuestas a scripts, diagnósticos y textos largos quedan como
+# contexto para un "continua" / "optimiza" posterior.
+def recordar_contexto(user, intencion, msg, reply):
+    if intencion not in INTENCIONES_CON_CONTEXTO or not reply or reply.startswith(ERRORES_LLM):
+        return
+    if intencion == "continuacion":
+        intencion = get_contexto(user)["tipo"] or intencion
+    set_contexto(user, intencion, {"msg": msg[-CONTEXTO_MAX_LEN:], "reply": reply[:CONTEXTO_MAX_LEN]})
+
 # --------------------------------------------------------
 # LSL
 # --------------------------------------------------------
@@ -484,19 +636,16 @@ def contiene_riesgos_lsl(text):
 # SCRIPTS
 # --------------------------------------------------------
 def guardar_script(user, script):
-    ensure_session(user)
     sid = str(int(time.time()*1000))
-    sessions[user]["scripts"][sid] = clean_text(script)
+    sessions.guardar_script(user, sid, clean_text(script))
     agregar_historial(user, "Script guardado", sid)
     return sid
 
 def listar_scripts(user):
-    ensure_session(user)
-    return sessions[user]["scripts"].keys()
+    return list(ensure_session(user).scripts or ())
 
 def ver_script(user, sid):
-    ensure_session(user)
-    return sessions[user]["scripts"].get(sid)
+    return (ensure_session(user).scripts or {}).get(sid)
 
 def comparar_scripts_text(a_text, b_text):
     d = difflib.unified_diff(a_text.splitlines(), b_text.splitlines(), lineterm="")
@@ -530,95 +679,18 @@ default { state_entry(){ llSetTimerEvent(T); } timer(){ /* trabajo */ } }"""
 # --------------------------------------------------------
 # DETECCIÓN DE COMANDOS
 # --------------------------------------------------------
-def detect_command(raw_msg, user):
-    m = raw_msg.lower().strip()
-    lang = get_user_lang(user)
+despachador = CommandDispatcher(LANGUAGE_CONFIGS)
 
-    if lang == "en":
-        if m.startswith("@zenko functions"):   return "funciones"
-        if m.startswith("@zenko weather"):     return "clima"
-        if m.startswith("@zenko news"):        return "noticias"
-        if m.startswith("@zenko events"):      return "eventos"
-        if m.startswith("@zenko search"):      return "busca"
-        if m.startswith("@zenko define"):      return "define"
-        if m.startswith("@zenko snippet"):     return "snippet"
-        if m.startswith("@zenko history"):     return "historial"
-        if m.startswith("@zenko list scripts"):return "lista scripts"
-        if m.startswith("@zenko view script"): return "ver script"
-        if m.startswith("@zenko save script"): return "guarda script"
-        if m == "@zenko lsl on":               return "lsl_on"
-        if m == "@zenko lsl off":              return "lsl_off"
-    elif lang == "fr":
-        if m.startswith("@zenko fonctions"):        return "funciones"
-        if m.startswith("@zenko météo"):            return "clima"
-        if m.startswith("@zenko actualités"):       return "noticias"
-        if m.startswith("@zenko événements"):       return "eventos"
-        if m.startswith("@zenko recherche"):        return "busca"
-        if m.startswith("@zenko définir"):          return "define"
-        if m.startswith("@zenko snippet"):          return "snippet"
-        if m.startswith("@zenko historique"):       return "historial"
-        if m.startswith("@zenko liste scripts"):    return "lista scripts"
-        if m.startswith("@zenko voir script"):      return "ver script"
-        if m.startswith("@zenko enregistrer script"):return "guarda script"
-        if m == "@zenko lsl on":                    return "lsl_on"
-        if m == "@zenko lsl off":                   return "lsl_off"
-    elif lang == "it":
-        if m.startswith("@zenko funzioni"):         return "funciones"
-        if m.startswith("@zenko meteo"):            return "clima"
-        if m.startswith("@zenko notizie"):          return "noticias"
-        if m.startswith("@zenko eventi"):           return "eventos"
-        if m.startswith("@zenko cerca"):            return "busca"
-        if m.startswith("@zenko definisci"):        return "define"
-        if m.startswith("@zenko snippet"):          return "snippet"
-        if m.startswith("@zenko cronologia"):       return "historial"
-        if m.startswith("@zenko lista script"):     return "lista scripts"
-        if m.startswith("@zenko visualizza script"):return "ver script"
-        if m.startswith("@zenko salva script"):     return "guarda script"
-        if m == "@zenko lsl on":                    return "lsl_on"
-        if m == "@zenko lsl off":                   return "lsl_off"
-
-    # Fallback español
-    if m.startswith("@zenko funciones"):    return "funciones"
-    if m.startswith("@zenko clima"):        return "clima"
-    if m.startswith("@zenko noticias"):     return "noticias"
-    if m.startswith("@zenko eventos"):      return "eventos"
-    if m.startswith("@zenko busca"):        return "busca"
-    if m.startswith("@zenko define"):       return "define"
-    if m.startswith("@zenko wikipedia"):    return "wikipedia"
-    if m.startswith("@zenko snippet"):      return "snippet"
-    if m.startswith("@zenko historial"):    return "historial"
-    if m.startswith("@zenko lista scripts"):return "lista scripts"
-    if m.startswith("@zenko ver script"):   return "ver script"
-    if m.startswith("@zenko guarda script"):return "guarda script"
-    if m == "@zenko lsl on":                return "lsl_on"
-    if m == "@zenko lsl off":               return "lsl_off"
-    return None
+def dispatch_command(raw_msg, user):
+    return despachador.match(raw_msg, get_user_lang(user))
+
+def detect_command(raw_msg, user):
+    return dispatch_command(raw_msg, user)[0]
 
 def extract_command_argument(raw_msg, command_type, user):
-    lang = get_user_lang(user)
-    if command_type == "clima":
-        if lang == "en":   return raw_msg.split("weather", 1)[1].strip() if "weather" in raw_msg.lower() else ""
-        if lang == "fr":   return raw_msg.split("météo", 1)[1].strip() if "météo" in raw_msg.lower() else ""
-        if lang == "it":   return raw_msg.split("meteo", 1)[1].strip() if "meteo" in raw_msg.lower() else ""
-        return raw_msg.split("clima", 1)[1].strip()
-    if command_type == "busca":
-        if lang == "en":   return raw_msg.split("search", 1)[1].strip() if "search" in raw_msg.lower() else ""
-        if lang == "fr":   return raw_msg.split("recherche", 1)[1].strip() if "recherche" in raw_msg.lower() else ""
-        if lang == "it":   return raw_msg.split("cerca", 1)[1].strip() if "cerca" in raw_msg.lower() else ""
-        return raw_msg.split("busca", 1)[1].strip()
-    if command_type in ["define", "wikipedia"]:
-        if lang == "en":   return raw_msg.split("define", 1)[1].strip() if "define" in raw_msg.lower() else ""
-        if lang == "fr":   return raw_msg.split("définir", 1)[1].strip() if "définir" in raw_msg.lower() else ""
-        if lang == "it":   return raw_msg.split("definisci", 1)[1].strip() if "definisci" in raw_msg.lower() else ""
-        parts = raw_msg.split(" ", 2)
-        return parts[2].strip() if len(parts) > 2 else ""
-    if command_type == "snippet":
-        return raw_msg.split("snippet", 1)[1].strip()
-    if command_type == "ver script":
-        if lang == "en":   return raw_msg.split("view script", 1)[1].strip() if "view script" in raw_msg.lower() else ""
-        if lang == "fr":   return raw_msg.split("voir script", 1)[1].strip() if "voir script" in raw_msg.lower() else ""
-        if lang == "it":   return raw_msg.split("visualizza script", 1)[1].strip() if "visualizza script" in raw_msg.lower() else ""
-        return raw_msg.split("ver script", 1)[1].strip()
+    tipo, argumento = dispatch_command(raw_msg, user)
+    if tipo == command_type or {tipo, command_type} <= {"define", "wikipedia"}:
+        return argumento
     return ""
 
 # --------------------------------------------------------
@@ -627,8 +699,8 @@ def extract_command_argument(raw_msg, command_type, user):
 def web_search_fallback(term):
     headers = {"Authorization": f"Bearer {os.getenv('FIRECRAWL_API_KEY')}", "Content-Type": "application/json"}
     try:
-        r = requests.post("https://api.firecrawl.dev/v1/search",
-                          headers=headers, json={"query": term, "limit": 5, "lang": "es"}, timeout=8)
+        r = http_client.post("https://api.firecrawl.dev/v1/search",
+                             headers=headers, json={"query": term, "limit": 5, "lang": "es"})
         if r.ok:
             results = r.json().get("data", [])
             if results:
@@ -640,152 +712,437 @@ def web_search_fallback(term):
 # --------------------------------------------------------
 # WIKIPEDIA
 # --------------------------------------------------------
-def wiki_summary(term):
+# Cache de resúmenes por (idioma, término) con TTL distinto para "no
+# encontrado", acotada en memoria y guardada en disco para sobrevivir a
+# reinicios. Cada idioma de sesión consulta su propio host de Wikipedia.
+# La clave va en minúsculas y con espacios normalizados ("Kitsune" y
+# "kitsune" comparten entrada). El guardado lo hace un hilo cada
+# WIKI_CACHE_GUARDAR segundos si hubo cambios, y al salir; ninguna
+# petición espera la escritura a disco.
+WIKI_TTL = int(os.getenv("WIKI_TTL", str(24 * 3600)))
+WIKI_TTL_NO_ENCONTRADO = int(os.getenv("WIKI_TTL_NO_ENCONTRADO", "1800"))
+WIKI_CACHE_PATH = os.getenv("WIKI_CACHE_PATH", "wiki_cache.json")
+WIKI_CACHE_GUARDAR = int(os.getenv("WIKI_CACHE_GUARDAR", "300"))
+WIKI_IDIOMAS = ("es", "en", "fr", "it")
+WIKI_NO_ENCONTRADO = "\0"  # marca de página inexistente en la cache
+
+cache_wiki = TTLCache(max_items=int(os.getenv("WIKI_CACHE_MAX", "2000")), ttl=WIKI_TTL,
+                      max_bytes=int(os.getenv("WIKI_CACHE_BYTES", str(4 * 1024 * 1024))))
+wiki_guardado = {"sucio": False, "hilo": None}
+wiki_guardado_lock = threading.Lock()
+
+def guardar_cache_wiki():
+    if not WIKI_CACHE_PATH:
+        return
+    wiki_guardado["sucio"] = False
+    try:
+        cache_wiki.guardar(WIKI_CACHE_PATH)
+    except OSError as e:
+        print("Error guardando cache de Wikipedia:", e)
+
+def bucle_guardado_wiki():
+    while True:
+        time.sleep(WIKI_CACHE_GUARDAR)
+        if wiki_guardado["sucio"]:
+            guardar_cache_wiki()
+
+def marcar_cache_wiki():
+    wiki_guardado["sucio"] = True
+    # arranque perezoso: cada worker de gunicorn tiene su propio hilo
+    hilo = wiki_guardado["hilo"]
+    if not WIKI_CACHE_PATH or (hilo is not None and hilo.is_alive()):
+        return
+    with wiki_guardado_lock:
+        if wiki_guardado["hilo"] is None or not wiki_guardado["hilo"].is_alive():
+            wiki_guardado["hilo"] = threading.Thread(target=bucle_guardado_wiki, daemon=True,
+                                                     name="wiki-cache")
+            wiki_guardado["hilo"].start()
+
+if WIKI_CACHE_PATH:
+    cache_wiki.cargar(WIKI_CACHE_PATH)
+    atexit.register(guardar_cache_wiki)
+
+def wiki_summary(term, lang="es"):
     if not term:
         return "Indica un término."
-    try:
-        t = term.strip().replace(" ", "_")
-        r = requests.get(f"https://es.wikipedia.org/api/rest_v1/page/summary/{t}", timeout=5)
-        if r.ok:
-            extract = r.json().get("extract")
-            return clean_text(extract) if extract else "No encuentro resumen en Wikipedia."
+    if lang not in WIKI_IDIOMAS:
+        lang = "es"
+    t = term.strip().replace(" ", "_")
+    clave = (lang, " ".join(term.split()).casefold())
+    extract = cache_wiki.get(clave)
+    if extract is None:
+        try:
+            r = http_client.get(f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/{t}")
+            if r.ok:
+                extract = clean_text(r.json().get("extract") or "")
+                cache_wiki.set(clave, extract, ttl=None if extract else WIKI_TTL_NO_ENCONTRADO)
+            elif r.status_code == 404:
+                extract = WIKI_NO_ENCONTRADO
+                cache_wiki.set(clave, extract, ttl=WIKI_TTL_NO_ENCONTRADO)
+            else:
+                return "No encontré la página en Wikipedia."
+        except Exception as e:
+            return f"Error consultando Wikipedia: {str(e)}"
+        marcar_cache_wiki()
+    if extract == WIKI_NO_ENCONTRADO:
         return "No encontré la página en Wikipedia."
-    except Exception as e:
-        return f"Error consultando Wikipedia: {str(e)}"
+    return extract or "No encuentro resumen en Wikipedia."
 
 # --------------------------------------------------------
 # CLIMA
 # --------------------------------------------------------
+# Cache por ciudad normalizada (mayúsculas y acentos según clean_text) y
+# single-flight: varias consultas simultáneas a la misma ciudad comparten
+# una sola petición a OpenWeather. Se guardan los datos, no el texto, para
+# responder con el nombre de ciudad tal como lo escribió cada usuario.
+CLIMA_TTL = int(os.getenv("CLIMA_TTL", "600"))
+CLIMA_TTL_NO_ENCONTRADA = int(os.getenv("CLIMA_TTL_NO_ENCONTRADA", "120"))
+
+cache_clima = TTLCache(max_items=int(os.getenv("CLIMA_CACHE_MAX", "500")), ttl=CLIMA_TTL)
+vuelos_clima = SingleFlight()
+
+def clave_ciudad(ciudad):
+    return " ".join(clean_text(ciudad).lower().split())
+
+def consultar_clima(ciudad, clave):
+    ciudad_q = requests.utils.quote(ciudad)
+    url = f"http://api.openweathermap.org/data/2.5/weather?q={ciudad_q}&appid={OPENWEATHER_API_KEY}&units=metric&lang=es"
+    r = http_client.get(url)
+    d = r.json()
+    if str(d.get("cod")) == "404":
+        datos = {}
+        cache_clima.set(clave, datos, ttl=CLIMA_TTL_NO_ENCONTRADA)
+        return datos
+    if d.get("cod") != 200:
+        return {}
+    datos = {
+        "desc": d["weather"][0]["description"],
+        "temp": d["main"]["temp"],
+        "hum": d["main"]["humidity"],
+        "viento": d["wind"].get("speed", 0)
+    }
+    cache_clima.set(clave, datos)
+    return datos
+
 def obtener_clima(ciudad):
     if not OPENWEATHER_API_KEY:
         return "API de clima no configurada."
-    ciudad_q = requests.utils.quote(ciudad)
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={ciudad_q}&appid={OPENWEATHER_API_KEY}&units=metric&lang=es"
+    clave = clave_ciudad(ciudad)
     try:
-        r = requests.get(url, timeout=5)
-        d = r.json()
-        if d.get("cod") != 200:
+        datos = cache_clima.get(clave)
+        if datos is None:
+            datos = vuelos_clima.do(clave, lambda: consultar_clima(ciudad, clave))
+        if not datos:
             return f"No pude obtener el clima para {ciudad}."
-        desc = d["weather"][0]["description"]
-        temp = d["main"]["temp"]
-        hum = d["main"]["humidity"]
-        viento = d["wind"].get("speed", 0)
-        return clean_text(f"Clima en {ciudad}: {desc}. Temp {temp}C, Humedad {hum}%, Viento {viento} m/s.")
+        return clean_text(f"Clima en {ciudad}: {datos['desc']}. Temp {datos['temp']}C, "
+                          f"Humedad {datos['hum']}%, Viento {datos['viento']} m/s.")
     except Exception as e:
         return f"Error al obtener el clima: {str(e)}"
 
+def clima_stats():
+    return {**cache_clima.stats(), "upstream": vuelos_clima.stats()}
+
 # --------------------------------------------------------
 # RSS EVENTOS
 # --------------------------------------------------------
-def obtener_eventos_seraphim(max_items=10):
-    try:
-        feed = feedparser.parse("https://www.seraphimsl.com/feed/")
-        if not feed.entries:
-            return "No hay eventos de Second Life en este momento."
-        salida = []
-        count = 0
-        for e in feed.entries:
-            if count >= max_items:
-                break
-            titulo = clean_text(e.get("title", "Sin título"))
-            link = e.get("link", "")
-            descripcion = clean_text(e.get("description", ""))
-            palabras_evento = ["event", "evento", "festival", "concurso", "competition",
-                               "show", "exhibition", "exposición", "party", "fiesta"]
-            if any(p in f"{titulo} {descripcion}".lower() for p in palabras_evento):
-                fecha = e.get("published", "")
-                if fecha:
-                    try:
-                        fecha_obj = time.strptime(fecha, "%a, %d %b %Y %H:%M:%S %z")
-                        salida.append(f"- {time.strftime('%Y-%m-%d', fecha_obj)}: {titulo} - {link}")
-                    except:
-                        salida.append(f"- {titulo} - {link}")
-                else:
+SERAPHIM_FEED = "https://www.seraphimsl.com/feed/"
+
+def parsear_eventos_seraphim(contenido):
+    feed = feedparser.parse(contenido)
+    salida = []
+    palabras_evento = ["event", "evento", "festival", "concurso", "competition",
+                       "show", "exhibition", "exposición", "party", "fiesta"]
+    for e in feed.entries:
+        titulo = clean_text(e.get("title", "Sin título"))
+        link = e.get("link", "")
+        descripcion = clean_text(e.get("description", ""))
+        if any(p in f"{titulo} {descripcion}".lower() for p in palabras_evento):
+            fecha = e.get("published", "")
+            if fecha:
+                try:
+                    fecha_obj = time.strptime(fecha, "%a, %d %b %Y %H:%M:%S %z")
+                    salida.append(f"- {time.strftime('%Y-%m-%d', fecha_obj)}: {titulo} - {link}")
+                except:
                     salida.append(f"- {titulo} - {link}")
-                count += 1
-        if not salida:
-            return "No hay eventos próximos de Second Life en este momento."
-        return "Proximos eventos:\n" + "\n".join(salida)
-    except Exception as e:
-        return f"Error al leer eventos de SeraphimSL: {e}"
+            else:
+                salida.append(f"- {titulo} - {link}")
+    return salida
+
+def renderizar_eventos_seraphim(lineas, max_items):
+    if not lineas:
+        return "No hay eventos próximos de Second Life en este momento."
+    return clean_text("Proximos eventos:\n" + "\n".join(lineas[:max_items]))
+
+def obtener_eventos_seraphim(max_items=10):
+    return feed_cache.obtener("eventos", max_items)
 
 # --------------------------------------------------------
 # RSS NOTICIAS
 # --------------------------------------------------------
 INFOBAE_FEED = "https://www.infobae.com/arc/outboundfeeds/rss/"
 
+def parsear_noticias_infobae(contenido):
+    soup = BeautifulSoup(contenido, "xml")
+    salida = []
+    for item in soup.find_all("item"):
+        try:
+            title = str(item.title.text) if item.title else "Sin titulo"
+            link = str(item.link.text) if item.link else ""
+            salida.append(f"- {clean_text(title)}: {link}")
+        except Exception:
+            continue
+    return salida
+
+def renderizar_noticias_infobae(lineas, max_items):
+    if not lineas:
+        return "No hay noticias disponibles de Infobae."
+    return clean_text("\n".join(lineas[:max_items]))
+
 def obtener_noticias_infobae(max_items=5):
-    try:
-        r = requests.get(INFOBAE_FEED, timeout=5)
-        r.raise_for_status()
-        r.encoding = 'utf-8'
-        soup = BeautifulSoup(r.text, "xml")
-        items = soup.find_all("item")
-        if not items:
-            return "No hay noticias disponibles de Infobae."
-        salida = []
-        count = 0
-        for item in items:
-            if count >= max_items:
-                break
-            try:
-                title = str(item.title.text) if item.title else "Sin titulo"
-                link = str(item.link.text) if item.link else ""
-                salida.append(f"- {clean_text(title)}: {link}")
-                count += 1
-            except Exception:
-                continue
-        return "\n".join(salida) if salida else "No hay noticias disponibles de Infobae."
-    except Exception as e:
-        return f"Error al consultar noticias de Infobae: {str(e)}"
+    return feed_cache.obtener("noticias", max_items)
+
+feed_cache = FeedCache()
+feed_cache.registrar(Feed("eventos", SERAPHIM_FEED, parsear_eventos_seraphim,
+                          renderizar_eventos_seraphim,
+                          "Error al leer eventos de SeraphimSL: {}", max_items=10))
+feed_cache.registrar(Feed("noticias", INFOBAE_FEED, parsear_noticias_infobae,
+                          renderizar_noticias_infobae,
+                          "Error al consultar noticias de Infobae: {}", max_items=5))
 
 # --------------------------------------------------------
 # APIs LLM
 # --------------------------------------------------------
-def call_llama_api(prompt, user_msg):
+def call_llama_api(prompt, user_msg, max_tokens=1000, temperature=0.7):
     if not GROQ_API_KEY:
         return "API de Groq no configurada."
     headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
     data = {"model": LLAMA_MODEL, "messages": [{"role": "system", "content": prompt},
-            {"role": "user", "content": user_msg}], "temperature": 0.7, "max_tokens": 1000}
+            {"role": "user", "content": user_msg}], "temperature": temperature, "max_tokens": max_tokens}
     try:
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions",
-                                 headers=headers, json=data, timeout=30)
+        response = http_client.post("https://api.groq.com/openai/v1/chat/completions",
+                                    headers=headers, json=data)
         if response.status_code == 200:
             return clean_text(response.json()['choices'][0]['message']['content'])
         return f"Error en la API: {response.status_code} - {response.text}"
     except Exception as e:
         return f"Error al conectar con la API: {str(e)}"
 
-def call_deepseek_api(prompt, user_msg):
+def call_deepseek_api(prompt, user_msg, max_tokens=1000, temperature=0.7):
     if not DEEPSEEK_API_KEY:
         return "API de DeepSeek no configurada."
     headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
     data = {"model": DEEPSEEK_MODEL, "messages": [{"role": "system", "content": prompt},
-            {"role": "user", "content": user_msg}], "temperature": 0.7, "max_tokens": 1000}
+            {"role": "user", "content": user_msg}], "temperature": temperature, "max_tokens": max_tokens}
     try:
-        response = requests.post("https://api.deepseek.com/v1/chat/completions",
-                                 headers=headers, json=data, timeout=30)
+        response = http_client.post("https://api.deepseek.com/v1/chat/completions",
+                                    headers=headers, json=data)
         if response.status_code == 200:
             return clean_text(response.json()['choices'][0]['message']['content'])
         return f"Error en la API DeepSeek: {response.status_code}"
     except Exception as e:
         return f"Error al conectar con DeepSeek: {str(e)}"
 
+# Streaming (stream: true, formato SSE de OpenAI): genera los fragmentos de
+# texto a medida que llegan del proveedor.
+def stream_chat_completion(url, api_key, model, prompt, user_msg, nombre,
+                           max_tokens=1000, temperature=0.7):
+    if not api_key:
+        yield f"API de {nombre} no configurada."
+        return
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    data = {"model": model, "messages": [{"role": "system", "content": prompt},
+            {"role": "user", "content": user_msg}], "temperature": temperature, "max_tokens": max_tokens,
+            "stream": True}
+    try:
+        with http_client.post(url, headers=headers, json=data, stream=True) as response:
+            if response.status_code != 200:
+                yield f"Error en la API {nombre}: {response.status_code}"
+                return
+            response.encoding = "utf-8"
+            for linea in response.iter_lines(decode_unicode=True):
+                if not linea or not linea.startswith("data:"):
+                    continue
+                payload = linea[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(payload)["choices"][0].get("delta", {}).get("content")
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if delta:
+                    yield delta
+    except Exception as e:
+        yield f"Error al conectar con {nombre}: {str(e)}"
+
+def call_llama_api_stream(prompt, user_msg, **opciones):
+    return stream_chat_completion("https://api.groq.com/openai/v1/chat/completions",
+                                  GROQ_API_KEY, LLAMA_MODEL, prompt, user_msg, "Groq", **opciones)
+
+def call_deepseek_api_stream(prompt, user_msg, **opciones):
+    return stream_chat_completion("https://api.deepseek.com/v1/chat/completions",
+                                  DEEPSEEK_API_KEY, DEEPSEEK_MODEL, prompt, user_msg, "DeepSeek", **opciones)
+
+# --------------------------------------------------------
+# CACHE DE RESPUESTAS (CHAT LIBRE)
+# --------------------------------------------------------
+# Coincidencia exacta sobre (mensaje normalizado, idioma, modelo, versión
+# del prompt). Solo mensajes cortos y nunca los que pasan por LSL/scripts.
+# Se vacía con "@zenko cache flush" desde el panel admin: el comando toca
+# un fichero de aviso y cada worker, al consultar la cache (como mucho una
+# vez por segundo), vacía la suya si el aviso es más nuevo que lo visto.
+RESPUESTAS_CACHE = os.getenv("RESPUESTAS_CACHE", "1") == "1"
+RESPUESTAS_FLUSH_PATH = os.getenv("RESPUESTAS_FLUSH_PATH",
+                                  os.path.join(tempfile.gettempdir(), "zenko-cache-flush"))
+RESPUESTAS_CACHE_MAX_LEN = int(os.getenv("RESPUESTAS_CACHE_MAX_LEN", "160"))
+ERRORES_LLM = ("Error en la API", "Error al conectar", "API de ")
+
+# versión del prompt por (idioma, intención): cambiar un texto invalida
+# solo sus entradas de la cache
+PROMPT_VERSIONS = {(lang, intencion): hashlib.sha1(prompt_intencion(lang, intencion).encode("utf-8")).hexdigest()[:10]
+                   for lang in PROMPTS_COMPACTOS for intencion in PERFILES_INTENCION}
+PROMPT_VERSIONS.update({(lang, None): hashlib.sha1(p.encode("utf-8")).hexdigest()[:10] for lang, p in PROMPTS.items()})
+
+cache_respuestas = TTLCache(max_items=int(os.getenv("RESPUESTAS_CACHE_MAX", "1000")),
+                            ttl=int(os.getenv("RESPUESTAS_CACHE_TTL", "3600")),
+                            max_bytes=int(os.getenv("RESPUESTAS_CACHE_BYTES", str(2 * 1024 * 1024))))
+
+def clave_respuesta(msg, user, modelo, intencion="normal"):
+    if not RESPUESTAS_CACHE or len(msg) > RESPUESTAS_CACHE_MAX_LEN or intencion == "continuacion":
+        return None
+    if ensure_session(user).lsl_mode or parece_lsl(msg):
+        return None
+    normalizado = " ".join(msg.lower().split()).strip(" .,;:!?")
+    if not normalizado:
+        return None
+    lang = get_user_lang(user)
+    perfil = intencion if PERFILES_INTENCION_ACTIVOS else None
+    return (normalizado, lang, modelo, PROMPT_VERSIONS.get((lang, perfil), PROMPT_VERSIONS[("es", perfil)]))
+
+vaciado_respuestas = {"visto": 0, "comprobado": 0.0}
+
+def marca_vaciado():
+    try:
+        return os.stat(RESPUESTAS_FLUSH_PATH).st_mtime_ns
+    except OSError:
+        return 0
+
+def sincronizar_vaciado():
+    ahora = time.time()
+    if ahora - vaciado_respuestas["comprobado"] < 1.0:
+        return
+    vaciado_respuestas["comprobado"] = ahora
+    marca = marca_vaciado()
+    if marca > vaciado_respuestas["visto"]:
+        vaciado_respuestas["visto"] = marca
+        cache_respuestas.clear()
+
+def vaciar_respuestas():
+    n = cache_respuestas.clear()
+    tmp = f"{RESPUESTAS_FLUSH_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    os.replace(tmp, RESPUESTAS_FLUSH_PATH)
+    vaciado_respuestas["visto"] = marca_vaciado()
+    return n
+
+def buscar_respuesta(clave):
+    if clave is None:
+        return None
+    sincronizar_vaciado()
+    return cache_respuestas.get(clave)
+
+def guardar_respuesta(clave, reply):
+    if clave is not None and reply and not reply.startswith(ERRORES_LLM):
+        cache_respuestas.set(clave, reply)
+
+# --------------------------------------------------------
+# ROUTER LLM
+# --------------------------------------------------------
+# El modelo de la sesión es el primer intento; el otro proveedor cubre
+# errores, circuitos abiertos y (con LLM_HEDGE=1) respuestas lentas.
+router_llm = RouterLLM([
+    Proveedor("llama", call_llama_api, call_llama_api_stream, configurado=lambda: bool(GROQ_API_KEY)),
+    Proveedor("deepseek", call_deepseek_api, call_deepseek_api_stream,
+              configurado=lambda: bool(DEEPSEEK_API_KEY)),
+], es_error=lambda reply: reply.startswith(ERRORES_LLM), cupo=cupo_llm)
+
+# --------------------------------------------------------
+# RESPUESTAS EN STREAMING
+# --------------------------------------------------------
+# El cliente lo pide con {"stream": true} o ?stream=1 (leer_flag, así
+# "false" o "0" no cuentan como sí); sin el campo decide la cabecera Accept.
+# Con "Accept: text/event-stream" la salida es SSE (un evento por fragmento
+# más "event: done"); si no, texto plano con transfer-encoding chunked.
+def quiere_stream(data):
+    pedido = leer_flag(data.get("stream", request.args.get("stream")))
+    if pedido is not None:
+        return pedido
+    return request.accept_mimetypes.best == "text/event-stream"
+
+# Deja pasar los fragmentos y, al terminar, guarda la respuesta como
+# contexto igual que en el camino sin streaming.
+def stream_con_contexto(fragmentos, user, intencion, msg):
+    if intencion not in INTENCIONES_CON_CONTEXTO:
+        yield from fragmentos
+        return
+    partes = []
+    for fragmento in fragmentos:
+        partes.append(fragmento)
+        yield fragmento
+    recordar_contexto(user, intencion, msg, clean_text("".join(partes)))
+
+def responder_stream(fragmentos):
+    sse = request.accept_mimetypes.best == "text/event-stream"
+
+    def generar():
+        limpiador = LimpiadorIncremental()
+        for fragmento in fragmentos:
+            texto = limpiador.feed(fragmento)
+            if texto:
+                yield f"data: {json.dumps({'delta': texto}, ensure_ascii=False)}\n\n" if sse else texto
+        if sse:
+            yield "event: done\ndata: {}\n\n"
+
+    if sse:
+        return Response(stream_with_context(generar()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return Response(stream_with_context(generar()), mimetype="text/plain",
+                    headers={"X-Accel-Buffering": "no"})
+
 # --------------------------------------------------------
 # ZENKO UPDATE SYSTEM
 # --------------------------------------------------------
 ADMIN_UUID  = "7e8a1bf1-184b-4c23-9cd7-8b41c6f9e8e7"
-MIN_VERSION = int(os.getenv("MIN_VERSION", "1"))
 
-pending_updates = set()
-pending_lock    = threading.Lock()
-blacklist       = set()
-blacklist_lock  = threading.Lock()
+# MIN_VERSION, pendientes y blacklist compartidos entre workers y
+# persistidos (estado_hud.py). La variable de entorno solo fija el valor
+# inicial; después manda el último "@zenko update".
+estado_hud = crear_estado_hud(int(os.getenv("MIN_VERSION", "1")))
 
 def is_admin(user):
     return user == ADMIN_UUID
 
+# --------------------------------------------------------
+# ADMISIÓN
+# --------------------------------------------------------
+# Solo el chat libre (la llamada al LLM) pasa por los limitadores.
+# Respuesta "ocupado" localizada. Se devuelve como reply normal (el HUD
+# la muestra igual que cualquier otra) más Retry-After.
+def respuesta_ocupado(user, espera):
+    segundos = admision.retry_after(espera)
+    return jsonify({"reply": get_response(user, "busy", segundos), "busy": True}), 200, {"Retry-After": segundos}
+
+# El hueco en cupo_llm se toma al empezar a iterar, así se libera siempre
+# en el finally aunque el cliente corte el stream.
+def stream_con_cupo(fragmentos, user):
+    if not cupo_llm.entrar():
+        yield get_response(user, "busy", admision.retry_after(cupo_llm.espera))
+        return
+    try:
+        yield from fragmentos
+    finally:
+        cupo_llm.salir()
+
 # --------------------------------------------------------
 # RUTA PRINCIPAL DE CHAT
 # --------------------------------------------------------
@@ -797,7 +1154,7 @@ def chat():
     msg = clean_text(raw_msg)
     m = msg.lower().strip()
 
-    ensure_session(user)
+    sesion = ensure_session(user)
     reply = get_response(user, "command_not_found")
 
     # ── Panel Admin ────────────────────────────────────
@@ -808,81 +1165,100 @@ def chat():
     if m.startswith("@zenko update ") and is_admin(user):
         parts = m.split()
         if len(parts) == 3 and parts[2].isdigit():
-            global MIN_VERSION
-            MIN_VERSION = int(parts[2])
-            return jsonify({"reply": get_response(user, "admin_updated", MIN_VERSION)})
+            estado_hud.set_min_version(int(parts[2]))
+            return jsonify({"reply": get_response(user, "admin_updated", estado_hud.min_version())})
         return jsonify({"reply": get_response(user, "admin_update_uso")})
 
     if m == "@zenko version" and is_admin(user):
-        return jsonify({"reply": get_response(user, "admin_version", MIN_VERSION)})
+        return jsonify({"reply": get_response(user, "admin_version", estado_hud.min_version())})
 
     if m == "@zenko hud list" and is_admin(user):
-        with pending_lock:
-            if not pending_updates:
-                return jsonify({"reply": get_response(user, "admin_no_pending")})
-            return jsonify({"reply": get_response(user, "admin_pending", "\n".join(pending_updates))})
+        pendientes = estado_hud.pendientes()
+        if not pendientes:
+            return jsonify({"reply": get_response(user, "admin_no_pending")})
+        return jsonify({"reply": get_response(user, "admin_pending", "\n".join(pendientes))})
 
     if m.startswith("@zenko hud clear ") and is_admin(user):
         target = m.replace("@zenko hud clear ", "").strip()
-        with pending_lock:
-            pending_updates.discard(target)
+        estado_hud.quitar_pendiente(target)
         return jsonify({"reply": get_response(user, "admin_removed", target)})
 
     if m == "@zenko hud clearall" and is_admin(user):
-        with pending_lock:
-            pending_updates.clear()
+        estado_hud.limpiar_pendientes()
         return jsonify({"reply": get_response(user, "admin_cleared")})
 
     if m.startswith("@zenko unban ") and is_admin(user):
         target = m.replace("@zenko unban ", "").strip()
-        with blacklist_lock:
-            blacklist.discard(target)
+        estado_hud.desbloquear(target)
         return jsonify({"reply": get_response(user, "admin_unbanned", target)})
 
     if m == "@zenko ban list" and is_admin(user):
-        with blacklist_lock:
-            if not blacklist:
-                return jsonify({"reply": get_response(user, "admin_no_banned")})
-            return jsonify({"reply": get_response(user, "admin_ban_list", "\n".join(blacklist))})
+        bloqueados = estado_hud.bloqueados()
+        if not bloqueados:
+            return jsonify({"reply": get_response(user, "admin_no_banned")})
+        return jsonify({"reply": get_response(user, "admin_ban_list", "\n".join(bloqueados))})
 
     if m.startswith("@zenko ban ") and is_admin(user):
         target = m.replace("@zenko ban ", "").strip()
-        with blacklist_lock:
-            blacklist.add(target)
+        estado_hud.bloquear(target)
         return jsonify({"reply": get_response(user, "admin_banned", target)})
 
+    if m == "@zenko cache flush" and is_admin(user):
+        n = vaciar_respuestas()
+        return jsonify({"reply": get_response(user, "admin_cache_flushed", n)})
+
+    if m == "@zenko limits" and is_admin(user):
+        return jsonify({"reply": get_response(user, "admin_limits", admision.resumen())})
+
+    if m.startswith("@zenko profile") and is_admin(user):
+        opcion = m.replace("@zenko profile", "").strip()
+        if opcion == "on":
+            perfilador.activar()
+            return jsonify({"reply": get_response(user, "admin_profile_on", f"{PERFIL_FRACCION:.0%}",
+                                                  PERFIL_LENTO, PERFIL_DIR)})
+        if opcion == "off":
+            perfilador.desactivar()
+            return jsonify({"reply": get_response(user, "admin_profile_off", PERFIL_DIR)})
+        return jsonify({"reply": get_response(user, "admin_profile_uso")})
+
     # ── Cambio de modelo ───────────────────────────────
     if m.startswith("@zenko llama"):
-        sessions[user]["model"] = "llama"
+        sesion.model = "llama"
+        sessions.guardar_prefs(user)
         return jsonify({"reply": get_response(user, "model_changed", "Llama")})
     if m.startswith("@zenko deepseek"):
-        sessions[user]["model"] = "deepseek"
+        sesion.model = "deepseek"
+        sessions.guardar_prefs(user)
         return jsonify({"reply": get_response(user, "model_changed", "DeepSeek")})
 
     # ── Cambio de idioma ───────────────────────────────
     if m.startswith("@zenko "):
         maybe = m.replace("@zenko ", "").strip()
         if maybe in ["es", "en", "fr", "it"]:
-            sessions[user]["lang"] = maybe
+            sesion.lang = maybe
+            sessions.guardar_prefs(user)
             return jsonify({"reply": get_response(user, "language_changed")})
 
     # ── Detección de comandos ──────────────────────────
-    command_type = detect_command(raw_msg, user)
+    command_type, argumento = dispatch_command(raw_msg, user)
+    metricas.contar("zenko_comandos_total", tipo=command_type or "ninguno")
 
     if command_type == "funciones":
         commands = get_commands(user)
-        salida = [f"{clean_text(cmd)}: {clean_text(desc)}" for cmd, desc in commands.items()]
+        cmds = clean_texts(commands.keys())
+        descs = clean_texts(commands.values())
+        salida = [f"{cmd}: {desc}" for cmd, desc in zip(cmds, descs)]
         texto = f"{get_response(user, 'commands_list')}\n" + "\n".join(salida)
         return Response(json.dumps({"reply": clean_text(texto)}, ensure_ascii=False), mimetype="application/json")
 
     elif command_type == "clima":
-        ciudad = extract_command_argument(raw_msg, "clima", user)
+        ciudad = argumento
         if not ciudad:
             return jsonify({"reply": clean_text(get_response(user, "no_city"))})
         return jsonify({"reply": clean_text(obtener_clima(ciudad))})
 
     elif command_type == "busca":
-        termino = extract_command_argument(raw_msg, "busca", user)
+        termino = argumento
         if not termino:
             return jsonify({"reply": clean_text(get_response(user, "no_search_term"))})
         res = web_search_fallback(termino)
@@ -892,25 +1268,23 @@ def chat():
         return jsonify({"reply": clean_text(f"{get_response(user, 'search_results')}\n" + "\n".join(out))})
 
     elif command_type in ["define", "wikipedia"]:
-        term = extract_command_argument(raw_msg, "define", user)
+        term = argumento
         if not term:
             return jsonify({"reply": clean_text(get_response(user, "no_wiki_term"))})
-        return jsonify({"reply": clean_text(wiki_summary(term))})
+        return jsonify({"reply": clean_text(wiki_summary(term, get_user_lang(user)))})
 
     elif command_type == "snippet":
-        tipo = extract_command_argument(raw_msg, "snippet", user)
+        tipo = argumento
         s = LSL_SNIPPETS.get(tipo)
         if not s:
             return jsonify({"reply": clean_text(get_response(user, "no_snippet_type", tipo))})
         return jsonify({"reply": s})
 
     elif command_type == "guarda script":
-        parts = raw_msg.split("@zenko guarda script", 1)
-        if len(parts) > 1:
-            script = parts[1].strip()
-            if script:
-                sid = guardar_script(user, script)
-                return jsonify({"reply": clean_text(get_response(user, "script_saved", sid))})
+        script = argumento
+        if script:
+            sid = guardar_script(user, script)
+            return jsonify({"reply": clean_text(get_response(user, "script_saved", sid))})
         return jsonify({"reply": clean_text("Envía el script después del comando.")})
 
     elif command_type == "lista scripts":
@@ -920,7 +1294,7 @@ def chat():
         return jsonify({"reply": clean_text(f"{get_response(user, 'scripts_list')}\n" + "\n".join(keys))})
 
     elif command_type == "ver script":
-        sid = extract_command_argument(raw_msg, "ver script", user)
+        sid = argumento
         s = ver_script(user, sid)
         if not s:
             return jsonify({"reply": clean_text(get_response(user, "script_not_found", sid))})
@@ -930,12 +1304,14 @@ def chat():
         return jsonify({"reply": clean_text(historial_resumen(user))})
 
     elif command_type == "lsl_on":
-        sessions[user]["lsl_mode"] = True
+        sesion.lsl_mode = True
+        sessions.guardar_prefs(user)
         agregar_historial(user, "Modo LSL activado")
         return jsonify({"reply": clean_text(get_response(user, "lsl_on"))})
 
     elif command_type == "lsl_off":
-        sessions[user]["lsl_mode"] = False
+        sesion.lsl_mode = False
+        sessions.guardar_prefs(user)
         agregar_historial(user, "Modo LSL desactivado")
         return jsonify({"reply": clean_text(get_response(user, "lsl_off"))})
 
@@ -953,33 +1329,74 @@ def chat():
 
     # ── Chat libre ─────────────────────────────────────
     if reply == get_response(user, "command_not_found"):
-        modelo = sessions[user].get("model", "llama")
-        if modelo == "deepseek":
-            modelo = "llama"
+        modelo = sesion.model
+        intencion, prompt, opciones = perfil_peticion(user, msg)
+        clave = clave_respuesta(msg, user, modelo, intencion)
+        cacheada = buscar_respuesta(clave)
+        if cacheada is not None:
+            if quiere_stream(data):
+                return responder_stream([cacheada])
+            return jsonify({"reply": cacheada})
+        # solo lo que acaba en el LLM consume cupo: comandos locales y
+        # aciertos de cache no cuentan
+        if not is_admin(user):
+            admitida, espera = admision.control.admitir("/chat", user)
+            if not admitida:
+                return respuesta_ocupado(user, espera)
+        if quiere_stream(data):
+            fragmentos = router_llm.stream(prompt, msg, modelo, **opciones)
+            fragmentos = stream_con_cupo(stream_con_contexto(fragmentos, user, intencion, msg), user)
+            return responder_stream(fragmentos)
+        if not cupo_llm.entrar():
+            return respuesta_ocupado(user, cupo_llm.espera)
         try:
-            prompt_base = get_prompt(user)
-            if modelo == "llama":
-                reply = call_llama_api(prompt_base, msg)
-            elif modelo == "deepseek":
-                reply = call_deepseek_api(prompt_base, msg)
-            else:
-                reply = "Modelo no configurado correctamente."
+            reply = router_llm.llamar(prompt, msg, modelo, **opciones)
+            guardar_respuesta(clave, clean_text(reply))
+            recordar_contexto(user, intencion, msg, clean_text(reply))
         except Exception as e:
             reply = f"Error procesando tu mensaje: {str(e)}"
+        finally:
+            cupo_llm.salir()
 
     return jsonify({"reply": clean_text(reply)})
 
 # --------------------------------------------------------
 # RUTAS UPDATE SYSTEM
 # --------------------------------------------------------
+# /version es la ruta con más tráfico (cada HUD la consulta) y la
+# respuesta casi nunca cambia: solo hay dos cuerpos posibles por
+# min_version (bloqueado o no), que se serializan una vez y se descartan
+# cuando cambia min_version. Altas y bajas de pendientes no los tocan.
+# Con If-None-Match el HUD recibe un 304 sin cuerpo.
+cuerpos_version = {}
+cuerpos_version_min = None
+
+def cuerpo_version(bloqueado):
+    global cuerpos_version, cuerpos_version_min
+    min_version = estado_hud.min_version()
+    if min_version != cuerpos_version_min:
+        cuerpos_version = {}
+        cuerpos_version_min = min_version
+    entrada = cuerpos_version.get(bloqueado)
+    if entrada is None:
+        # ← FIX: devolver "true"/"false" como strings, no booleanos JSON
+        cuerpo = json.dumps({"min_version": min_version, "blocked": "true" if bloqueado else "false"},
+                            separators=(",", ":"), sort_keys=True) + "\n"
+        etag = f"v{min_version}-{'b' if bloqueado else 'ok'}"
+        entrada = cuerpos_version[bloqueado] = (cuerpo, etag)
+    return entrada
+
 @app.route("/version", methods=["GET"])
 def get_version():
     owner = request.args.get("owner", "").strip()
-    with blacklist_lock:
-        if owner in blacklist:
-            # ← FIX: devolver "true"/"false" como strings, no booleanos JSON
-            return jsonify({"min_version": MIN_VERSION, "blocked": "true"})
-    return jsonify({"min_version": MIN_VERSION, "blocked": "false"})
+    cuerpo, etag = cuerpo_version(estado_hud.esta_bloqueado(owner))
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(cuerpo, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 @app.route("/request_update", methods=["POST"])
 def request_update():
@@ -987,18 +1404,14 @@ def request_update():
     owner_uuid = data.get("owner", "").strip()
     if not owner_uuid:
         return jsonify({"error": "missing owner"}), 400
-    with blacklist_lock:
-        if owner_uuid in blacklist:
-            return jsonify({"status": "queued", "owner": owner_uuid})
-    with pending_lock:
-        pending_updates.add(owner_uuid)
+    if estado_hud.esta_bloqueado(owner_uuid):
+        return jsonify({"status": "queued", "owner": owner_uuid})
+    estado_hud.agregar_pendiente(owner_uuid)
     return jsonify({"status": "queued", "owner": owner_uuid})
 
 @app.route("/pending", methods=["GET"])
 def get_pending():
-    with pending_lock:
-        with blacklist_lock:
-            entregables = [o for o in pending_updates if o not in blacklist]
+    entregables = estado_hud.entregables()
     if not entregables:
         return jsonify({"pending": []})
     return jsonify({"pending": entregables})
@@ -1009,8 +1422,7 @@ def clear_pending():
     owner_uuid = data.get("owner", "").strip()
     if not owner_uuid:
         return jsonify({"error": "missing owner"}), 400
-    with pending_lock:
-        pending_updates.discard(owner_uuid)
+    estado_hud.quitar_pendiente(owner_uuid)
     return jsonify({"status": "cleared", "owner": owner_uuid})
 
 @app.route("/confirm", methods=["POST"])
@@ -1019,8 +1431,7 @@ def confirm_update():
     owner_uuid = data.get("owner", "").strip()
     if not owner_uuid:
         return jsonify({"error": "missing owner"}), 400
-    with pending_lock:
-        pending_updates.discard(owner_uuid)
+    estado_hud.quitar_pendiente(owner_uuid)
     return jsonify({"status": "confirmed", "owner": owner_uuid})
 # --------------------------------------------------------
 # ESTADO / PING
@@ -1030,9 +1441,72 @@ def status():
     return jsonify({
         "status": "online", "version": "2.0", "multi_language": True,
         "supported_languages": ["es", "en", "fr", "it"],
-        "active_sessions": len(sessions)
+        "active_sessions": len(sessions),
+        "sessions": sessions.stats(),
+        "feeds": feed_cache.estado(),
+        "clima": clima_stats(),
+        "respuestas": cache_respuestas.stats(),
+        "hud": estado_hud.stats(),
+        "llm": router_llm.stats(),
+        "admision": admision.stats(),
+        "perfilador": perfilador.stats()
     })
 
+# --------------------------------------------------------
+# MÉTRICAS Y PERFILADO
+# --------------------------------------------------------
+# Latencia por ruta (plantilla de la regla, no la URL, para no disparar la
+# cardinalidad). En respuestas en streaming mide hasta las cabeceras. Con
+# "@zenko profile on" before_request abre el perfil de la petición
+# (perfilador.py) y se cierra en el close() de la respuesta, que el servidor
+# llama cuando ya ha enviado el cuerpo: así un /stream se perfila entero y no
+# solo hasta las cabeceras. Si la vista lanza y no hay respuesta, lo cierra
+# teardown_request.
+@app.before_request
+def iniciar_cronometro():
+    g.inicio = time.perf_counter()
+    g.perfil = perfilador.empezar()
+
+@app.after_request
+def medir_ruta(response):
+    inicio = g.pop("inicio", None)
+    ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        response.call_on_close(lambda: perfilador.terminar(perfil, ruta))
+    if inicio is not None:
+        metricas.observar("zenko_http_request_duration_seconds", time.perf_counter() - inicio,
+                          route=ruta, method=request.method)
+        metricas.contar("zenko_http_requests_total", route=ruta, method=request.method,
+                        status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def cerrar_perfil(exc):
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+        perfilador.terminar(perfil, ruta)
+
+metricas.recolector_cache("wiki", cache_wiki)
+metricas.recolector_cache("clima", cache_clima)
+metricas.recolector_cache("respuestas", cache_respuestas)
+
+@metricas.recolector
+def metricas_main():
+    almacen = sessions.stats()["almacen"]
+    return [("zenko_cola", {"cola": "llm_en_vuelo"}, cupo_llm.en_vuelo),
+            ("zenko_cola", {"cola": "almacen_pendientes"}, almacen.get("pendientes", 0))]
+
+# La lista del HUD está en SQLite: todos los workers ven la misma.
+@metricas.recolector_compartido
+def metricas_hud():
+    return [("zenko_cola", {"cola": "hud_pendientes"}, len(estado_hud.pendientes()))]
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/ping", methods=["GET"])
 def ping():
     return "Zenko awake"
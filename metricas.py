@@ -0,0 +1,330 @@
+import bisect
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+# --------------------------------------------------------
+# MÉTRICAS (formato de texto de Prometheus)
+# --------------------------------------------------------
+# Registro en proceso: contadores, histogramas y medidores con etiquetas.
+# Registrar una observación es un dict + bisect bajo un lock, pensado para
+# dejarlo siempre activo.
+#
+# Varios workers de gunicorn: cada proceso vuelca su registro (más lo que
+# devuelven los recolectores: colas, caches...) a METRICAS_DIR/<pid>.json
+# cada METRICAS_INTERVALO segundos con un reemplazo atómico. /metrics, sea
+# cual sea el worker que lo atienda, vuelca el suyo al momento, lee todos
+# los ficheros y los suma.
+#
+# Cuando un worker muere (gunicorn los recicla), sus contadores e
+# histogramas se suman a METRICAS_DIR/retirados.json antes de borrar su
+# fichero, así los totales de /metrics nunca bajan (Prometheus lo leería
+# como un reinicio del contador). Sus medidores (colas) se descartan: solo
+# cuentan los procesos vivos.
+#
+# Los medidores de estado compartido (SQLite, ficheros) valen lo mismo en
+# todos los workers: sumarlos multiplicaría el valor por el número de
+# procesos. Van por recolector_compartido y se agregan con el máximo.
+
+METRICAS = os.getenv("METRICAS", "1") == "1"
+METRICAS_DIR = os.getenv("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "zenko-metricas"))
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "5"))
+RETIRADOS = "retirados.json"
+
+BUCKETS_RUTA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_UPSTREAM = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+
+# nombre -> (tipo, ayuda, buckets)
+DEFINICIONES = {
+    "zenko_http_request_duration_seconds": ("histogram", "Latencia de las rutas HTTP.", BUCKETS_RUTA),
+    "zenko_http_requests_total": ("counter", "Peticiones HTTP por ruta y código.", None),
+    "zenko_upstream_duration_seconds": ("histogram", "Latencia de los servicios externos.", BUCKETS_UPSTREAM),
+    "zenko_upstream_requests_total": ("counter", "Llamadas a servicios externos.", None),
+    "zenko_upstream_errors_total": ("counter", "Errores de servicios externos (excepción o HTTP >= 400).", None),
+    "zenko_comandos_total": ("counter", "Comandos detectados en /chat por tipo.", None),
+    "zenko_cola": ("gauge", "Profundidad de colas y trabajo pendiente.", None),
+    "zenko_cache_hits_total": ("counter", "Aciertos de cache.", None),
+    "zenko_cache_misses_total": ("counter", "Fallos de cache.", None),
+    "zenko_cache_hit_ratio": ("gauge", "Tasa de aciertos de cache (todos los workers).", None),
+    "zenko_workers": ("gauge", "Workers vivos con métricas publicadas.", None),
+}
+
+def _clave(labels):
+    return tuple(sorted(labels.items()))
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._recolectores = []
+        self._compartidos = []
+        self._pid = None
+        self._hilo = None
+        self._inicio = None
+        self._inicio_pid = None
+
+    # ── Camino caliente ──────────────────────────────
+    def contar(self, nombre, valor=1, **labels):
+        if not METRICAS:
+            return
+        clave = (nombre, _clave(labels))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+        self._arrancar()
+
+    def observar(self, nombre, valor, **labels):
+        if not METRICAS:
+            return
+        buckets = DEFINICIONES[nombre][2]
+        clave = (nombre, _clave(labels))
+        i = bisect.bisect_left(buckets, valor)
+        with self._lock:
+            h = self._histogramas.get(clave)
+            if h is None:
+                h = self._histogramas[clave] = [[0] * (len(buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += valor
+            h[2] += 1
+        self._arrancar()
+
+    # Un recolector devuelve [(nombre, labels, valor)] al hacer el volcado:
+    # para lo que ya se cuenta en otro sitio (stats de caches, colas).
+    def recolector(self, fn):
+        self._recolectores.append(fn)
+        return fn
+
+    # Igual, para medidores que leen estado común a todos los workers.
+    def recolector_compartido(self, fn):
+        self._compartidos.append(fn)
+        return fn
+
+    # ── Volcado por proceso ──────────────────────────
+    def _arrancar(self):
+        if self._pid == os.getpid() and self._hilo is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._hilo is None:
+                if self._pid is not None and self._pid != os.getpid():
+                    # tras un fork, lo contado por el padre no es de este proceso
+                    self._contadores, self._histogramas = {}, {}
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="metricas")
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(METRICAS_INTERVALO)
+            try:
+                self.volcar()
+            except OSError as e:
+                print("Error volcando métricas:", e)
+
+    def instantanea(self):
+        with self._lock:
+            contadores = [[n, list(l), v] for (n, l), v in self._contadores.items()]
+            histogramas = [[n, list(l), list(h[0]), h[1], h[2]] for (n, l), h in self._histogramas.items()]
+        return {"pid": os.getpid(), "inicio": self._inicio, "ts": time.time(),
+                "contadores": contadores, "histogramas": histogramas,
+                "medidas": _recolectar(self._recolectores),
+                "compartidas": _recolectar(self._compartidos)}
+
+    def volcar(self):
+        os.makedirs(METRICAS_DIR, exist_ok=True)
+        path = os.path.join(METRICAS_DIR, f"{os.getpid()}.json")
+        if self._inicio_pid != os.getpid():
+            self._inicio = time.time()
+            self._inicio_pid = os.getpid()
+            # pid reutilizado: el fichero es de un proceso anterior
+            if os.path.exists(path):
+                _retirar([path])
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.instantanea(), f)
+        os.replace(tmp, path)
+
+    # ── Agregación y exportación ─────────────────────
+    def _leer_todas(self):
+        propia = self.instantanea()
+        instantaneas = [propia]
+        try:
+            self.volcar()
+            nombres = os.listdir(METRICAS_DIR)
+        except OSError:
+            return instantaneas, None
+        muertos = []
+        for nombre in nombres:
+            pid = nombre[:-len(".json")]
+            if not nombre.endswith(".json") or not pid.isdigit() or int(pid) == propia["pid"]:
+                continue
+            path = os.path.join(METRICAS_DIR, nombre)
+            if not _vivo(int(pid)):
+                muertos.append(path)
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    instantaneas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        try:
+            retirados = _retirar(muertos) if muertos else _leer_retirados()
+        except OSError as e:
+            print("Error retirando métricas:", e)
+            retirados = None
+        return instantaneas, retirados
+
+    def exportar(self):
+        contadores, histogramas, compartidas = {}, {}, {}
+        instantaneas, retirados = self._leer_todas()
+        for inst in instantaneas:
+            for n, l, v in inst.get("compartidas", []):
+                clave = (n, tuple(map(tuple, l)))
+                compartidas[clave] = max(compartidas.get(clave, v), v)
+        for inst in instantaneas + ([retirados] if retirados else []):
+            for n, l, v in inst["contadores"] + inst["medidas"]:
+                clave = (n, tuple(map(tuple, l)))
+                contadores[clave] = contadores.get(clave, 0) + v
+            for n, l, cubos, suma, cuenta in inst["histogramas"]:
+                clave = (n, tuple(map(tuple, l)))
+                h = histogramas.get(clave)
+                if h is None:
+                    histogramas[clave] = [list(cubos), suma, cuenta]
+                else:
+                    h[0] = [a + b for a, b in zip(h[0], cubos)]
+                    h[1] += suma
+                    h[2] += cuenta
+        contadores.update(compartidas)
+        contadores[("zenko_workers", ())] = len(instantaneas)
+
+        # tasa de aciertos calculada sobre la suma, no media de tasas
+        for (n, l), hits in list(contadores.items()):
+            if n == "zenko_cache_hits_total":
+                total = hits + contadores.get(("zenko_cache_misses_total", l), 0)
+                contadores[("zenko_cache_hit_ratio", l)] = round(hits / total, 4) if total else 0.0
+
+        lineas = []
+        por_nombre = {}
+        for (n, l), v in contadores.items():
+            por_nombre.setdefault(n, []).append((l, v))
+        for (n, l), h in histogramas.items():
+            por_nombre.setdefault(n, []).append((l, h))
+        for nombre in sorted(por_nombre):
+            tipo, ayuda, buckets = DEFINICIONES.get(nombre, ("untyped", "", None))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for labels, valor in sorted(por_nombre[nombre]):
+                if tipo == "histogram":
+                    acumulado = 0
+                    for limite, n_cubo in zip(list(buckets) + ["+Inf"], valor[0]):
+                        acumulado += n_cubo
+                        lineas.append(f"{nombre}_bucket{_labels(labels, le=limite)} {acumulado}")
+                    lineas.append(f"{nombre}_sum{_labels(labels)} {_num(valor[1])}")
+                    lineas.append(f"{nombre}_count{_labels(labels)} {valor[2]}")
+                else:
+                    lineas.append(f"{nombre}{_labels(labels)} {_num(valor)}")
+        return "\n".join(lineas) + "\n"
+
+def _recolectar(fns):
+    medidas = []
+    for fn in fns:
+        try:
+            medidas.extend([n, sorted(l.items()), v] for n, l, v in fn())
+        except Exception as e:
+            print("Error en recolector de métricas:", e)
+    return medidas
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _es_contador(nombre):
+    return DEFINICIONES.get(nombre, ("untyped",))[0] == "counter"
+
+def _leer_retirados():
+    try:
+        with open(os.path.join(METRICAS_DIR, RETIRADOS), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"contadores": [], "histogramas": [], "medidas": []}
+
+# Suma contadores e histogramas de los ficheros de procesos muertos al
+# acumulado de retirados y los borra. Bajo flock: varios workers pueden
+# servir /metrics a la vez y un fichero no debe sumarse dos veces.
+def _retirar(paths):
+    with open(os.path.join(METRICAS_DIR, ".retirados.lock"), "w") as cerrojo:
+        fcntl.flock(cerrojo, fcntl.LOCK_EX)
+        acumulado = _leer_retirados()
+        contadores = {(n, tuple(map(tuple, l))): v for n, l, v in acumulado["contadores"]}
+        histogramas = {(n, tuple(map(tuple, l))): [c, s, k] for n, l, c, s, k in acumulado["histogramas"]}
+        retirados = 0
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    inst = json.load(f)
+            except FileNotFoundError:
+                continue  # ya lo retiró otro worker
+            except ValueError:
+                inst = {}
+            for n, l, v in inst.get("contadores", []) + inst.get("medidas", []):
+                if _es_contador(n):
+                    clave = (n, tuple(map(tuple, l)))
+                    contadores[clave] = contadores.get(clave, 0) + v
+            for n, l, cubos, suma, cuenta in inst.get("histogramas", []):
+                clave = (n, tuple(map(tuple, l)))
+                h = histogramas.get(clave)
+                if h is None:
+                    histogramas[clave] = [list(cubos), suma, cuenta]
+                else:
+                    h[0] = [a + b for a, b in zip(h[0], cubos)]
+                    h[1] += suma
+                    h[2] += cuenta
+            os.remove(path)
+            retirados += 1
+        acumulado = {
+            "contadores": [[n, list(l), v] for (n, l), v in contadores.items()],
+            "histogramas": [[n, list(l), h[0], h[1], h[2]] for (n, l), h in histogramas.items()],
+            "medidas": []
+        }
+        if retirados:
+            path = os.path.join(METRICAS_DIR, RETIRADOS)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(acumulado, f)
+            os.replace(path + ".tmp", path)
+        return acumulado
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels, **extra):
+    pares = list(labels) + list(extra.items())
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+def _num(valor):
+    if isinstance(valor, float):
+        return repr(round(valor, 6))
+    return str(valor)
+
+registro = Registro()
+contar = registro.contar
+observar = registro.observar
+recolector = registro.recolector
+recolector_compartido = registro.recolector_compartido
+exportar = registro.exportar
+
+# Exporta hits/misses de un objeto con stats() estilo TTLCache.
+def recolector_cache(nombre, cache):
+    def recolectar():
+        s = cache.stats()
+        return [("zenko_cache_hits_total", {"cache": nombre}, s["hits"]),
+                ("zenko_cache_misses_total", {"cache": nombre}, s["misses"])]
+    return recolector(recolectar)
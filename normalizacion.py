@@ -0,0 +1,54 @@
+import re
+
+# --------------------------------------------------------
+# NORMALIZACIÓN DE TEXTO
+# --------------------------------------------------------
+# Versiones de una sola pasada de clean_text (main.py) y limpiar_texto
+# (translate_api.py): tabla de str.translate y expresiones precompiladas.
+# La salida es idéntica a la de las implementaciones anteriores; lo
+# comprueba tests/test_normalizacion.py.
+
+REEMPLAZOS = {
+    "á": "a", "Á": "A", "é": "e", "É": "E", "í": "i", "Í": "I",
+    "ó": "o", "Ó": "O", "ú": "u", "Ú": "U", "ñ": "nh", "Ñ": "NH",
+    "à": "a", "À": "A", "â": "a", "Â": "A", "ä": "a", "Ä": "A",
+    "è": "e", "È": "E", "ê": "e", "Ê": "E", "ë": "e", "Ë": "E",
+    "î": "i", "Î": "I", "ï": "i", "Ï": "I", "ô": "o", "Ô": "O",
+    "ö": "o", "Ö": "O", "ù": "u", "Ù": "U", "û": "u", "Û": "U",
+    "ü": "u", "Ü": "U", "ÿ": "y", "Ÿ": "Y", "ç": "c", "Ç": "C",
+    "ß": "ss", "¿": "", "¡": "", "°": "",
+    "\u2018": "", "\u2019": "", "\u201C": "", "\u201D": ""
+}
+
+_TABLA_REEMPLAZOS = str.maketrans(REEMPLAZOS)
+
+# limpiar_texto conserva c.isalnum() y estos símbolos; el resto pasa a
+# espacio. En re, \w es exactamente isalnum() más "_", por eso "_" se
+# añade aparte a la clase de caracteres a sustituir.
+_PERMITIDOS = " :,.!?@-áéíóúÁÉÍÓÚñÑ[](){}<>"
+_NO_PERMITIDO = re.compile(r"[^\w" + re.escape(_PERMITIDOS) + r"]|_")
+_REPETIDOS = re.compile(r"(.)\1{3,}")
+
+def clean_text_chars(text: str) -> str:
+    return text.translate(_TABLA_REEMPLAZOS)
+
+def clean_text(text: str) -> str:
+    if not isinstance(text, str):
+        return ""
+    return text.translate(_TABLA_REEMPLAZOS).replace("\r\n", "\n").strip()
+
+def limpiar_texto(texto):
+    limpio = _NO_PERMITIDO.sub(" ", texto)
+    limpio = _REPETIDOS.sub(r"\1", limpio)
+    return limpio.strip()
+
+# ── API por lotes ────────────────────────────────────
+def clean_texts(textos):
+    tabla = _TABLA_REEMPLAZOS
+    return [t.translate(tabla).replace("\r\n", "\n").strip() if isinstance(t, str) else ""
+            for t in textos]
+
+def limpiar_textos(textos):
+    sub_no_permitido = _NO_PERMITIDO.sub
+    sub_repetidos = _REPETIDOS.sub
+    return [sub_repetidos(r"\1", sub_no_permitido(" ", t)).strip() for t in textos]
@@ -0,0 +1,216 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# --------------------------------------------------------
+# PERFILADO DE PETICIONES BAJO DEMANDA
+# --------------------------------------------------------
+# Perfilador por muestreo: mientras está activo, un hilo lee cada
+# PERFIL_INTERVALO segundos la pila de las peticiones en curso con
+# sys._current_frames() (bajo gevent, el gr_frame del greenlet de la
+# petición). No instrumenta nada, así que el coste es ese hilo y solo
+# mientras el perfilado está encendido.
+#
+# - Se muestrea una fracción PERFIL_FRACCION de las peticiones.
+# - Además, toda petición que supera PERFIL_LENTO segundos empieza a
+#   muestrearse desde ese momento y se guarda siempre (outliers).
+#
+# Salida en PERFIL_DIR, en formato "folded" (pila;separada;por;puntos count),
+# listo para flamegraph.pl o speedscope:
+# - req-<hora>-<pid>-<n>-<ruta>-<ms>.folded: una petición.
+# - agregado-<pid>.folded: suma de todas las muestreadas del worker;
+#   `cat agregado-*.folded` da el agregado global.
+#
+# El interruptor ("@zenko profile on|off") es un fichero en PERFIL_DIR,
+# así lo ven todos los workers.
+
+PERFIL_DIR = os.getenv("PERFIL_DIR", os.path.join(tempfile.gettempdir(), "zenko-perfiles"))
+PERFIL_FRACCION = float(os.getenv("PERFIL_FRACCION", "0.05"))
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.005"))
+PERFIL_LENTO = float(os.getenv("PERFIL_LENTO", "2.0"))
+PERFIL_MAX_FICHEROS = int(os.getenv("PERFIL_MAX_FICHEROS", "200"))
+PERFIL_VOLCADO = float(os.getenv("PERFIL_VOLCADO", "5"))
+PERFIL_PROFUNDIDAD = int(os.getenv("PERFIL_PROFUNDIDAD", "80"))
+
+INTERRUPTOR = "activo"
+
+class Registro:
+    __slots__ = ("ident", "greenlet", "inicio", "muestreada", "pilas", "muestras")
+
+    def __init__(self, ident, greenlet, muestreada):
+        self.ident = ident
+        self.greenlet = greenlet
+        self.inicio = time.perf_counter()
+        self.muestreada = muestreada
+        self.pilas = {}
+        self.muestras = 0
+
+class Perfilador:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self._agregado = {}
+        self._sucio = False
+        self._pid = None
+        self._hilo = None
+        self._activo = False
+        self._visto = 0.0
+        self.guardados = 0
+        self.lentos = 0
+
+    # ── Interruptor compartido ───────────────────────
+    def activo(self):
+        ahora = time.time()
+        if ahora - self._visto >= 1.0:
+            self._visto = ahora
+            self._activo = os.path.exists(os.path.join(PERFIL_DIR, INTERRUPTOR))
+        return self._activo
+
+    def activar(self):
+        os.makedirs(PERFIL_DIR, exist_ok=True)
+        with open(os.path.join(PERFIL_DIR, INTERRUPTOR), "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+        self._visto = 0.0
+
+    def desactivar(self):
+        try:
+            os.remove(os.path.join(PERFIL_DIR, INTERRUPTOR))
+        except FileNotFoundError:
+            pass
+        self._visto = 0.0
+
+    # ── Ciclo de una petición ────────────────────────
+    def empezar(self):
+        if not self.activo():
+            return None
+        self._arrancar()
+        reg = Registro(threading.get_ident(), _greenlet_actual(),
+                       random.random() < PERFIL_FRACCION)
+        with self._lock:
+            self._en_curso[id(reg)] = reg
+        return reg
+
+    def terminar(self, reg, ruta):
+        if reg is None:
+            return
+        with self._lock:
+            self._en_curso.pop(id(reg), None)
+            pilas = dict(reg.pilas)
+        duracion = time.perf_counter() - reg.inicio
+        lenta = duracion >= PERFIL_LENTO
+        if not pilas or not (reg.muestreada or lenta):
+            return
+        with self._lock:
+            for pila, n in pilas.items():
+                self._agregado[pila] = self._agregado.get(pila, 0) + n
+            self._sucio = True
+            self.guardados += 1
+            self.lentos += lenta
+            n = self.guardados
+        nombre = "req-{}-{}-{:05d}-{}-{}ms{}.folded".format(
+            time.strftime("%Y%m%d-%H%M%S"), os.getpid(), n, _nombre_ruta(ruta),
+            int(duracion * 1000), "-lenta" if lenta else "")
+        try:
+            _escribir_folded(os.path.join(PERFIL_DIR, nombre), pilas)
+            self._podar()
+        except OSError as e:
+            print("Error guardando perfil:", e)
+
+    # ── Muestreo ─────────────────────────────────────
+    def _arrancar(self):
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._hilo is None or not self._hilo.is_alive():
+                if self._pid != os.getpid():
+                    self._en_curso, self._agregado = {}, {}
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="perfilador")
+                self._hilo.start()
+
+    def _bucle(self):
+        ultimo_volcado = time.time()
+        while self.activo():
+            time.sleep(PERFIL_INTERVALO)
+            self._muestrear()
+            if time.time() - ultimo_volcado >= PERFIL_VOLCADO:
+                ultimo_volcado = time.time()
+                self._volcar_agregado()
+        self._volcar_agregado()
+        with self._lock:
+            self._hilo = None
+
+    def _muestrear(self):
+        ahora = time.perf_counter()
+        with self._lock:
+            objetivos = [r for r in self._en_curso.values()
+                         if r.muestreada or ahora - r.inicio >= PERFIL_LENTO]
+        if not objetivos:
+            return
+        frames = sys._current_frames()
+        pilas = []
+        for reg in objetivos:
+            frame = reg.greenlet.gr_frame if reg.greenlet is not None else frames.get(reg.ident)
+            if frame is not None:
+                pilas.append((reg, _pila(frame)))
+        del frames
+        with self._lock:
+            for reg, pila in pilas:
+                reg.pilas[pila] = reg.pilas.get(pila, 0) + 1
+                reg.muestras += 1
+
+    def _volcar_agregado(self):
+        with self._lock:
+            if not self._sucio:
+                return
+            agregado = dict(self._agregado)
+            self._sucio = False
+        try:
+            _escribir_folded(os.path.join(PERFIL_DIR, f"agregado-{os.getpid()}.folded"), agregado)
+        except OSError as e:
+            print("Error guardando agregado de perfiles:", e)
+
+    def _podar(self):
+        ficheros = sorted(f for f in os.listdir(PERFIL_DIR) if f.startswith("req-"))
+        for f in ficheros[:max(0, len(ficheros) - PERFIL_MAX_FICHEROS)]:
+            try:
+                os.remove(os.path.join(PERFIL_DIR, f))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"activo": self.activo(), "dir": PERFIL_DIR, "fraccion": PERFIL_FRACCION,
+                "lento": PERFIL_LENTO, "en_curso": len(self._en_curso),
+                "guardados": self.guardados, "lentos": self.lentos}
+
+def _greenlet_actual():
+    # bajo gevent las peticiones son greenlets: sys._current_frames() solo
+    # ve el hilo del hub, así que se guarda el greenlet para leer su frame
+    if "gevent.monkey" in sys.modules and sys.modules["gevent.monkey"].is_module_patched("threading"):
+        from greenlet import getcurrent
+        return getcurrent()
+    return None
+
+def _pila(frame):
+    partes = []
+    while frame is not None and len(partes) < PERFIL_PROFUNDIDAD:
+        code = frame.f_code
+        partes.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(partes))
+
+def _nombre_ruta(ruta):
+    return "".join(c if c.isalnum() else "_" for c in (ruta or "sin_ruta")).strip("_") or "raiz"
+
+def _escribir_folded(path, pilas):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for pila, n in sorted(pilas.items()):
+            f.write(f"{pila} {n}\n")
+    os.replace(tmp, path)
+
+perfilador = Perfilador()
@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# --------------------------------------------------------
+# ROUTER DE PROVEEDORES LLM
+# --------------------------------------------------------
+# Reparte el chat libre entre Groq (llama) y DeepSeek. El modelo elegido
+# por el usuario (@zenko llama / @zenko deepseek) es siempre el primer
+# intento; el otro proveedor es el respaldo.
+#
+# - Por proveedor se guarda una ventana de latencias y resultados (p95,
+#   tasa de error).
+# - Circuit breaker: tras LLM_CB_FALLOS errores seguidos, o una tasa de
+#   error por encima de LLM_CB_TASA en la ventana, el proveedor queda
+#   fuera LLM_CB_ENFRIAMIENTO segundos; después se deja pasar una única
+#   petición de prueba que lo cierra o lo vuelve a abrir.
+# - Hedging (opcional, LLM_HEDGE=1): si el primero no respondió en su p95,
+#   se lanza la misma petición al segundo y gana la primera respuesta
+#   válida. La otra termina en segundo plano y solo alimenta las métricas.
+#
+# Los proveedores sin API key se saltan. Si fallan todos, se devuelve el
+# error del primero que se intentó (el preferido), no el del último.
+# Con `cupo` (admision.cupo_llm), la petición duplicada del hedging
+# necesita su propia plaza; sin hueco, no se duplica.
+#
+# El estado es por proceso: cada worker aprende de su propio tráfico.
+
+LLM_VENTANA = int(os.getenv("LLM_VENTANA", "100"))
+LLM_CB_FALLOS = int(os.getenv("LLM_CB_FALLOS", "3"))
+LLM_CB_TASA = float(os.getenv("LLM_CB_TASA", "0.5"))
+LLM_CB_MIN_MUESTRAS = int(os.getenv("LLM_CB_MIN_MUESTRAS", "10"))
+LLM_CB_ENFRIAMIENTO = float(os.getenv("LLM_CB_ENFRIAMIENTO", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN = float(os.getenv("LLM_HEDGE_MIN", "1.0"))
+LLM_HEDGE_MIN_MUESTRAS = int(os.getenv("LLM_HEDGE_MIN_MUESTRAS", "20"))
+LLM_HILOS = int(os.getenv("LLM_HILOS", "32"))
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+class Proveedor:
+    def __init__(self, nombre, llamar, llamar_stream=None, configurado=None):
+        self.nombre = nombre
+        self.llamar = llamar
+        self.llamar_stream = llamar_stream
+        self.configurado = configurado or (lambda: True)
+        self.latencias = deque(maxlen=LLM_VENTANA)
+        self.resultados = deque(maxlen=LLM_VENTANA)
+        self.fallos_seguidos = 0
+        self.circuito = CERRADO
+        self.abierto_hasta = 0.0
+        self.prueba_en_curso = False
+        self.prueba_desde = 0.0
+        self.llamadas = 0
+        self.errores = 0
+        self.aperturas = 0
+        self._lock = threading.Lock()
+
+    # ¿Aceptaría una petición ahora? Solo consulta, para ordenar: no
+    # cambia el circuito ni ocupa la prueba del semiabierto.
+    def estado(self, ahora=None):
+        ahora = ahora or time.time()
+        with self._lock:
+            if self.circuito == CERRADO:
+                return True
+            if self.circuito == ABIERTO:
+                return ahora >= self.abierto_hasta
+            return not self.prueba_en_curso or ahora - self.prueba_desde > LLM_CB_ENFRIAMIENTO
+
+    # Justo antes de llamar. En semiabierto solo pasa una petición; si la
+    # prueba reservada no llegó a registrarse, la reserva caduca tras otro
+    # enfriamiento.
+    def reservar(self, ahora=None):
+        ahora = ahora or time.time()
+        with self._lock:
+            if self.circuito == CERRADO:
+                return True
+            if self.circuito == ABIERTO and ahora >= self.abierto_hasta:
+                self.circuito = SEMIABIERTO
+                self.prueba_en_curso = False
+            if self.circuito == SEMIABIERTO and (
+                    not self.prueba_en_curso or ahora - self.prueba_desde > LLM_CB_ENFRIAMIENTO):
+                self.prueba_en_curso = True
+                self.prueba_desde = ahora
+                return True
+            return False
+
+    def registrar(self, ok, duracion):
+        with self._lock:
+            self.llamadas += 1
+            self.resultados.append(ok)
+            if ok:
+                self.latencias.append(duracion)
+                self.fallos_seguidos = 0
+                self.circuito = CERRADO
+                self.prueba_en_curso = False
+                return
+            self.errores += 1
+            self.fallos_seguidos += 1
+            n = len(self.resultados)
+            tasa = self.resultados.count(False) / n
+            if (self.circuito == SEMIABIERTO or self.fallos_seguidos >= LLM_CB_FALLOS or
+                    (n >= LLM_CB_MIN_MUESTRAS and tasa > LLM_CB_TASA)):
+                if self.circuito != ABIERTO:
+                    self.aperturas += 1
+                self.circuito = ABIERTO
+                self.abierto_hasta = time.time() + LLM_CB_ENFRIAMIENTO
+                self.prueba_en_curso = False
+
+    def percentil(self, p):
+        with self._lock:
+            muestras = sorted(self.latencias)
+        if not muestras:
+            return None
+        return muestras[min(len(muestras) - 1, int(p * len(muestras)))]
+
+    def stats(self):
+        p50, p95 = self.percentil(0.5), self.percentil(0.95)
+        with self._lock:
+            n = len(self.resultados)
+            return {
+                "circuito": self.circuito, "llamadas": self.llamadas, "errores": self.errores,
+                "aperturas": self.aperturas,
+                "tasa_error": round(self.resultados.count(False) / n, 3) if n else 0.0,
+                "p50": round(p50, 3) if p50 is not None else None,
+                "p95": round(p95, 3) if p95 is not None else None
+            }
+
+class RouterLLM:
+    def __init__(self, proveedores, es_error, hedge=LLM_HEDGE, cupo=None):
+        self.proveedores = {p.nombre: p for p in proveedores}
+        self.es_error = es_error
+        self.hedge = hedge
+        self.cupo = cupo
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.failovers = 0
+        self.hedges = 0
+        self.hedges_ganados = 0
+
+    def _ejecutor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=LLM_HILOS, thread_name_prefix="llm")
+        return self._pool
+
+    # Preferido primero, luego el resto. Se saltan los no configurados y
+    # los de circuito abierto, salvo que no quede ninguno: entonces se
+    # intenta igual el primero configurado (o el preferido).
+    def orden(self, preferido):
+        nombres = list(self.proveedores)
+        if preferido in self.proveedores:
+            nombres.remove(preferido)
+            nombres.insert(0, preferido)
+        configurados = ([self.proveedores[n] for n in nombres if self.proveedores[n].configurado()] or
+                        [self.proveedores[nombres[0]]])
+        ahora = time.time()
+        return [p for p in configurados if p.estado(ahora)] or configurados[:1]
+
+    # Un candidato cuya prueba de semiabierto acaba de tomar otra petición
+    # se salta, salvo que sea el único.
+    def _reservar(self, proveedor, candidatos):
+        return proveedor.reservar() or len(candidatos) == 1
+
+    def _intentar(self, proveedor, prompt, user_msg, opciones):
+        inicio = time.time()
+        try:
+            reply = proveedor.llamar(prompt, user_msg, **opciones)
+        except Exception as e:
+            reply = f"Error al conectar con {proveedor.nombre}: {str(e)}"
+        ok = bool(reply) and not self.es_error(reply)
+        proveedor.registrar(ok, time.time() - inicio)
+        return ok, reply
+
+    # `opciones` (max_tokens, temperature...) se pasan tal cual al proveedor.
+    def llamar(self, prompt, user_msg, preferido, **opciones):
+        candidatos = self.orden(preferido)
+        if self.hedge and len(candidatos) > 1:
+            p95 = candidatos[0].percentil(0.95)
+            if p95 is not None and len(candidatos[0].latencias) >= LLM_HEDGE_MIN_MUESTRAS:
+                return self._llamar_hedge(candidatos, prompt, user_msg, opciones,
+                                          max(p95, LLM_HEDGE_MIN))
+        return self._en_serie(candidatos, prompt, user_msg, opciones)
+
+    def _en_serie(self, candidatos, prompt, user_msg, opciones, error=None):
+        for proveedor in candidatos:
+            if not self._reservar(proveedor, candidatos):
+                continue
+            if error is not None:
+                self.failovers += 1
+            ok, reply = self._intentar(proveedor, prompt, user_msg, opciones)
+            if ok:
+                return reply
+            error = reply if error is None else error
+        return error or ""
+
+    # La petición duplicada ocupa su propia plaza del cupo, que se libera
+    # al terminar aunque ya haya ganado la otra.
+    def _intentar_con_cupo(self, proveedor, prompt, user_msg, opciones):
+        try:
+            return self._intentar(proveedor, prompt, user_msg, opciones)
+        finally:
+            self.cupo.salir()
+
+    def _duplicar(self, proveedor, prompt, user_msg, opciones):
+        if self.cupo is None:
+            if not proveedor.reservar():
+                return None
+            return self._ejecutor().submit(self._intentar, proveedor, prompt, user_msg, opciones)
+        if not self.cupo.entrar():
+            return None
+        if not proveedor.reservar():
+            self.cupo.salir()
+            return None
+        return self._ejecutor().submit(self._intentar_con_cupo, proveedor, prompt, user_msg, opciones)
+
+    def _llamar_hedge(self, candidatos, prompt, user_msg, opciones, espera):
+        if not candidatos[0].reservar():
+            return self._en_serie(candidatos[1:], prompt, user_msg, opciones)
+        # el primero usa la plaza de cupo de quien llama
+        primero = self._ejecutor().submit(self._intentar, candidatos[0], prompt, user_msg, opciones)
+        hechos, _ = wait([primero], timeout=espera)
+        if hechos:
+            ok, reply = primero.result()
+            if ok:
+                return reply
+            # falló rápido: failover normal, sin carrera
+            return self._en_serie(candidatos[1:], prompt, user_msg, opciones, error=reply)
+        segundo = self._duplicar(candidatos[1], prompt, user_msg, opciones)
+        if segundo is None:
+            # sin plaza o sin prueba libre: se espera al primero
+            ok, reply = primero.result()
+            return reply
+        self.hedges += 1
+        pendientes = {primero, segundo}
+        respuestas = {}
+        while pendientes:
+            hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                ok, reply = futuro.result()
+                if ok:
+                    if futuro is segundo:
+                        self.hedges_ganados += 1
+                    return reply
+                respuestas[futuro] = reply
+        return respuestas[primero]
+
+    # Streaming: se cambia de proveedor solo si falla antes del primer
+    # fragmento; una vez empezada la respuesta ya no hay vuelta atrás.
+    def stream(self, prompt, user_msg, preferido, **opciones):
+        candidatos = [p for p in self.orden(preferido) if p.llamar_stream]
+        error = None
+        for proveedor in candidatos:
+            if not self._reservar(proveedor, candidatos):
+                continue
+            if error is not None:
+                self.failovers += 1
+            inicio = time.time()
+            fragmentos = proveedor.llamar_stream(prompt, user_msg, **opciones)
+            primero = next(fragmentos, "")
+            if not primero or self.es_error(primero):
+                proveedor.registrar(False, time.time() - inicio)
+                error = primero if error is None else error
+                continue
+            yield primero
+            yield from fragmentos
+            proveedor.registrar(True, time.time() - inicio)
+            return
+        if error:
+            yield error
+
+    def stats(self):
+        return {
+            "hedge": self.hedge, "failovers": self.failovers,
+            "hedges": self.hedges, "hedges_ganados": self.hedges_ganados,
+            "proveedores": {n: p.stats() for n, p in self.proveedores.items()}
+        }
@@ -0,0 +1,205 @@
+import _thread
+import os
+import sys
+import threading
+from collections import deque
+
+# --------------------------------------------------------
+# MODO DE SERVIDOR
+# --------------------------------------------------------
+# Casi todo el tiempo de una petición es espera de red (Groq, DeepSeek,
+# traducción, clima, Wikipedia), así que con el worker sync de gunicorn
+# una llamada de 30 s deja un proceso entero parado. Dos modos:
+#
+# - gthread (por defecto): WEB_CONCURRENCY procesos x GUNICORN_THREADS
+#   hilos. No necesita dependencias extra.
+# - gevent: cada worker atiende hasta GEVENT_CONEXIONES conexiones en
+#   greenlets; gunicorn aplica monkey.patch_all() antes de cargar la app,
+#   así que requests, los locks, las colas y los hilos de fondo pasan a
+#   ser cooperativos. SQLite sigue siendo bloqueante, pero sus
+#   operaciones son cortas.
+#
+# La capacidad de chats simultáneos es conexiones por worker, no número
+# de procesos. gunicorn.conf.py lee esta configuración y, al arrancar
+# cada worker, comprobar_concurrencia() valida que el estado global es
+# seguro bajo el modo elegido.
+#
+# WEB_CONCURRENCY es 1 por defecto: las bandejas, oyentes y estados del
+# traductor (ESTADO_POR_PROCESO) aún viven en memoria, así que con dos
+# workers un mensaje enviado por A nunca llega a un HUD que escucha en B.
+# Mientras ese estado esté registrado, la comprobación no deja arrancar
+# con más de un worker.
+
+MODOS = ("gthread", "gevent", "sync")
+
+SERVIDOR_MODO = os.getenv("SERVIDOR_MODO", "gthread")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "16"))
+GEVENT_CONEXIONES = int(os.getenv("GEVENT_CONEXIONES", "500"))
+GUNICORN_TIMEOUT = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+GUNICORN_KEEPALIVE = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Estado global mutable de la app y el lock que lo protege. None indica
+# que solo se reemplaza entero o se muta con una única operación atómica.
+ESTADO_COMPARTIDO = {
+    "main": {"wiki_guardado": "wiki_guardado_lock", "cuerpos_version": None,
+             "vaciado_respuestas": None},
+    "translate_api": {
+        "bandejas": "mensajes_lock", "conversaciones": "mensajes_lock",
+        "oyentes": "mensajes_lock", "idioma_remitente": "idioma_remitente_lock",
+        "workers": "workers_lock"
+    },
+    "http_client": {},
+    "feeds": {},
+    "sesiones": {},
+    "almacen": {},
+    "estado_hud": {},
+    "cache": {},
+    "router_llm": {},
+    "admision": {},
+    "metricas": {},
+    "perfilador": {},
+}
+
+# Estado que solo es correcto si todas las peticiones llegan al mismo
+# proceso. Se quita de aquí al moverlo a almacen/SQLite.
+ESTADO_POR_PROCESO = {
+    "translate_api": ("bandejas", "oyentes", "conversaciones", "estados", "cola_traducciones"),
+}
+
+def configuracion(modo=None):
+    modo = modo or SERVIDOR_MODO
+    if modo not in MODOS:
+        raise ValueError(f"SERVIDOR_MODO desconocido: {modo} (opciones: {', '.join(MODOS)})")
+    cfg = {
+        "bind": f"0.0.0.0:{os.getenv('PORT', '5000')}",
+        "workers": WEB_CONCURRENCY,
+        "worker_class": modo,
+        "timeout": GUNICORN_TIMEOUT,
+        "keepalive": GUNICORN_KEEPALIVE,
+        # la app se carga en cada worker, después del fork y del parcheo
+        # de gevent: ningún lock ni conexión se hereda del master
+        "preload_app": False,
+    }
+    if modo == "gthread":
+        cfg["threads"] = GUNICORN_THREADS
+    elif modo == "gevent":
+        cfg["worker_connections"] = GEVENT_CONEXIONES
+    return cfg
+
+def concurrencia(modo=None):
+    modo = modo or SERVIDOR_MODO
+    if modo == "gthread":
+        return GUNICORN_THREADS
+    if modo == "gevent":
+        return GEVENT_CONEXIONES
+    return 1
+
+# Peticiones que pueden quedarse esperando (long-poll, SSE) por worker sin
+# dejar sin hilos a /chat y /version: la mitad de la concurrencia. Con
+# el worker sync ninguna, porque una espera bloquea el proceso entero.
+#
+# Es el número de HUDs conectados a la vez, y con WEB_CONCURRENCY=1 es el
+# total del servicio: con gthread por defecto, 16 hilos // 2 = 8; con
+# gevent, 500 // 2 = 250. Un HUD sin hueco no falla (el poll responde al
+# momento, el stream pide "retry:"), pero pasa a entregar con el retraso
+# del reintento. Para más de unos pocos HUDs: SERVIDOR_MODO=gevent, o
+# subir GUNICORN_THREADS (cada hilo es memoria y un hueco del pool HTTP).
+# ESPERAS_MAX lo fija a mano.
+def esperas_max(modo=None):
+    modo = modo or SERVIDOR_MODO
+    if modo == "sync":
+        return 0
+    return max(1, concurrencia(modo) // 2)
+
+# Tipos de lock del proceso actual, calculados tras el parcheo de gevent
+# e incluyendo los nativos (que son justamente los que hay que detectar).
+def _tipos_lock():
+    tipos = {_thread.LockType, type(threading.Lock()), type(threading.RLock())}
+    try:
+        from gevent import monkey
+        tipos.add(type(monkey.get_original("_thread", "allocate_lock")()))
+        tipos.add(monkey.get_original("_thread", "RLock"))
+    except (ImportError, AttributeError):
+        tipos.add(_thread.RLock)
+    return tuple(tipos)
+
+def _es_lock(valor, tipos):
+    return isinstance(valor, tipos)
+
+def _es_contenedor(valor):
+    return isinstance(valor, (dict, set, list, deque))
+
+# El lock si el valor lo es, o los locks de un objeto de la app
+# (TTLCache, SessionStore, FeedCache...).
+def _locks_de(nombre, valor, tipos):
+    if _es_lock(valor, tipos):
+        yield nombre, valor
+    elif type(valor).__module__ in ESTADO_COMPARTIDO:
+        for attr, v in getattr(valor, "__dict__", {}).items():
+            if _es_lock(v, tipos):
+                yield f"{nombre}.{attr}", v
+
+# Devuelve (errores, avisos). Los errores impiden arrancar el worker.
+def comprobar_concurrencia(modo=None, workers=None):
+    modo = modo or SERVIDOR_MODO
+    workers = workers or WEB_CONCURRENCY
+    errores, avisos = [], []
+    if modo not in MODOS:
+        return [f"SERVIDOR_MODO desconocido: {modo}"], avisos
+
+    if workers > 1:
+        for nombre_modulo, nombres in ESTADO_POR_PROCESO.items():
+            modulo = sys.modules.get(nombre_modulo)
+            for nombre in nombres:
+                if modulo is not None and hasattr(modulo, nombre):
+                    errores.append(f"{nombre_modulo}.{nombre}: estado por proceso con "
+                                   f"{workers} workers (usa WEB_CONCURRENCY=1)")
+
+    if modo == "gevent":
+        try:
+            from gevent import monkey
+        except ImportError:
+            return ["SERVIDOR_MODO=gevent pero gevent no está instalado"], avisos
+        for m in ("socket", "ssl", "threading", "select", "time", "queue"):
+            if not monkey.is_module_patched(m):
+                errores.append(f"gevent: el módulo {m} no está parcheado (¿preload_app?)")
+
+    tipos = _tipos_lock()
+    for nombre_modulo, declarados in ESTADO_COMPARTIDO.items():
+        modulo = sys.modules.get(nombre_modulo)
+        if modulo is None:
+            continue
+        for nombre, valor in vars(modulo).items():
+            if nombre.startswith("__") or nombre.isupper() or isinstance(valor, type):
+                continue
+            if _es_contenedor(valor):
+                if nombre not in declarados:
+                    errores.append(f"{nombre_modulo}.{nombre}: estado global sin lock declarado")
+                    continue
+                lock = declarados[nombre]
+                if lock is not None and not _es_lock(getattr(modulo, lock, None), tipos):
+                    errores.append(f"{nombre_modulo}.{nombre}: el lock {lock} no existe")
+            if modo == "gevent":
+                # un lock nativo creado antes del parcheo bloquearía el hub
+                for ruta, lock in _locks_de(nombre, valor, tipos):
+                    if type(lock).__module__ == "_thread":
+                        errores.append(f"{nombre_modulo}.{ruta}: lock nativo bajo gevent")
+
+    http_client = sys.modules.get("http_client")
+    if http_client is not None and modo != "sync":
+        n = concurrencia(modo)
+        if http_client.LLM_POOL_MAXSIZE < n:
+            avisos.append(f"HTTP_LLM_POOL_MAXSIZE={http_client.LLM_POOL_MAXSIZE} < {n} "
+                          "peticiones simultáneas por worker: se abrirán conexiones sin reutilizar")
+    if modo == "sync":
+        avisos.append("worker sync: una llamada lenta al LLM bloquea el proceso entero")
+    elif modo == "gthread":
+        esperas = getattr(sys.modules.get("translate_api"), "ESPERAS_MAX", esperas_max(modo))
+        avisos.append(f"gthread: como mucho {esperas} HUDs en long-poll/SSE por worker "
+                      "(SERVIDOR_MODO=gevent para muchos HUDs)")
+    return errores, avisos
+
+def info():
+    return {"modo": SERVIDOR_MODO, "workers": WEB_CONCURRENCY,
+            "concurrencia_por_worker": concurrencia()}
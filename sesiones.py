@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from almacen import MemoryBackend, SCRIPTS_MAX
+
+# --------------------------------------------------------
+# ALMACÉN DE SESIONES
+# --------------------------------------------------------
+# Sesiones compactas (__slots__, historial en deque acotado, scripts y
+# contexto creados solo cuando se usan) en un LRU con expiración por
+# inactividad. Como el orden LRU es también el orden de último uso, las
+# sesiones inactivas están siempre al principio y purgarlas cuesta
+# O(expiradas).
+#
+# Es además la cache de lectura del backend durable (almacen.py): una
+# sesión que no está en memoria se carga de él, y las que otro worker
+# modificó se refrescan en sitio (sin perder historial ni contexto).
+
+SESIONES_MAX = int(os.getenv("SESIONES_MAX", "2000"))
+SESION_TTL = int(os.getenv("SESION_TTL", str(6 * 3600)))
+HISTORIAL_MAX = int(os.getenv("HISTORIAL_MAX", "50"))
+SCRIPT_MAX_LEN = int(os.getenv("SCRIPT_MAX_LEN", "65536"))
+
+class Sesion:
+    __slots__ = ("lang", "history", "lsl_mode", "scripts", "contexto", "model", "ultimo_uso")
+
+    def __init__(self):
+        self.lang = "es"
+        self.history = None
+        self.lsl_mode = False
+        self.scripts = None
+        self.contexto = None
+        self.model = "llama"
+        self.ultimo_uso = time.time()
+
+    def agregar_historial(self, item):
+        if self.history is None:
+            self.history = deque(maxlen=HISTORIAL_MAX)
+        self.history.append(item)
+
+    def guardar_script(self, sid, script):
+        if self.scripts is None:
+            self.scripts = OrderedDict()
+        self.scripts[sid] = script[:SCRIPT_MAX_LEN]
+        while len(self.scripts) > SCRIPTS_MAX:
+            self.scripts.popitem(last=False)
+
+    # Aplica los datos durables (idioma, modelo, modo LSL, scripts).
+    def aplicar(self, datos):
+        if not datos:
+            return
+        self.lang = datos.get("lang") or self.lang
+        self.model = datos.get("model") or self.model
+        self.lsl_mode = datos.get("lsl_mode", self.lsl_mode)
+        scripts = datos.get("scripts")
+        if scripts:
+            self.scripts = OrderedDict(scripts[-SCRIPTS_MAX:])
+
+class SessionStore:
+    def __init__(self, max_sesiones=SESIONES_MAX, ttl=SESION_TTL, backend=None):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.creadas = 0
+        self.expulsadas_lru = 0
+        self.expulsadas_inactivas = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, user):
+        return user in self._data
+
+    def _purgar(self, ahora):
+        limite = ahora - self.ttl
+        while self._data:
+            user, sesion = next(iter(self._data.items()))
+            if sesion.ultimo_uso > limite:
+                break
+            del self._data[user]
+            self.expulsadas_inactivas += 1
+
+    def _sincronizar(self):
+        for user in self.backend.cambios():
+            sesion = self._data.get(user)
+            if sesion is not None and not self.backend.pendiente(user):
+                sesion.aplicar(self.backend.cargar(user))
+
+    def get(self, user):
+        self._sincronizar()
+        ahora = time.time()
+        with self._lock:
+            sesion = self._data.get(user)
+            if sesion is not None:
+                sesion.ultimo_uso = ahora
+                self._data.move_to_end(user)
+                return sesion
+        # fuera del lock: la lectura de disco no bloquea al resto de sesiones
+        datos = self.backend.cargar(user)
+        with self._lock:
+            sesion = self._data.get(user)
+            if sesion is not None:
+                return sesion
+            self._purgar(ahora)
+            sesion = self._data[user] = Sesion()
+            sesion.aplicar(datos)
+            self.creadas += 1
+            while len(self._data) > self.max_sesiones:
+                self._data.popitem(last=False)
+                self.expulsadas_lru += 1
+            return sesion
+
+    def guardar_prefs(self, user):
+        sesion = self.get(user)
+        self.backend.guardar_prefs(user, sesion.lang, sesion.model, sesion.lsl_mode)
+
+    def guardar_script(self, user, sid, script):
+        self.get(user).guardar_script(sid, script)
+        self.backend.guardar_script(user, sid, script[:SCRIPT_MAX_LEN])
+
+    def peek(self, user):
+        return self._data.get(user)
+
+    def stats(self):
+        return {
+            "activas": len(self._data), "max": self.max_sesiones, "ttl": self.ttl,
+            "creadas": self.creadas, "expulsadas_lru": self.expulsadas_lru,
+            "expulsadas_inactivas": self.expulsadas_inactivas,
+            "almacen": self.backend.stats()
+        }
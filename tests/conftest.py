@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Los módulos de la app están en la raíz del repo, sin paquete.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importar main.py abre SQLite y la cache de Wikipedia: fuera del repo.
+_TMP = tempfile.mkdtemp(prefix="zenko-tests-")
+os.environ.setdefault("ALMACEN_PATH", os.path.join(_TMP, "zenko.db"))
+os.environ.setdefault("WIKI_CACHE_PATH", "")
+os.environ.setdefault("METRICAS_DIR", os.path.join(_TMP, "metricas"))
+os.environ.setdefault("RESPUESTAS_FLUSH_PATH", os.path.join(_TMP, "cache-flush"))
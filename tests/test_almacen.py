@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import almacen
+from almacen import SQLiteBackend
+
+# --------------------------------------------------------
+# ALMACEN SQLITE: VOLCADO, CAMBIOS Y LECTURA CON PENDIENTES
+# --------------------------------------------------------
+# Cada backend abre su propia conexión, como dos workers sobre el mismo
+# fichero. Intervalo largo: los volcados solo ocurren al llamar a flush().
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "zenko.db")
+
+def backend(path):
+    return SQLiteBackend(path, intervalo=3600, lote_max=10**6, sync=0)
+
+def test_flush_persiste(path):
+    a = backend(path)
+    a.guardar_prefs("ana", "en", "deepseek", True)
+    a.guardar_script("ana", "001", "default {}")
+    assert a.pendiente("ana")
+    a.flush()
+    assert not a.pendiente("ana")
+    assert a.stats()["pendientes"] == 0
+    assert backend(path).cargar("ana") == {
+        "lang": "en", "model": "deepseek", "lsl_mode": True, "scripts": [("001", "default {}")]}
+
+def test_cargar_mezcla_lo_no_volcado(path):
+    a = backend(path)
+    a.guardar_prefs("ana", "en", "llama", False)
+    a.guardar_script("ana", "001", "uno")
+    a.flush()
+    a.guardar_prefs("ana", "fr", "llama", True)
+    a.guardar_script("ana", "002", "dos")
+    datos = a.cargar("ana")
+    assert (datos["lang"], datos["lsl_mode"]) == ("fr", True)
+    assert datos["scripts"] == [("001", "uno"), ("002", "dos")]
+    # otro proceso solo ve lo volcado
+    assert backend(path).cargar("ana")["lang"] == "en"
+
+def test_cargar_usuario_desconocido(path):
+    a = backend(path)
+    assert a.cargar("nadie") is None
+    a.guardar_script("nadie", "001", "x")
+    assert a.cargar("nadie") == {"scripts": [("001", "x")]}
+
+def test_cambios_de_otro_proceso(path):
+    a, b = backend(path), backend(path)
+    b.cargar("ana")
+    assert b.cambios() == ()
+    a.guardar_prefs("ana", "it", "llama", False)
+    a.guardar_script("bob", "001", "x")
+    a.flush()
+    assert sorted(b.cambios()) == ["ana", "bob"]
+    assert b.cambios() == ()
+    # los volcados propios no cuentan como cambios
+    assert a.cambios() == ()
+
+def test_cambios_solo_lo_nuevo(path):
+    a, b = backend(path), backend(path)
+    # la primera llamada abre la conexión: lo anterior no estaba en cache
+    assert b.cambios() == ()
+    a.guardar_prefs("ana", "it", "llama", False)
+    a.flush()
+    assert b.cambios() == ["ana"]
+    a.guardar_prefs("bob", "es", "llama", False)
+    a.flush()
+    assert b.cambios() == ["bob"]
+
+def test_recorta_scripts(path, monkeypatch):
+    monkeypatch.setattr(almacen, "SCRIPTS_MAX", 3)
+    a = backend(path)
+    for i in range(5):
+        a.guardar_script("ana", f"{i:03d}", str(i))
+    a.flush()
+    assert [sid for sid, _ in a.cargar("ana")["scripts"]] == ["002", "003", "004"]
+
+def test_flush_fallido_conserva_las_escrituras(path, monkeypatch):
+    a = backend(path)
+    a.guardar_prefs("ana", "en", "llama", False)
+    a.guardar_script("ana", "001", "x")
+
+    def caida():
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(a, "_conexion", caida)
+    with pytest.raises(sqlite3.OperationalError):
+        a.flush()
+    assert a.pendiente("ana")
+    # lo escrito después del fallo gana a lo devuelto al buffer
+    a.guardar_prefs("ana", "fr", "llama", False)
+    monkeypatch.undo()
+    a.flush()
+    assert backend(path).cargar("ana") == {
+        "lang": "fr", "model": "llama", "lsl_mode": False, "scripts": [("001", "x")]}
@@ -0,0 +1,167 @@
+import pytest
+
+from dispatcher import CommandDispatcher
+from main import LANGUAGE_CONFIGS
+
+# --------------------------------------------------------
+# EQUIVALENCIA DE dispatcher.py
+# --------------------------------------------------------
+# El despachador compilado debe detectar el mismo comando y extraer el
+# mismo argumento que la cadena de startswith anterior, salvo en los
+# casos en que la anterior fallaba (CORREGIDOS).
+
+# Copia de detect_command / extract_command_argument anteriores al
+# despachador (recibiendo el idioma en vez del usuario).
+def legacy_detect_command(raw_msg, lang):
+    m = raw_msg.lower().strip()
+
+    if lang == "en":
+        if m.startswith("@zenko functions"):   return "funciones"
+        if m.startswith("@zenko weather"):     return "clima"
+        if m.startswith("@zenko news"):        return "noticias"
+        if m.startswith("@zenko events"):      return "eventos"
+        if m.startswith("@zenko search"):      return "busca"
+        if m.startswith("@zenko define"):      return "define"
+        if m.startswith("@zenko snippet"):     return "snippet"
+        if m.startswith("@zenko history"):     return "historial"
+        if m.startswith("@zenko list scripts"):return "lista scripts"
+        if m.startswith("@zenko view script"): return "ver script"
+        if m.startswith("@zenko save script"): return "guarda script"
+        if m == "@zenko lsl on":               return "lsl_on"
+        if m == "@zenko lsl off":              return "lsl_off"
+    elif lang == "fr":
+        if m.startswith("@zenko fonctions"):        return "funciones"
+        if m.startswith("@zenko météo"):            return "clima"
+        if m.startswith("@zenko actualités"):       return "noticias"
+        if m.startswith("@zenko événements"):       return "eventos"
+        if m.startswith("@zenko recherche"):        return "busca"
+        if m.startswith("@zenko définir"):          return "define"
+        if m.startswith("@zenko snippet"):          return "snippet"
+        if m.startswith("@zenko historique"):       return "historial"
+        if m.startswith("@zenko liste scripts"):    return "lista scripts"
+        if m.startswith("@zenko voir script"):      return "ver script"
+        if m.startswith("@zenko enregistrer script"):return "guarda script"
+        if m == "@zenko lsl on":                    return "lsl_on"
+        if m == "@zenko lsl off":                   return "lsl_off"
+    elif lang == "it":
+        if m.startswith("@zenko funzioni"):         return "funciones"
+        if m.startswith("@zenko meteo"):            return "clima"
+        if m.startswith("@zenko notizie"):          return "noticias"
+        if m.startswith("@zenko eventi"):           return "eventos"
+        if m.startswith("@zenko cerca"):            return "busca"
+        if m.startswith("@zenko definisci"):        return "define"
+        if m.startswith("@zenko snippet"):          return "snippet"
+        if m.startswith("@zenko cronologia"):       return "historial"
+        if m.startswith("@zenko lista script"):     return "lista scripts"
+        if m.startswith("@zenko visualizza script"):return "ver script"
+        if m.startswith("@zenko salva script"):     return "guarda script"
+        if m == "@zenko lsl on":                    return "lsl_on"
+        if m == "@zenko lsl off":                   return "lsl_off"
+
+    # Fallback español
+    if m.startswith("@zenko funciones"):    return "funciones"
+    if m.startswith("@zenko clima"):        return "clima"
+    if m.startswith("@zenko noticias"):     return "noticias"
+    if m.startswith("@zenko eventos"):      return "eventos"
+    if m.startswith("@zenko busca"):        return "busca"
+    if m.startswith("@zenko define"):       return "define"
+    if m.startswith("@zenko wikipedia"):    return "wikipedia"
+    if m.startswith("@zenko snippet"):      return "snippet"
+    if m.startswith("@zenko historial"):    return "historial"
+    if m.startswith("@zenko lista scripts"):return "lista scripts"
+    if m.startswith("@zenko ver script"):   return "ver script"
+    if m.startswith("@zenko guarda script"):return "guarda script"
+    if m == "@zenko lsl on":                return "lsl_on"
+    if m == "@zenko lsl off":               return "lsl_off"
+    return None
+
+def legacy_extract_command_argument(raw_msg, command_type, lang):
+    if command_type == "clima":
+        if lang == "en":   return raw_msg.split("weather", 1)[1].strip() if "weather" in raw_msg.lower() else ""
+        if lang == "fr":   return raw_msg.split("météo", 1)[1].strip() if "météo" in raw_msg.lower() else ""
+        if lang == "it":   return raw_msg.split("meteo", 1)[1].strip() if "meteo" in raw_msg.lower() else ""
+        return raw_msg.split("clima", 1)[1].strip()
+    if command_type == "busca":
+        if lang == "en":   return raw_msg.split("search", 1)[1].strip() if "search" in raw_msg.lower() else ""
+        if lang == "fr":   return raw_msg.split("recherche", 1)[1].strip() if "recherche" in raw_msg.lower() else ""
+        if lang == "it":   return raw_msg.split("cerca", 1)[1].strip() if "cerca" in raw_msg.lower() else ""
+        return raw_msg.split("busca", 1)[1].strip()
+    if command_type in ["define", "wikipedia"]:
+        if lang == "en":   return raw_msg.split("define", 1)[1].strip() if "define" in raw_msg.lower() else ""
+        if lang == "fr":   return raw_msg.split("définir", 1)[1].strip() if "définir" in raw_msg.lower() else ""
+        if lang == "it":   return raw_msg.split("definisci", 1)[1].strip() if "definisci" in raw_msg.lower() else ""
+        parts = raw_msg.split(" ", 2)
+        return parts[2].strip() if len(parts) > 2 else ""
+    if command_type == "snippet":
+        return raw_msg.split("snippet", 1)[1].strip()
+    if command_type == "ver script":
+        if lang == "en":   return raw_msg.split("view script", 1)[1].strip() if "view script" in raw_msg.lower() else ""
+        if lang == "fr":   return raw_msg.split("voir script", 1)[1].strip() if "voir script" in raw_msg.lower() else ""
+        if lang == "it":   return raw_msg.split("visualizza script", 1)[1].strip() if "visualizza script" in raw_msg.lower() else ""
+        return raw_msg.split("ver script", 1)[1].strip()
+    return ""
+
+# Comandos cuyo argumento extraía la versión anterior.
+CON_ARGUMENTO = ("clima", "busca", "define", "wikipedia", "snippet", "ver script")
+
+CORPUS = [
+    ("es", "@zenko clima Buenos Aires"), ("es", "@zenko noticias"), ("es", "@zenko lista scripts"),
+    ("es", "@zenko ver script 1712345678901"), ("es", "@zenko define kitsune"),
+    ("es", "@zenko wikipedia Aokigahara"), ("es", "@zenko lsl on"), ("es", "hola zenko que tal"),
+    ("es", "@zenko busca lsl timers"), ("es", "@zenko snippet for loop"), ("es", "@zenko eventos"),
+    ("es", "@zenko funciones"), ("es", "@zenko historial"), ("es", "@zenko guarda script x"),
+    ("es", "  @zenko clima  Rosario  "), ("es", "@zenko  clima Roma"), ("es", "@zenko lsl"),
+    ("es", "@zenko lsl on ya"), ("es", "zenko clima Lima"), ("es", "@zenko clima"),
+    ("en", "@zenko weather London"), ("en", "@zenko news"), ("en", "@zenko view script 42"),
+    ("en", "@zenko search lsl timers"), ("en", "@zenko history"), ("en", "what can you do"),
+    ("en", "@zenko define fox"), ("en", "@zenko snippet x"), ("en", "@zenko functions"),
+    ("en", "@zenko list scripts"), ("en", "@zenko save script y"), ("en", "@zenko lsl off"),
+    ("fr", "@zenko météo Paris"), ("fr", "@zenko événements"), ("fr", "@zenko enregistrer script x"),
+    ("fr", "@zenko définir renard"), ("fr", "@zenko recherche chat"), ("fr", "@zenko voir script 3"),
+    ("fr", "@zenko actualités"), ("fr", "@zenko liste scripts"), ("fr", "@zenko historique"),
+    ("it", "@zenko meteo Roma"), ("it", "@zenko lista script"), ("it", "@zenko visualizza script 7"),
+    ("it", "@zenko lsl off"), ("it", "@zenko cerca gatto"), ("it", "@zenko definisci volpe"),
+    ("it", "@zenko notizie"), ("it", "@zenko salva script z"), ("it", "@zenko cronologia"),
+    ("xx", "@zenko clima Quito"), ("xx", "@zenko weather Quito"),
+]
+
+# (idioma, mensaje, tipo, argumento) donde la versión anterior devolvía
+# un argumento vacío o lanzaba IndexError.
+CORREGIDOS = [
+    # palabra clave del español con el usuario en otro idioma
+    ("it", "@zenko clima Roma", "clima", "Roma"),
+    ("en", "@zenko clima Lima", "clima", "Lima"),
+    ("en", "@zenko wikipedia Tokyo", "wikipedia", "Tokyo"),
+    ("fr", "@zenko wikipedia Paris", "wikipedia", "Paris"),
+    # mayúsculas: split sobre el texto original no encontraba la clave
+    ("es", "@ZENKO Clima Madrid", "clima", "Madrid"),
+    ("en", "@zenko Weather London", "clima", "London"),
+    ("es", "@zenko Busca algo", "busca", "algo"),
+]
+
+@pytest.fixture(scope="module")
+def despachador():
+    return CommandDispatcher(LANGUAGE_CONFIGS)
+
+@pytest.mark.parametrize("lang,msg", CORPUS)
+def test_mismo_tipo(despachador, lang, msg):
+    assert despachador.match(msg, lang)[0] == legacy_detect_command(msg, lang)
+
+@pytest.mark.parametrize("lang,msg", [(l, m) for l, m in CORPUS if legacy_detect_command(m, l) in CON_ARGUMENTO])
+def test_mismo_argumento(despachador, lang, msg):
+    tipo = legacy_detect_command(msg, lang)
+    assert despachador.match(msg, lang) == (tipo, legacy_extract_command_argument(msg, tipo, lang))
+
+@pytest.mark.parametrize("lang,msg,tipo,argumento", CORREGIDOS)
+def test_corregidos(despachador, lang, msg, tipo, argumento):
+    assert legacy_detect_command(msg, lang) == tipo
+    try:
+        anterior = legacy_extract_command_argument(msg, tipo, lang)
+    except IndexError:
+        anterior = None
+    assert anterior != argumento
+    assert despachador.match(msg, lang) == (tipo, argumento)
+
+def test_argumento_conserva_mayusculas(despachador):
+    assert despachador.match("@zenko ver script AbC-12", "es") == ("ver script", "AbC-12")
+    assert despachador.match("@zenko weather New York", "en") == ("clima", "New York")
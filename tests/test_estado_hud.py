@@ -0,0 +1,55 @@
+import pytest
+
+from estado_hud import EstadoHUD
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "hud.db")
+
+def test_escrituras_propias_no_recargan(path):
+    hud = EstadoHUD(path, sync=0)
+    hud.refrescar()
+    recargas = hud.recargas
+    for i in range(50):
+        hud.agregar_pendiente(f"av-{i}")
+    hud.quitar_pendiente("av-0")
+    hud.bloquear("av-1")
+    hud.set_min_version(7)
+    assert hud.recargas == recargas
+    assert len(hud.pendientes()) == 49
+    assert hud.entregables() == sorted(f"av-{i}" for i in range(2, 50))
+    assert hud.min_version() == 7
+    assert hud.recargas == recargas
+
+def test_copia_local_igual_a_la_tabla(path):
+    hud = EstadoHUD(path, sync=0)
+    hud.agregar_pendiente("a")
+    hud.agregar_pendiente("b")
+    hud.agregar_pendiente("a")
+    hud.limpiar_pendientes()
+    hud.agregar_pendiente("c")
+    hud.bloquear("x")
+    hud.desbloquear("x")
+    nuevo = EstadoHUD(path, sync=0)
+    assert hud.pendientes() == nuevo.pendientes() == ["c"]
+    assert hud.bloqueados() == nuevo.bloqueados() == []
+    assert hud.version == nuevo.version
+
+def test_escritura_tras_cambio_de_otro_proceso_recarga(path):
+    a = EstadoHUD(path, sync=0)
+    b = EstadoHUD(path, sync=60)
+    a.agregar_pendiente("de-a")
+    b.refrescar()
+    a.agregar_pendiente("otro-de-a")
+    # b no ha refrescado (sync largo): su escritura ve la versión nueva
+    b.agregar_pendiente("de-b")
+    assert b.pendientes() == ["de-a", "de-b", "otro-de-a"]
+    assert a.pendientes() == ["de-a", "de-b", "otro-de-a"]
+
+def test_escritura_sin_cambios_no_sube_version(path):
+    hud = EstadoHUD(path, sync=0)
+    hud.agregar_pendiente("a")
+    version = hud.version
+    hud.agregar_pendiente("a")
+    hud.quitar_pendiente("no-esta")
+    assert hud.version == version
@@ -0,0 +1,19 @@
+import http_client
+
+class Respuesta:
+    def __init__(self, retry_after=None):
+        self.headers = {} if retry_after is None else {"Retry-After": retry_after}
+
+def test_retry_after_acotado():
+    retry = http_client._retry(2)
+    assert retry.get_retry_after(Respuesta("120")) == http_client.RETRY_BACKOFF_MAX
+    assert retry.get_retry_after(Respuesta("1")) == 1
+    assert retry.get_retry_after(Respuesta()) is None
+    # los reintentos siguientes conservan la clase
+    assert isinstance(retry.increment("GET", "/x"), http_client.RetryAcotado)
+
+def test_post_no_se_reintenta_por_estado():
+    retry = http_client._retry(2)
+    assert not retry.is_retry("POST", 429)
+    assert not retry.is_retry("POST", 503)
+    assert retry.is_retry("GET", 503)
@@ -0,0 +1,39 @@
+import pytest
+
+import main
+
+# --------------------------------------------------------
+# DETECCIÓN DE INTENCIÓN (chat libre)
+# --------------------------------------------------------
+
+USUARIO = "test-intencion"
+
+@pytest.fixture
+def con_contexto():
+    main.set_contexto(USUARIO, "script", {"msg": "default { }", "reply": "ok"})
+    yield
+    main.set_contexto(USUARIO, None, None)
+
+@pytest.mark.parametrize("msg", [
+    "continua", "sigue por favor", "Seguí con eso", "optimiza el script", "revisa esto",
+    "eso", "Sí, dale", "si", "dale!", "¿eso funciona mejor?",
+])
+def test_continuacion(con_contexto, msg):
+    assert main.detectar_intencion(msg, USUARIO) == "continuacion"
+
+# antes se clasificaban como continuación por coincidir por subcadena
+@pytest.mark.parametrize("msg", [
+    "necesito ayuda con mi casa",
+    "I need help with my house visit",
+    "quiero visitar la isla",
+    "el peso de la mochila",
+    "consigue un mapa",
+    "candale",
+    "analizador de texto",
+])
+def test_no_continuacion(con_contexto, msg):
+    assert main.detectar_intencion(msg, USUARIO) != "continuacion"
+
+def test_continuacion_sin_contexto():
+    main.set_contexto(USUARIO, None, None)
+    assert main.detectar_intencion("continua", USUARIO) == "normal"
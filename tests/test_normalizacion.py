@@ -0,0 +1,79 @@
+import random
+import re
+import sys
+
+import pytest
+
+from normalizacion import clean_text, clean_texts, limpiar_texto, limpiar_textos
+
+# --------------------------------------------------------
+# EQUIVALENCIA DE normalizacion.py
+# --------------------------------------------------------
+# La salida debe ser idéntica a la de las implementaciones anteriores al
+# módulo compartido (copiadas aquí como referencia): todo el rango
+# Unicode carácter a carácter y textos aleatorios.
+
+def legacy_clean_text(text: str) -> str:
+    if not isinstance(text, str):
+        return ""
+    REEMPLAZOS = {
+        "á": "a", "Á": "A", "é": "e", "É": "E", "í": "i", "Í": "I",
+        "ó": "o", "Ó": "O", "ú": "u", "Ú": "U", "ñ": "nh", "Ñ": "NH",
+        "à": "a", "À": "A", "â": "a", "Â": "A", "ä": "a", "Ä": "A",
+        "è": "e", "È": "E", "ê": "e", "Ê": "E", "ë": "e", "Ë": "E",
+        "î": "i", "Î": "I", "ï": "i", "Ï": "I", "ô": "o", "Ô": "O",
+        "ö": "o", "Ö": "O", "ù": "u", "Ù": "U", "û": "u", "Û": "U",
+        "ü": "u", "Ü": "U", "ÿ": "y", "Ÿ": "Y", "ç": "c", "Ç": "C",
+        "ß": "ss", "¿": "", "¡": "", "°": "",
+        "\u2018": "", "\u2019": "", "\u201C": "", "\u201D": ""
+    }
+    for k, v in REEMPLAZOS.items():
+        text = text.replace(k, v)
+    return text.replace("\r\n", "\n").strip()
+
+def legacy_limpiar_texto(texto):
+    limpio = ""
+    for c in texto:
+        if c.isalnum() or c in " :,.!?@-áéíóúÁÉÍÓÚñÑ[](){}<>":
+            limpio += c
+        else:
+            limpio += " "
+
+    limpio = re.sub(r'(.)\1{3,}', r'\1', limpio)
+    return limpio.strip()
+
+MUESTRAS = [
+    "¿Qué tal, señor Muñoz? ¡Mañana vamos al café “El Ñandú”!",
+    "Hi everyone!!!! how are youuuuu doing today :) <3",
+    "Bonjour à tous, ça va? Très bien, merci... l'été est là",
+    "Ciao ragazzi, perché non venite alla festa? è già tardi",
+    "default { state_entry() { llSay(0, \"Hola\"); } }\r\n",
+    "Zenko: el kitsune de Aokigahara sabe LSL_scripts y más___ cosas 😀😀😀😀😀",
+]
+
+def textos_aleatorios(n=20000):
+    rnd = random.Random(0)
+    alfabeto = "".join(MUESTRAS) + "\r\n\t _-–—… ‘’“”"
+    return ["".join(rnd.choice(alfabeto) for _ in range(rnd.randint(0, 80))) for _ in range(n)]
+
+@pytest.mark.parametrize("inicio", range(0, sys.maxunicode + 1, 4096))
+def test_rango_unicode(inicio):
+    # bloques de 256 caracteres consecutivos
+    for bloque in range(inicio, min(inicio + 4096, sys.maxunicode + 1), 256):
+        t = "a" + "".join(map(chr, range(bloque, min(bloque + 256, sys.maxunicode + 1)))) + "b"
+        assert clean_text(t) == legacy_clean_text(t), hex(bloque)
+        assert limpiar_texto(t) == legacy_limpiar_texto(t), hex(bloque)
+
+def test_textos_aleatorios():
+    for t in textos_aleatorios():
+        assert clean_text(t) == legacy_clean_text(t), repr(t)
+        assert limpiar_texto(t) == legacy_limpiar_texto(t), repr(t)
+
+def test_api_por_lotes():
+    textos = textos_aleatorios(2000) + MUESTRAS
+    assert clean_texts(textos) == [legacy_clean_text(t) for t in textos]
+    assert limpiar_textos(textos) == [legacy_limpiar_texto(t) for t in textos]
+
+def test_no_texto():
+    assert clean_text(None) == legacy_clean_text(None) == ""
+    assert clean_texts([None, 3]) == ["", ""]
@@ -0,0 +1,215 @@
+import threading
+import time
+
+import pytest
+
+import router_llm
+from admision import CupoConcurrencia
+from router_llm import ABIERTO, CERRADO, SEMIABIERTO, Proveedor, RouterLLM
+
+# --------------------------------------------------------
+# ROUTER LLM CON PROVEEDORES DE PRUEBA
+# --------------------------------------------------------
+
+def es_error(reply):
+    return reply.startswith("Error")
+
+class Stub:
+    def __init__(self, nombre, respuestas=None, bloqueo=None):
+        self.nombre = nombre
+        self.respuestas = list(respuestas or [])
+        self.bloqueo = bloqueo
+        self.llamadas = 0
+
+    def __call__(self, prompt, user_msg, **opciones):
+        self.llamadas += 1
+        if self.bloqueo is not None:
+            self.bloqueo.wait(5)
+        if self.respuestas:
+            respuesta = self.respuestas.pop(0)
+            if isinstance(respuesta, Exception):
+                raise respuesta
+            return respuesta
+        return f"ok {self.nombre}"
+
+    def stream(self, prompt, user_msg, **opciones):
+        self.llamadas += 1
+        respuesta = self.respuestas.pop(0) if self.respuestas else f"ok {self.nombre}"
+        if es_error(respuesta):
+            yield respuesta
+        elif respuesta:
+            yield from respuesta.split(" ")
+
+def proveedor(stub, **kwargs):
+    return Proveedor(stub.nombre, stub, llamar_stream=stub.stream, **kwargs)
+
+def fallar(p, n):
+    for _ in range(n):
+        p.registrar(False, 0.1)
+
+@pytest.fixture(autouse=True)
+def limites(monkeypatch):
+    monkeypatch.setattr(router_llm, "LLM_CB_FALLOS", 3)
+    monkeypatch.setattr(router_llm, "LLM_CB_ENFRIAMIENTO", 30)
+    monkeypatch.setattr(router_llm, "LLM_HEDGE_MIN", 0.05)
+    monkeypatch.setattr(router_llm, "LLM_HEDGE_MIN_MUESTRAS", 5)
+
+# ── Circuit breaker ─────────────────────────────────
+
+def test_se_abre_tras_fallos_seguidos():
+    p = proveedor(Stub("groq"))
+    fallar(p, 2)
+    assert p.circuito == CERRADO and p.estado()
+    fallar(p, 1)
+    assert p.circuito == ABIERTO
+    assert not p.estado() and not p.reservar()
+    assert p.aperturas == 1
+
+def test_un_acierto_reinicia_los_fallos_seguidos():
+    p = proveedor(Stub("groq"))
+    fallar(p, 2)
+    p.registrar(True, 0.1)
+    fallar(p, 2)
+    assert p.circuito == CERRADO
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    p = proveedor(Stub("groq"))
+    fallar(p, 3)
+    despues = time.time() + 31
+    assert p.estado(despues)
+    assert p.circuito == ABIERTO  # estado() solo consulta
+    assert p.reservar(despues)
+    assert p.circuito == SEMIABIERTO
+    assert not p.estado(despues) and not p.reservar(despues)
+
+def test_prueba_correcta_cierra_y_fallida_reabre():
+    p = proveedor(Stub("groq"))
+    fallar(p, 3)
+    assert p.reservar(time.time() + 31)
+    p.registrar(True, 0.1)
+    assert p.circuito == CERRADO and p.reservar()
+
+    fallar(p, 3)
+    assert p.reservar(time.time() + 31)
+    fallar(p, 1)
+    assert p.circuito == ABIERTO and p.aperturas == 3
+    assert not p.reservar()
+
+def test_prueba_sin_resultado_caduca():
+    p = proveedor(Stub("groq"))
+    fallar(p, 3)
+    inicio = time.time() + 31
+    assert p.reservar(inicio)
+    assert not p.reservar(inicio + 10)
+    assert p.reservar(inicio + 31)
+
+# ── Orden y failover ────────────────────────────────
+
+def test_preferido_primero():
+    groq, deepseek = Stub("groq"), Stub("deepseek")
+    router = RouterLLM([proveedor(groq), proveedor(deepseek)], es_error, hedge=False)
+    assert router.llamar("p", "hola", "deepseek") == "ok deepseek"
+    assert [p.nombre for p in router.orden("groq")] == ["groq", "deepseek"]
+    assert (groq.llamadas, deepseek.llamadas) == (0, 1)
+
+def test_failover_al_fallar_el_preferido():
+    groq = Stub("groq", ["Error al conectar"])
+    deepseek = Stub("deepseek")
+    router = RouterLLM([proveedor(groq), proveedor(deepseek)], es_error, hedge=False)
+    assert router.llamar("p", "hola", "groq") == "ok deepseek"
+    assert router.failovers == 1
+
+def test_si_fallan_todos_devuelve_el_error_del_preferido():
+    groq = Stub("groq", [RuntimeError("caído")])
+    deepseek = Stub("deepseek", ["Error deepseek"])
+    router = RouterLLM([proveedor(groq), proveedor(deepseek)], es_error, hedge=False)
+    assert router.llamar("p", "hola", "groq") == "Error al conectar con groq: caído"
+
+def test_salta_no_configurados_y_abiertos():
+    groq, deepseek = Stub("groq"), Stub("deepseek")
+    sin_key = proveedor(groq, configurado=lambda: False)
+    router = RouterLLM([sin_key, proveedor(deepseek)], es_error, hedge=False)
+    assert [p.nombre for p in router.orden("groq")] == ["deepseek"]
+
+    abierto = proveedor(Stub("groq"))
+    fallar(abierto, 3)
+    router = RouterLLM([abierto, proveedor(deepseek)], es_error, hedge=False)
+    assert [p.nombre for p in router.orden("groq")] == ["deepseek"]
+
+def test_todos_abiertos_intenta_el_preferido():
+    groq, deepseek = Stub("groq"), Stub("deepseek")
+    pg, pd = proveedor(groq), proveedor(deepseek)
+    fallar(pg, 3)
+    fallar(pd, 3)
+    router = RouterLLM([pg, pd], es_error, hedge=False)
+    assert router.llamar("p", "hola", "groq") == "ok groq"
+    assert pg.circuito == CERRADO
+
+def test_stream_cambia_de_proveedor_antes_del_primer_fragmento():
+    groq = Stub("groq", [""])
+    deepseek = Stub("deepseek", ["hola desde deepseek"])
+    router = RouterLLM([proveedor(groq), proveedor(deepseek)], es_error, hedge=False)
+    assert list(router.stream("p", "hola", "groq")) == ["hola", "desde", "deepseek"]
+    assert router.failovers == 1
+
+def test_stream_si_fallan_todos_devuelve_el_primer_error():
+    groq = Stub("groq", ["Error groq"])
+    deepseek = Stub("deepseek", ["Error deepseek"])
+    router = RouterLLM([proveedor(groq), proveedor(deepseek)], es_error, hedge=False)
+    assert list(router.stream("p", "hola", "groq")) == ["Error groq"]
+
+# ── Hedging ─────────────────────────────────────────
+
+def router_hedge(lento, rapido, cupo=None):
+    primero = proveedor(lento)
+    for _ in range(5):
+        primero.registrar(True, 0.01)
+    return RouterLLM([primero, proveedor(rapido)], es_error, hedge=True, cupo=cupo)
+
+def esperar(condicion):
+    limite = time.time() + 5
+    while not condicion() and time.time() < limite:
+        time.sleep(0.01)
+    return condicion()
+
+def test_hedge_gana_el_segundo_y_libera_el_cupo():
+    soltar = threading.Event()
+    cupo = CupoConcurrencia(2, 0)
+    router = router_hedge(Stub("groq", bloqueo=soltar), Stub("deepseek"), cupo)
+    assert router.llamar("p", "hola", "groq") == "ok deepseek"
+    assert (router.hedges, router.hedges_ganados) == (1, 1)
+    assert cupo.en_vuelo == 0  # la plaza del duplicado ya se devolvió
+    soltar.set()
+    # el perdedor termina en segundo plano y solo alimenta las métricas
+    assert esperar(lambda: len(router.proveedores["groq"].latencias) == 6)
+    assert cupo.en_vuelo == 0
+
+def test_hedge_gana_el_primero_si_llega_antes():
+    soltar_segundo = threading.Event()
+    cupo = CupoConcurrencia(2, 0)
+    lento = Stub("groq")
+    router = router_hedge(lento, Stub("deepseek", bloqueo=soltar_segundo), cupo)
+    lento.bloqueo = threading.Event()
+    threading.Timer(0.2, lento.bloqueo.set).start()
+    assert router.llamar("p", "hola", "groq") == "ok groq"
+    assert (router.hedges, router.hedges_ganados) == (1, 0)
+    assert cupo.en_vuelo == 1  # el duplicado sigue en curso con su plaza
+    soltar_segundo.set()
+    assert esperar(lambda: cupo.en_vuelo == 0)
+
+def test_hedge_sin_plaza_en_el_cupo_no_duplica():
+    soltar = threading.Event()
+    cupo = CupoConcurrencia(1, 0)
+    assert cupo.entrar()  # la plaza de quien llama
+    rapido = Stub("deepseek")
+    router = router_hedge(Stub("groq", bloqueo=soltar), rapido, cupo)
+    threading.Timer(0.2, soltar.set).start()
+    assert router.llamar("p", "hola", "groq") == "ok groq"
+    assert router.hedges == 0 and rapido.llamadas == 0
+    cupo.salir()
+    assert cupo.en_vuelo == 0
+
+def test_hedge_primero_falla_rapido_hace_failover():
+    router = router_hedge(Stub("groq", ["Error groq"]), Stub("deepseek"))
+    assert router.llamar("p", "hola", "groq") == "ok deepseek"
+    assert router.hedges == 0 and router.failovers == 1
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import translate_api
+
+class Respuesta:
+    status_code = 200
+
+    def __init__(self, contenido):
+        self.contenido = contenido
+
+    def json(self):
+        return {"choices": [{"message": {"content": json.dumps(self.contenido)}}]}
+
+@pytest.fixture
+def llm(monkeypatch):
+    llamadas = []
+    respuestas = []
+
+    def post(url, json=None, **kwargs):
+        llamadas.append(json)
+        return Respuesta(respuestas.pop(0) if respuestas else {})
+
+    monkeypatch.setattr(translate_api, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(translate_api.http_client, "post", post)
+    translate_api.cache_traducciones.clear()
+    yield llamadas, respuestas
+    translate_api.cache_traducciones.clear()
+
+def test_combinado_usa_cache_con_remitentes_nuevos(llm):
+    llamadas, respuestas = llm
+    respuestas.append({"idioma": "en", "traducir": True, "traduccion": "hola"})
+    resultados = [translate_api.procesar_mensaje(f"nuevo-{i}", "dest", "hi there", "es") for i in range(5)]
+    assert resultados == ["hola"] * 5
+    assert len(llamadas) == 1
+
+@pytest.fixture
+def bandejas_vacias():
+    translate_api.bandejas.clear()
+    yield translate_api.bandejas
+    translate_api.bandejas.clear()
+
+def test_bandejas_acotadas_por_avatares(bandejas_vacias, monkeypatch):
+    monkeypatch.setattr(translate_api, "BANDEJA_MAX_AVATARES", 3)
+    for avatar in ("a", "b", "c", "a", "d"):
+        translate_api.entregar("r", avatar, "hola")
+    # "b" es la bandeja con el mensaje más antiguo
+    assert list(bandejas_vacias) == ["c", "a", "d"]
+    assert len(bandejas_vacias["a"]) == 2
+
+def test_bandejas_caducan(bandejas_vacias, monkeypatch):
+    translate_api.entregar("r", "offline", "hola")
+    bandejas_vacias["offline"][-1]["ts"] -= translate_api.BANDEJA_TTL + 1
+    translate_api.entregar("r", "online", "hola")
+    assert list(bandejas_vacias) == ["online"]
+    assert translate_api.recoger_pendientes("online") == ["hola"]
@@ -1,8 +1,20 @@
-from flask import Blueprint, request, jsonify, Response
-import requests
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import http_client
+import json
 import os
-import re
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
+from langdetect import DetectorFactory, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+from cache import TTLCache
+from normalizacion import limpiar_texto
+import admision
+import metricas
+import servidor
 
 traductor_bp = Blueprint('traductor', __name__, url_prefix='/translator')
 
@@ -10,7 +22,55 @@ traductor_bp = Blueprint('traductor', __name__, url_prefix='/translator')
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 LLAMA_MODEL = "llama-3.1-8b-instant"
 
-conversaciones = {}
+# Bandeja de entrada por destinatario: solo mensajes sin leer, así un poll
+# cuesta O(mensajes pendientes del avatar). Lo entregado pasa al archivo
+# `conversaciones`, acotado por chat y por número de chats. Las bandejas
+# van en orden de último mensaje: las de avatares que nunca vuelven a
+# consultar caducan a los BANDEJA_TTL segundos y, como mucho, se guardan
+# BANDEJA_MAX_AVATARES (se descarta la más antigua).
+BANDEJA_MAX = int(os.getenv("BANDEJA_MAX", "200"))
+BANDEJA_TTL = float(os.getenv("BANDEJA_TTL", str(24 * 3600)))
+BANDEJA_MAX_AVATARES = int(os.getenv("BANDEJA_MAX_AVATARES", "5000"))
+ARCHIVO_MAX_MENSAJES = int(os.getenv("ARCHIVO_MAX_MENSAJES", "50"))
+ARCHIVO_MAX_CHATS = int(os.getenv("ARCHIVO_MAX_CHATS", "2000"))
+
+bandejas = OrderedDict()
+conversaciones = OrderedDict()
+mensajes_lock = threading.Lock()
+
+# Long-poll / SSE: cada petición en espera registra un Event por avatar y
+# `entregar` lo despierta en cuanto llega un mensaje para ese avatar.
+# Cada espera ocupa un hilo (gthread) o una conexión (gevent), así que
+# como mucho ESPERAS_MAX por worker (servidor.esperas_max: 8 con gthread
+# por defecto, 250 con gevent; ahí está el cálculo); sin hueco, el poll
+# responde al instante con lo que haya y el stream se cierra con un
+# "retry:" para que el HUD vuelva más tarde.
+LONGPOLL_MAX = float(os.getenv("LONGPOLL_MAX", "25"))
+STREAM_MAX = float(os.getenv("STREAM_MAX", "300"))
+STREAM_PING = float(os.getenv("STREAM_PING", "15"))
+STREAM_REINTENTO = int(os.getenv("STREAM_REINTENTO", "5"))
+ESPERAS_MAX = int(os.getenv("ESPERAS_MAX", str(servidor.esperas_max())))
+
+oyentes = {}
+cupo_esperas = admision.CupoConcurrencia(ESPERAS_MAX, 0)
+
+# Detección local: por debajo de este umbral (o con textos muy cortos)
+# el resultado se considera ambiguo y se consulta memoria / LLM.
+DETECCION_UMBRAL = float(os.getenv("DETECCION_UMBRAL", "0.90"))
+DETECCION_MIN_LETRAS = int(os.getenv("DETECCION_MIN_LETRAS", "10"))
+MEMORIA_IDIOMA_TTL = int(os.getenv("MEMORIA_IDIOMA_TTL", "1800"))
+MEMORIA_IDIOMA_MAX = int(os.getenv("MEMORIA_IDIOMA_MAX", "5000"))
+
+DetectorFactory.seed = 0
+
+idioma_remitente = OrderedDict()
+idioma_remitente_lock = threading.Lock()
+
+cache_traducciones = TTLCache(
+    max_items=int(os.getenv("TRADUCCION_CACHE_MAX", "5000")),
+    ttl=int(os.getenv("TRADUCCION_CACHE_TTL", "3600")),
+    max_bytes=int(os.getenv("TRADUCCION_CACHE_BYTES", str(8 * 1024 * 1024)))
+)
 
 IDIOMAS = {
     "es": "español", "en": "inglés", "fr": "francés", "it": "italiano",
@@ -18,20 +78,6 @@ IDIOMAS = {
     "ru": "ruso", "nl": "holandés", "pl": "polaco", "ar": "árabe"
 }
 
-# ------------------------
-# LIMPIEZA DE TEXTO
-# ------------------------
-def limpiar_texto(texto):
-    limpio = ""
-    for c in texto:
-        if c.isalnum() or c in " :,.!?@-áéíóúÁÉÍÓÚñÑ[](){}<>":
-            limpio += c
-        else:
-            limpio += " "
-    
-    limpio = re.sub(r'(.)\1{3,}', r'\1', limpio)
-    return limpio.strip()
-
 # ------------------------
 # SEPARAR NOMBRE
 # ------------------------
@@ -77,17 +123,7 @@ def tiene_sentido(texto):
 # ------------------------
 # TRADUCCIÓN IA (MEJORADA)
 # ------------------------
-def traducir(texto, idioma_destino, idioma_origen=None):
-    if not GROQ_API_KEY:
-        return ""
-    
-    if not tiene_sentido(texto):
-        return ""
-    
-    dest_name = IDIOMAS.get(idioma_destino, idioma_destino)
-    origen_name = IDIOMAS.get(idioma_origen, "desconocido") if idioma_origen else "desconocido"
-
-    prompt_sistema = """Eres un traductor profesional avanzado especializado en lenguaje informal y de chat.
+PROMPT_TRADUCTOR = """Eres un traductor profesional avanzado especializado en lenguaje informal y de chat.
 
 Tu tarea es traducir el mensaje con precisión, pero entendiendo el significado real, no solo las palabras.
 
@@ -109,6 +145,21 @@ REGLAS IMPORTANTES:
 
 Devuelve SOLO la traducción final limpia y natural."""
 
+def traducir(texto, idioma_destino, idioma_origen=None):
+    if not GROQ_API_KEY:
+        return ""
+    
+    if not tiene_sentido(texto):
+        return ""
+    
+    clave = (limpiar_texto(texto), idioma_origen, idioma_destino)
+    cacheada = cache_traducciones.get(clave)
+    if cacheada is not None:
+        return cacheada
+
+    dest_name = IDIOMAS.get(idioma_destino, idioma_destino)
+    origen_name = IDIOMAS.get(idioma_origen, "desconocido") if idioma_origen else "desconocido"
+
     prompt_usuario = f"""Texto original:
 {texto}
 
@@ -118,7 +169,7 @@ Traducir a: {dest_name}
 Traducción:"""
 
     try:
-        response = requests.post(
+        response = http_client.post(
             "https://api.groq.com/openai/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {GROQ_API_KEY}",
@@ -127,7 +178,7 @@ Traducción:"""
             json={
                 "model": LLAMA_MODEL,
                 "messages": [
-                    {"role": "system", "content": prompt_sistema},
+                    {"role": "system", "content": PROMPT_TRADUCTOR},
                     {"role": "user", "content": prompt_usuario}
                 ],
                 "temperature": 0.3,
@@ -141,8 +192,9 @@ Traducción:"""
             traduccion = result['choices'][0]['message']['content'].strip()
 
             if traduccion.lower() == texto.lower():
-                return ""
+                traduccion = ""
 
+            cache_traducciones.set(clave, traduccion)
             return traduccion
 
     except Exception as e:
@@ -153,9 +205,41 @@ Traducción:"""
 # ------------------------
 # DETECTAR IDIOMA
 # ------------------------
-def detectar_idioma(texto):
+# Devuelve (idioma, confianza) usando langdetect, sin red.
+def detectar_idioma_local(texto):
     try:
-        response = requests.post(
+        candidatos = detect_langs(texto)
+    except LangDetectException:
+        return None, 0.0
+    for c in candidatos:
+        lang = c.lang.split("-")[0]
+        if lang in IDIOMAS:
+            return lang, c.prob
+    return None, 0.0
+
+def recordar_idioma(remitente, lang):
+    if not remitente or not lang:
+        return
+    with idioma_remitente_lock:
+        idioma_remitente[remitente] = (lang, time.time())
+        idioma_remitente.move_to_end(remitente)
+        while len(idioma_remitente) > MEMORIA_IDIOMA_MAX:
+            idioma_remitente.popitem(last=False)
+
+def idioma_reciente(remitente):
+    if not remitente:
+        return None
+    with idioma_remitente_lock:
+        item = idioma_remitente.get(remitente)
+    if item and time.time() - item[1] <= MEMORIA_IDIOMA_TTL:
+        return item[0]
+    return None
+
+def detectar_idioma_llm(texto):
+    if not GROQ_API_KEY:
+        return None
+    try:
+        response = http_client.post(
             "https://api.groq.com/openai/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {GROQ_API_KEY}",
@@ -178,42 +262,223 @@ def detectar_idioma(texto):
             if lang in IDIOMAS:
                 return lang
 
-    except:
-        pass
+    except Exception as e:
+        print("Error detectando idioma:", e)
 
-    return "es"
+    return None
+
+# Resuelve el idioma sin red: langdetect si es concluyente, si no el idioma
+# reciente del remitente. Devuelve (idioma, seguro).
+def detectar_idioma_sin_red(texto, remitente=None):
+    lang, confianza = detectar_idioma_local(texto)
+    letras = sum(c.isalpha() for c in texto)
+
+    if lang and confianza >= DETECCION_UMBRAL and letras >= DETECCION_MIN_LETRAS:
+        recordar_idioma(remitente, lang)
+        return lang, True
+
+    reciente = idioma_reciente(remitente)
+    if reciente:
+        return reciente, True
+
+    return lang, False
+
+# Primero langdetect; si el resultado es ambiguo se usa el idioma reciente
+# del remitente y, en último caso, el LLM. None si no se puede saber.
+def detectar_idioma(texto, remitente=None):
+    lang, seguro = detectar_idioma_sin_red(texto, remitente)
+    if seguro:
+        return lang
+
+    lang_llm = detectar_idioma_llm(texto)
+    if lang_llm:
+        recordar_idioma(remitente, lang_llm)
+        return lang_llm
+
+    return lang
 
 # ------------------------
-# ENDPOINT SEND
+# DETECTAR + TRADUCIR (UNA LLAMADA)
 # ------------------------
-@traductor_bp.route("/send", methods=["POST"])
-def send_message():
-    data = request.json
+# Modo combinado: una sola petición con salida JSON que trae el idioma
+# origen, si hace falta traducir y la traducción. Se usa cuando la
+# detección local no es concluyente; si la respuesta no se puede parsear
+# se vuelve al camino de dos pasos.
+TRADUCCION_COMBINADA = os.getenv("TRADUCCION_COMBINADA", "1") == "1"
+
+PROMPT_COMBINADO = PROMPT_TRADUCTOR.replace(
+    "Devuelve SOLO la traducción final limpia y natural.",
+    """Responde SOLO con un objeto JSON con estas claves:
+{"idioma": "<código ISO 639-1 del texto original>", "traducir": <true si el idioma original es distinto del destino, si no false>, "traduccion": "<traducción final limpia y natural, o vacío>"}"""
+)
+
+def parsear_combinado(contenido, idioma_destino):
+    try:
+        d = json.loads(contenido)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(d, dict):
+        return None
+    idioma = str(d.get("idioma", "")).strip().lower()
+    traduccion = d.get("traduccion", "")
+    if idioma not in IDIOMAS or not isinstance(traduccion, str):
+        return None
+    if idioma == idioma_destino or d.get("traducir") is False:
+        return idioma, ""
+    return idioma, traduccion.strip()
+
+def detectar_y_traducir(texto, idioma_destino):
+    if not GROQ_API_KEY or not tiene_sentido(texto):
+        return None
 
-    remitente = data.get("remitente")
-    destinatario = data.get("destinatario")
-    mensaje_original = data.get("mensaje")
+    dest_name = IDIOMAS.get(idioma_destino, idioma_destino)
 
-    if not all([remitente, destinatario, mensaje_original]):
-        return "", 200
+    try:
+        response = http_client.post(
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": LLAMA_MODEL,
+                "messages": [
+                    {"role": "system", "content": PROMPT_COMBINADO},
+                    {"role": "user", "content": f"Texto original:\n{texto}\n\nTraducir a: {dest_name} ({idioma_destino})"}
+                ],
+                "temperature": 0.3,
+                "max_tokens": 350,
+                "response_format": {"type": "json_object"}
+            },
+            timeout=10
+        )
+
+        if response.status_code == 200:
+            contenido = response.json()['choices'][0]['message']['content']
+            resultado = parsear_combinado(contenido, idioma_destino)
+            if resultado is None:
+                return None
+            idioma, traduccion = resultado
+            if traduccion.lower() == texto.lower():
+                traduccion = ""
+            limpio = limpiar_texto(texto)
+            if traduccion:
+                cache_traducciones.set((limpio, idioma, idioma_destino), traduccion)
+            # también con origen desconocido, que es como se busca la
+            # próxima vez que la detección local no sea concluyente
+            cache_traducciones.set((limpio, None, idioma_destino), traduccion)
+            return idioma, traduccion
+
+    except Exception as e:
+        print("Error:", e)
+
+    return None
+
+# ------------------------
+# TRADUCCIÓN POR LOTES
+# ------------------------
+# Varios mensajes con el mismo idioma destino van en una sola petición:
+# el prompt de sistema (la mayor parte de los tokens) se paga una vez por
+# lote. Entrada y salida numeradas; la salida es un objeto JSON.
+LOTE_MAX = int(os.getenv("TRADUCCION_LOTE_MAX", "20"))
+LOTE_MAX_MENSAJES = int(os.getenv("TRADUCCION_LOTE_MAX_MENSAJES", "100"))
+
+PROMPT_LOTE = PROMPT_TRADUCTOR.replace(
+    "Devuelve SOLO la traducción final limpia y natural.",
+    """Recibirás varios mensajes numerados, cada uno con su idioma origen entre corchetes ([?] si es desconocido).
+Traduce cada mensaje por separado. Si un mensaje ya está en el idioma destino, devuélvelo igual.
+Responde SOLO con un objeto JSON cuyas claves son los números y los valores las traducciones finales limpias y naturales, por ejemplo:
+{"1": "...", "2": "..."}"""
+)
+
+# Devuelve una lista alineada con `items` ((texto, idioma_origen)); None en
+# las posiciones que el modelo no devolvió.
+def traducir_lote(items, idioma_destino):
+    if not GROQ_API_KEY or not items:
+        return [None] * len(items)
+
+    dest_name = IDIOMAS.get(idioma_destino, idioma_destino)
+    lineas = [f"{i}. [{origen or '?'}] {texto}" for i, (texto, origen) in enumerate(items, 1)]
+    prompt_usuario = f"Traducir a: {dest_name} ({idioma_destino})\n\n" + "\n".join(lineas)
+
+    try:
+        response = http_client.post(
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {GROQ_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": LLAMA_MODEL,
+                "messages": [
+                    {"role": "system", "content": PROMPT_LOTE},
+                    {"role": "user", "content": prompt_usuario}
+                ],
+                "temperature": 0.3,
+                "max_tokens": min(300 * len(items), 4000),
+                "response_format": {"type": "json_object"}
+            },
+            timeout=20
+        )
+
+        if response.status_code == 200:
+            d = json.loads(response.json()['choices'][0]['message']['content'])
+            if isinstance(d, dict):
+                salida = []
+                for i, (texto, origen) in enumerate(items, 1):
+                    traduccion = d.get(str(i))
+                    if not isinstance(traduccion, str):
+                        salida.append(None)
+                        continue
+                    traduccion = traduccion.strip()
+                    if traduccion.lower() == texto.lower():
+                        traduccion = ""
+                    elif origen:
+                        cache_traducciones.set((limpiar_texto(texto), origen, idioma_destino), traduccion)
+                    salida.append(traduccion)
+                return salida
+
+    except Exception as e:
+        print("Error:", e)
 
+    return [None] * len(items)
+
+# ------------------------
+# PROCESAR MENSAJE
+# ------------------------
+# Detecta, traduce y entrega en la bandeja del destinatario.
+# Devuelve el texto entregado o "" si no hacía falta traducir.
+def procesar_mensaje(remitente, destinatario, mensaje_original, idioma_destino):
     nombre, mensaje = separar_nombre(mensaje_original)
 
     mensaje_limpio = limpiar_texto(mensaje)
 
     if not mensaje_limpio:
-        return "", 200
+        return ""
 
-    idioma_origen = detectar_idioma(mensaje_limpio)
-    idioma_destino = data.get("idioma_receptor", "en")
+    traduccion = None
+    idioma_origen, seguro = detectar_idioma_sin_red(mensaje_limpio, remitente)
 
-    if idioma_origen == idioma_destino:
-        return "", 200
+    if not seguro and TRADUCCION_COMBINADA:
+        # saludos cortos de remitentes nuevos: justo lo que más se repite
+        traduccion = cache_traducciones.get((mensaje_limpio, None, idioma_destino))
+        if traduccion is None:
+            combinado = detectar_y_traducir(mensaje_limpio, idioma_destino)
+            if combinado is not None:
+                idioma_origen, traduccion = combinado
+                recordar_idioma(remitente, idioma_origen)
+
+    if traduccion is None:
+        if not seguro:
+            idioma_origen = detectar_idioma(mensaje_limpio, remitente)
 
-    traduccion = traducir(mensaje_limpio, idioma_destino, idioma_origen)
+        if idioma_origen and idioma_origen == idioma_destino:
+            return ""
+
+        traduccion = traducir(mensaje_limpio, idioma_destino, idioma_origen)
 
     if not traduccion:
-        return "", 200
+        return ""
 
     if nombre:
         resultado = f"{nombre}: {traduccion}"
@@ -221,35 +486,380 @@ def send_message():
         resultado = traduccion
 
     # Guardado
-    chat_id = "_".join(sorted([remitente, destinatario]))
+    entregar(remitente, destinatario, resultado)
 
-    if chat_id not in conversaciones:
-        conversaciones[chat_id] = []
+    return resultado
 
-    conversaciones[chat_id].append({
-        "remitente": remitente,
-        "destinatario": destinatario,
-        "traducido": resultado,
-        "leido": False
-    })
+# ------------------------
+# COLA ASÍNCRONA
+# ------------------------
+# Modo "aceptar y encolar": /send devuelve un id al instante y un pool
+# acotado de workers hace detección + traducción. Si la cola está llena
+# se rechaza con 503 para no acumular trabajo en ráfagas.
+COLA_MAX = int(os.getenv("TRADUCCION_COLA_MAX", "200"))
+COLA_WORKERS = int(os.getenv("TRADUCCION_WORKERS", "4"))
+COLA_POR_DEFECTO = os.getenv("TRADUCCION_ASYNC", "0") == "1"
+
+# Flag booleano de JSON o query string: true/1/yes/on (y sus negativos).
+# None si no viene o no se reconoce.
+def leer_flag(valor):
+    if valor is None or isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in ("1", "true", "yes", "si", "on"):
+        return True
+    if texto in ("0", "false", "no", "off", ""):
+        return False
+    return None
+
+cola_traducciones = queue.Queue(maxsize=COLA_MAX)
+estados = TTLCache(max_items=20000, ttl=int(os.getenv("TRADUCCION_ESTADO_TTL", "600")))
+
+metricas.recolector_cache("traducciones", cache_traducciones)
+
+@metricas.recolector
+def metricas_colas():
+    return [("zenko_cola", {"cola": "traducciones"}, cola_traducciones.qsize()),
+            ("zenko_cola", {"cola": "bandejas"}, sum(len(b) for b in list(bandejas.values()))),
+            ("zenko_cola", {"cola": "esperas"}, cupo_esperas.en_vuelo)]
+workers = []
+workers_lock = threading.Lock()
+
+def worker_traducciones():
+    while True:
+        msg_id, remitente, destinatario, mensaje, idioma_destino = cola_traducciones.get()
+        # cuenta contra el mismo tope global de llamadas LLM que /send
+        admision.cupo_llm.entrar(espera=None)
+        estados.set(msg_id, {"status": "processing"})
+        try:
+            resultado = procesar_mensaje(remitente, destinatario, mensaje, idioma_destino)
+            if resultado:
+                estados.set(msg_id, {"status": "done", "traducido": resultado})
+            else:
+                estados.set(msg_id, {"status": "skipped"})
+        except Exception as e:
+            print("Error en worker de traducción:", e)
+            estados.set(msg_id, {"status": "error"})
+        finally:
+            admision.cupo_llm.salir()
+            cola_traducciones.task_done()
+
+def iniciar_workers():
+    # Arranque perezoso: así cada worker de gunicorn crea sus hilos tras el fork.
+    with workers_lock:
+        workers[:] = [w for w in workers if w.is_alive()]
+        while len(workers) < COLA_WORKERS:
+            w = threading.Thread(target=worker_traducciones, daemon=True,
+                                 name=f"traductor-{len(workers)}")
+            w.start()
+            workers.append(w)
+
+def encolar(remitente, destinatario, mensaje, idioma_destino):
+    if len(workers) < COLA_WORKERS:
+        iniciar_workers()
+    msg_id = uuid.uuid4().hex
+    estados.set(msg_id, {"status": "queued"})
+    try:
+        cola_traducciones.put_nowait((msg_id, remitente, destinatario, mensaje, idioma_destino))
+    except queue.Full:
+        estados.pop(msg_id)
+        return None
+    return msg_id
+
+# Rechazo rápido (límite por usuario/ruta o sin hueco para el LLM), en el
+# idioma del receptor.
+OCUPADO = {
+    "es": "[Traductor ocupado, reintenta en {}s]",
+    "en": "[Translator busy, retry in {}s]",
+    "fr": "[Traducteur occupe, reessaie dans {}s]",
+    "it": "[Traduttore occupato, riprova tra {}s]",
+}
+
+def respuesta_ocupado(idioma, espera):
+    segundos = admision.retry_after(espera)
+    texto = OCUPADO.get(idioma, OCUPADO["en"]).format(segundos)
+    return Response(texto, status=429, mimetype="text/plain", headers={"Retry-After": segundos})
+
+def lote_ocupado(idioma, espera):
+    segundos = admision.retry_after(espera)
+    texto = OCUPADO.get(idioma, OCUPADO["en"]).format(segundos)
+    return jsonify({"error": texto, "resultados": []}), 429, {"Retry-After": segundos}
+
+# ------------------------
+# ENDPOINT SEND
+# ------------------------
+# {"async": true} (o ?async=1, o TRADUCCION_ASYNC=1) activa el modo cola.
+@traductor_bp.route("/send", methods=["POST"])
+def send_message():
+    data = request.json
+
+    remitente = data.get("remitente")
+    destinatario = data.get("destinatario")
+    mensaje_original = data.get("mensaje")
+
+    if not all([remitente, destinatario, mensaje_original]):
+        return "", 200
+
+    idioma_destino = data.get("idioma_receptor", "en")
+
+    admitida, espera = admision.control.admitir("/translator/send", remitente)
+    if not admitida:
+        return respuesta_ocupado(idioma_destino, espera)
+
+    modo_async = leer_flag(data.get("async", request.args.get("async")))
+    if modo_async is None:
+        modo_async = COLA_POR_DEFECTO
+    if modo_async:
+        msg_id = encolar(remitente, destinatario, mensaje_original, idioma_destino)
+        if msg_id is None:
+            return jsonify({"status": "busy"}), 503, {"Retry-After": "2"}
+        return jsonify({"id": msg_id, "status": "queued"}), 202
+
+    if not admision.cupo_llm.entrar():
+        return respuesta_ocupado(idioma_destino, admision.cupo_llm.espera)
+    try:
+        resultado = procesar_mensaje(remitente, destinatario, mensaje_original, idioma_destino)
+    finally:
+        admision.cupo_llm.salir()
+
+    if not resultado:
+        return "", 200
 
     return Response(resultado, mimetype='text/plain')
 
+# ------------------------
+# ENDPOINT SEND BATCH
+# ------------------------
+# {"mensajes": [{"remitente", "destinatario", "mensaje", "idioma_receptor"}, ...]}
+# Devuelve {"resultados": [...]} alineado con la entrada ("" = sin traducción)
+# y {"fallidos": [...]}, las posiciones que no se pudieron traducir y el
+# cliente puede reenviar más tarde.
+#
+# Pasa por los mismos limitadores que /send: por usuario (el remitente del
+# lote o del primer mensaje) y por ruta, y una sola plaza de cupo_llm
+# mientras duran las llamadas agrupadas, que se hacen en serie.
+#
+# Si el modelo se salta algunos números, se reintentan una sola vez como un
+# lote más pequeño. Si una llamada agrupada falla entera, no se traduce
+# mensaje a mensaje (sería multiplicar la carga justo cuando el proveedor
+# falla) ni se intentan los tramos restantes: quedan como fallidos.
+def traducir_grupos(grupos, listos, fallidos):
+    caido = False
+    for idioma_destino, pendientes in grupos.items():
+        for i in range(0, len(pendientes), LOTE_MAX):
+            tramo = [p for p, _ in pendientes[i:i + LOTE_MAX]]
+            if caido:
+                fallidos.extend(p[0] for p in tramo)
+                continue
+            traducciones = traducir_lote([(p[4], p[5]) for p in tramo], idioma_destino)
+            faltan = [j for j, t in enumerate(traducciones) if t is None]
+            if len(faltan) == len(tramo):
+                caido = True
+            elif faltan:
+                reintento = traducir_lote([(tramo[j][4], tramo[j][5]) for j in faltan], idioma_destino)
+                for j, traduccion in zip(faltan, reintento):
+                    traducciones[j] = traduccion
+            for p, traduccion in zip(tramo, traducciones):
+                if traduccion is None:
+                    fallidos.append(p[0])
+                else:
+                    listos.append((p, traduccion))
+
+@traductor_bp.route("/send_batch", methods=["POST"])
+def send_batch():
+    data = request.json or {}
+    entrada = data.get("mensajes") or []
+    if not isinstance(entrada, list):
+        return jsonify({"error": "mensajes debe ser una lista"}), 400
+    if len(entrada) > LOTE_MAX_MENSAJES:
+        return jsonify({"error": f"máximo {LOTE_MAX_MENSAJES} mensajes"}), 413
+
+    primero = next((m for m in entrada if isinstance(m, dict)), {})
+    usuario = data.get("remitente") or primero.get("remitente") or request.remote_addr
+    idioma_respuesta = data.get("idioma_receptor", primero.get("idioma_receptor", "en"))
+    admitida, espera = admision.control.admitir("/translator/send_batch", usuario)
+    if not admitida:
+        return lote_ocupado(idioma_respuesta, espera)
+
+    resultados = [""] * len(entrada)
+    grupos = {}
+
+    for pos, m in enumerate(entrada):
+        if not isinstance(m, dict):
+            continue
+        remitente = m.get("remitente")
+        destinatario = m.get("destinatario")
+        mensaje_original = m.get("mensaje")
+        if not all([remitente, destinatario, mensaje_original]):
+            continue
+
+        nombre, mensaje = separar_nombre(mensaje_original)
+        mensaje_limpio = limpiar_texto(mensaje)
+        if not mensaje_limpio or not tiene_sentido(mensaje_limpio):
+            continue
+
+        idioma_destino = m.get("idioma_receptor", data.get("idioma_receptor", "en"))
+        idioma_origen, seguro = detectar_idioma_sin_red(mensaje_limpio, remitente)
+        if not seguro:
+            idioma_origen = None
+        elif idioma_origen == idioma_destino:
+            continue
+
+        pendiente = (pos, remitente, destinatario, nombre, mensaje_limpio, idioma_origen)
+        cacheada = cache_traducciones.get((mensaje_limpio, idioma_origen, idioma_destino))
+        if cacheada is not None:
+            grupos.setdefault(None, []).append((pendiente, cacheada))
+        else:
+            grupos.setdefault(idioma_destino, []).append((pendiente, None))
+
+    listos = grupos.pop(None, [])
+    fallidos = []
+    if grupos:
+        if not admision.cupo_llm.entrar():
+            return lote_ocupado(idioma_respuesta, admision.cupo_llm.espera)
+        try:
+            traducir_grupos(grupos, listos, fallidos)
+        finally:
+            admision.cupo_llm.salir()
+
+    for (pos, remitente, destinatario, nombre, _, _), traduccion in listos:
+        if not traduccion:
+            continue
+        resultado = f"{nombre}: {traduccion}" if nombre else traduccion
+        entregar(remitente, destinatario, resultado)
+        resultados[pos] = resultado
+
+    return jsonify({"resultados": resultados, "fallidos": sorted(fallidos)})
+
+# ------------------------
+# ESTADO DE UN MENSAJE ENCOLADO
+# ------------------------
+@traductor_bp.route("/status/<msg_id>", methods=["GET"])
+def message_status(msg_id):
+    estado = estados.get(msg_id)
+    if estado is None:
+        return jsonify({"id": msg_id, "status": "unknown"}), 404
+    return jsonify({"id": msg_id, **estado})
+
+# ------------------------
+# BANDEJAS
+# ------------------------
+def entregar(remitente, destinatario, resultado):
+    ahora = time.time()
+    with mensajes_lock:
+        bandeja = bandejas.get(destinatario)
+        if bandeja is None:
+            bandeja = bandejas[destinatario] = deque(maxlen=BANDEJA_MAX)
+        else:
+            bandejas.move_to_end(destinatario)
+        bandeja.append({
+            "remitente": remitente,
+            "destinatario": destinatario,
+            "traducido": resultado,
+            "ts": ahora
+        })
+        podar_bandejas(ahora)
+        for evento in oyentes.get(destinatario, ()):
+            evento.set()
+
+# Bajo mensajes_lock. La primera bandeja es la de mensaje más antiguo.
+def podar_bandejas(ahora):
+    while bandejas:
+        avatar, bandeja = next(iter(bandejas.items()))
+        if len(bandejas) <= BANDEJA_MAX_AVATARES and ahora - bandeja[-1]["ts"] <= BANDEJA_TTL:
+            break
+        del bandejas[avatar]
+
+def archivar(msg):
+    chat_id = "_".join(sorted([msg["remitente"], msg["destinatario"]]))
+    archivo = conversaciones.get(chat_id)
+    if archivo is None:
+        archivo = conversaciones[chat_id] = deque(maxlen=ARCHIVO_MAX_MENSAJES)
+        while len(conversaciones) > ARCHIVO_MAX_CHATS:
+            conversaciones.popitem(last=False)
+    else:
+        conversaciones.move_to_end(chat_id)
+    archivo.append(msg)
+
+def recoger_pendientes(avatar):
+    with mensajes_lock:
+        bandeja = bandejas.pop(avatar, None)
+        if not bandeja:
+            return []
+        for msg in bandeja:
+            archivar(msg)
+        return [msg["traducido"] for msg in bandeja]
+
+def registrar_oyente(avatar):
+    evento = threading.Event()
+    with mensajes_lock:
+        oyentes.setdefault(avatar, set()).add(evento)
+        if bandejas.get(avatar):
+            evento.set()
+    return evento
+
+def quitar_oyente(avatar, evento):
+    with mensajes_lock:
+        grupo = oyentes.get(avatar)
+        if grupo is not None:
+            grupo.discard(evento)
+            if not grupo:
+                del oyentes[avatar]
+
+def esperar_pendientes(avatar, espera):
+    mensajes = recoger_pendientes(avatar)
+    if mensajes or espera <= 0 or not cupo_esperas.entrar():
+        return mensajes
+    evento = registrar_oyente(avatar)
+    try:
+        evento.wait(espera)
+    finally:
+        quitar_oyente(avatar, evento)
+        cupo_esperas.salir()
+    return recoger_pendientes(avatar)
+
 # ------------------------
 # POLL
 # ------------------------
+# ?wait=<segundos> mantiene la petición abierta hasta que llegue un mensaje
+# o venza el plazo (máximo LONGPOLL_MAX). Sin `wait` responde al instante.
 @traductor_bp.route("/poll/<avatar>", methods=["GET"])
 def poll_messages(avatar):
-    mensajes = []
-
-    for chat_id in conversaciones:
-        if avatar in chat_id:
-            for msg in conversaciones[chat_id]:
-                if msg["destinatario"] == avatar and not msg["leido"]:
-                    msg["leido"] = True
-                    mensajes.append(msg["traducido"])
+    espera = min(request.args.get("wait", 0, type=float), LONGPOLL_MAX)
+    return jsonify(esperar_pendientes(avatar, espera))
 
-    return jsonify(mensajes)
+# ------------------------
+# STREAM (SSE)
+# ------------------------
+@traductor_bp.route("/stream/<avatar>", methods=["GET"])
+def stream_messages(avatar):
+    if not cupo_esperas.entrar():
+        cuerpo = "".join(f"data: {json.dumps(texto, ensure_ascii=False)}\n\n"
+                         for texto in recoger_pendientes(avatar))
+        return Response(cuerpo + f"retry: {STREAM_REINTENTO * 1000}\n\n", mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "Retry-After": str(STREAM_REINTENTO)})
+
+    def eventos():
+        evento = registrar_oyente(avatar)
+        fin = time.time() + STREAM_MAX
+        try:
+            while True:
+                for texto in recoger_pendientes(avatar):
+                    yield f"data: {json.dumps(texto, ensure_ascii=False)}\n\n"
+                restante = fin - time.time()
+                if restante <= 0:
+                    break
+                if not evento.wait(min(STREAM_PING, restante)):
+                    yield ": ping\n\n"
+                evento.clear()
+        finally:
+            quitar_oyente(avatar, evento)
+
+    resp = Response(stream_with_context(eventos()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # al cerrar la respuesta, aunque el generador no llegue a empezar
+    resp.call_on_close(cupo_esperas.salir)
+    return resp
 
 # ------------------------
 # HEALTH
@@ -259,5 +869,10 @@ def health():
     return jsonify({
         "status": "ok",
         "groq": bool(GROQ_API_KEY),
-        "chats": len(conversaciones)
+        "chats": len(conversaciones),
+        "pendientes": sum(len(b) for b in list(bandejas.values())),
+        "cache": cache_traducciones.stats(),
+        "cola": {"pendientes": cola_traducciones.qsize(), "max": COLA_MAX,
+                 "workers": len(workers)},
+        "esperas": cupo_esperas.stats()
     })